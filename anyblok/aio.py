@@ -0,0 +1,246 @@
+# This file is a part of the AnyBlok project
+#
+#    Copyright (C) 2024 Jean-Sebastien SUZANNE <js.suzanne@gmail.com>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file,You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+"""Asyncio access to a loaded registry
+
+The registry is still loaded (bloks, models, migration) by the synchronous
+engine. Then ``AsyncRegistry`` executes the ORM calls with an engine created
+by ``create_async_engine``: the synchronous code of the models runs in the
+greenlet of an ``AsyncSession`` (``run_sync``), each database access gives
+the hand back to the event loop, no thread is used.
+
+Each asyncio task has its own session and its own hooks, so the environment
+must be scoped by task, see ``ContextVarEnvironment``::
+
+    EnvironmentManager.define_environment_cls(ContextVarEnvironment)
+    registry = RegistryManager.get(db_name)
+    async_registry = AsyncRegistry(registry)
+
+    async def handler():
+        async with async_registry:
+            Blok = async_registry.get('Model.System.Blok')
+            bloks = await Blok.query().filter_by(state='installed').all()
+            await async_registry.commit()
+
+The lazy loaded attributes can only be read in a call done by
+``AsyncRegistry.run``.
+"""
+from asyncio import current_task
+from weakref import ref
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm.scoping import ThreadLocalRegistry
+
+from .config import Configuration
+from .environment import EnvironmentManager
+from .registry import HookQueue, RegistryException
+
+
+def get_async_url(url, driver=None):
+    """Return the url of the database with the asyncio driver
+
+    :param url: SqlAlchemy URL of the synchronous engine
+    :param driver: name of the asyncio driver, by default the configuration
+        ``db_async_driver_name``
+    :rtype: SqlAlchemy URL
+    :exception: RegistryException
+    """
+    if driver is None:
+        driver = Configuration.get("db_async_driver_name")
+
+    if not driver:
+        raise RegistryException("No asyncio driver name defined")
+
+    return url.set(drivername="%s+%s" % (url.get_backend_name(), driver))
+
+
+class AsyncQuery:
+    """Awaitable version of the ``Query`` of a model
+
+    The methods which build the query are the methods of the ``Query``,
+    only the methods which execute the query are awaitable
+    """
+
+    def __init__(self, async_registry, query):
+        self.async_registry = async_registry
+        self.query = query
+
+    def __getattr__(self, key):
+        attribute = getattr(self.query, key)
+        if not callable(attribute):
+            return attribute  # pragma: no cover
+
+        def wrapper(*args, **kwargs):
+            res = attribute(*args, **kwargs)
+            if isinstance(res, type(self.query)):
+                return AsyncQuery(self.async_registry, res)
+
+            return res  # pragma: no cover
+
+        return wrapper
+
+    def __repr__(self):
+        return repr(self.query)
+
+    async def count(self):
+        return await self.async_registry.run(self.query.count)
+
+    async def first(self):
+        return await self.async_registry.run(self.query.first)
+
+    async def one(self):
+        return await self.async_registry.run(self.query.one)
+
+    async def one_or_none(self):
+        return await self.async_registry.run(self.query.one_or_none)
+
+    async def all(self):
+        return await self.async_registry.run(self.query.all)
+
+    async def dictone(self):
+        return await self.async_registry.run(self.query.dictone)
+
+    async def dictfirst(self):
+        return await self.async_registry.run(self.query.dictfirst)
+
+    async def dictall(self):
+        return await self.async_registry.run(self.query.dictall)
+
+
+class AsyncModel:
+    """Awaitable access to a model of the registry"""
+
+    def __init__(self, async_registry, Model):
+        self.async_registry = async_registry
+        self.Model = Model
+
+    def query(self, *elements):
+        """Return the ``AsyncQuery`` of the model"""
+        return AsyncQuery(self.async_registry, self.Model.query(*elements))
+
+    async def insert(self, **kwargs):
+        return await self.async_registry.run(self.Model.insert, **kwargs)
+
+    async def multi_insert(self, *args, **kwargs):
+        return await self.async_registry.run(
+            self.Model.multi_insert, *args, **kwargs
+        )
+
+    async def call(self, method, *args, **kwargs):
+        """Call a class method of the model
+
+        :param method: name of the method
+        :rtype: the result of the method
+        """
+        return await self.async_registry.run(
+            getattr(self.Model, method), *args, **kwargs
+        )
+
+
+class AsyncRegistry:
+    """Asyncio access to a loaded registry
+
+    :param registry: the registry loaded by ``RegistryManager``
+    :param url: url of the database with the asyncio driver, by default the
+        url of the registry with the ``db_async_driver_name`` driver
+    :exception: RegistryException
+    """
+
+    def __init__(self, registry, url=None):
+        if isinstance(registry.Session.registry, ThreadLocalRegistry):
+            raise RegistryException(
+                "The sessions of the registry %r are scoped by thread, "
+                "the environment must be scoped by asyncio task before the "
+                "load of the registry" % registry.db_name
+            )
+
+        if url is None:
+            url = get_async_url(registry.engine.url)
+
+        self.registry = registry
+        self.session_key = "_async_session_%s" % registry.db_name
+        self.engine = create_async_engine(
+            url, **registry.init_engine_options(url)
+        )
+        registry.apply_engine_events(self.engine.sync_engine)
+
+    def get_session(self):
+        """Return the ``AsyncSession`` of the current task
+
+        A task starts with the environment of the task which creates it,
+        the session and the hooks of this task are not reused: the first
+        call in a task creates its session and its own hook queues
+
+        :rtype: AsyncSession
+        """
+        task = current_task()
+        owner, session = EnvironmentManager.get(self.session_key, (None, None))
+        if owner is None or owner() is not task:
+            session = AsyncSession(
+                self.engine,
+                sync_session_class=self.registry.Session.session_factory.class_,
+                info={"anyblok_async": True},
+            )
+            EnvironmentManager.set(self.session_key, (ref(task), session))
+            EnvironmentManager.set("_precommit_hook", HookQueue())
+            EnvironmentManager.set("_postcommit_hook", HookQueue())
+
+        return session
+
+    def get(self, namespace):
+        """Return the awaitable access to the model
+
+        :param namespace: namespace of the model
+        :rtype: AsyncModel
+        """
+        return AsyncModel(self, self.registry.get(namespace))
+
+    async def run(self, func, *args, **kwargs):
+        """Call the synchronous ``func`` in the session of the current task
+
+        :rtype: the result of ``func``
+        """
+        session = self.get_session()
+
+        def call(sync_session):
+            self.registry.Session.registry.set(sync_session)
+            return func(*args, **kwargs)
+
+        return await session.run_sync(call)
+
+    async def flush(self):
+        await self.run(self.registry.flush)
+
+    async def commit(self):
+        """Commit the session of the current task, with the pre and post
+        commit hooks"""
+        await self.run(self.registry.commit)
+
+    async def rollback(self):
+        await self.run(self.registry.rollback)
+
+    async def close_session(self):
+        """Close and forget the session of the current task"""
+        owner, session = EnvironmentManager.get(self.session_key, (None, None))
+        if owner is not None and owner() is current_task():
+            EnvironmentManager.set(self.session_key, (None, None))
+            await session.close()
+            self.registry.Session.registry.clear()
+
+    async def close(self):
+        """Release the connections of the asyncio engine"""
+        await self.engine.dispose()
+
+    async def __aenter__(self):
+        self.get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            await self.rollback()
+
+        await self.close_session()
@@ -48,6 +48,20 @@ class AuthorizationRule:
         """
         raise NotImplementedError  # pragma: no cover
 
+    def check_many(self, targets, principals, permission):
+        """Check the permission on many targets.
+
+        :param targets: list of model instances (records) or classes
+        :param principals: list, set or tuple of strings
+        :rtype: list of bool, in the order of the targets
+
+        By default :meth:`check` is called for each target, concrete
+        subclasses can overload it to check all the targets at once.
+        """
+        return [
+            self.check(target, principals, permission) for target in targets
+        ]
+
     def filter(self, model, query, principals, permission):
         """Return a new query with added permission filtering.
 
@@ -27,7 +27,7 @@ class ModelAccessRule(AuthorizationRule):
         :params: grant_model is a model declaration, that has the needed
                  columns (model, principal, permission)
         """
-        if grant_model is not None:  # pragma: no cover
+        if grant_model is not None:
             self.grant_model_name = grant_model.__registry_name__
 
     @property
@@ -45,17 +45,32 @@ class ModelAccessRule(AuthorizationRule):
                 % (cls.__name__, cls.grant_model_name)
             )
 
-    def check_on_model(self, model, principals, permission):
+    def get_granted_models(self, principals, permission, models=None):
+        """Return the models on which one of the principals has the permission
+
+        If the grant model defines the ``get_granted_models`` classmethod
+        (cached), it is used, else the grants are queried.
+
+        :param principals: list, set or tuple of strings
+        :param models: if the grants are queried, restrict it to these models
+        :rtype: set of registry names
+        """
         Grant = self.grant_model
-        return bool(
-            Grant.query()
-            .filter(
-                Grant.model == model,
-                Grant.principal.in_(principals),
-                Grant.permission == permission,
-            )
-            .limit(1)
-            .count()
+        if hasattr(Grant, "get_granted_models"):
+            return Grant.get_granted_models(frozenset(principals), permission)
+
+        query = Grant.query("model").filter(
+            Grant.principal.in_(principals),
+            Grant.permission == permission,
+        )
+        if models is not None:
+            query = query.filter(Grant.model.in_(models))
+
+        return {x.model for x in query.distinct()}
+
+    def check_on_model(self, model, principals, permission):
+        return model in self.get_granted_models(
+            principals, permission, models=[model]
         )
 
     def check(self, record, principals, permission):
@@ -63,6 +78,16 @@ class ModelAccessRule(AuthorizationRule):
             record.__registry_name__, principals, permission
         )
 
+    def check_many(self, targets, principals, permission):
+        granted_models = self.get_granted_models(
+            principals,
+            permission,
+            models={target.__registry_name__ for target in targets},
+        )
+        return [
+            target.__registry_name__ in granted_models for target in targets
+        ]
+
     def filter(self, model, query, principals, permission):
         if self.check_on_model(model.__registry_name__, principals, permission):
             return query
@@ -89,6 +89,8 @@ class Base:
 
         :param method: the method to call on this model
         :param put_at_the_end_if_exist: If ``True`` the hook is move at the end
+        :param batch: If ``True`` the method is called once with one list by
+            argument, the lists contain the arguments of all the hooks
         """
         cls.anyblok.precommit_hook(
             cls.__registry_name__, method, *args, **kwargs
@@ -112,6 +114,8 @@ class Base:
         :param method: the method to call on this model
         :param put_at_the_end_if_exist: If ``True`` the hook is move at the end
         :param call_only_if: ['commited' (default), 'raised', 'always']
+        :param batch: If ``True`` the method is called once with one list by
+            argument, the lists contain the arguments of all the hooks
         """
         cls.anyblok.postcommit_hook(
             cls.__registry_name__, method, *args, **kwargs
@@ -6,6 +6,8 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 from anyblok import Declarations
+from anyblok.column import load_model_references
+from anyblok.common import anyblok_column_prefix
 
 
 @Declarations.register(Declarations.Core)
@@ -25,3 +27,34 @@ class InstrumentedList:
             return wrapper
         else:
             return [getattr(x, name) for x in self]
+
+    def load_model_references(self, *fieldnames):
+        """Load the instances referenced by the ``ModelReference`` columns
+        of the entries, with one query by referenced model::
+
+            tests = registry.Test.query().all()
+            references = tests.load_model_references('col')
+            for test in tests:
+                test.col  # no query
+
+        :param fieldnames: name of the ``ModelReference`` columns, by default
+            all the ``ModelReference`` columns of the model
+        :rtype: list of the referenced instances, it must be kept while
+            the referenced instances are used
+        """
+        if not self:
+            return []
+
+        Model = self[0].__class__
+        if not fieldnames:
+            fieldnames = Model.get_model_reference_columns()
+
+        hybrid_property_columns = Model.get_hybrid_property_columns()
+        attrs = [
+            anyblok_column_prefix + name
+            if name in hybrid_property_columns
+            else name
+            for name in fieldnames
+        ]
+        values = [getattr(x, attr) for x in self for attr in attrs]
+        return load_model_references(Model.anyblok, values)
@@ -8,12 +8,14 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 from logging import getLogger
 
-from sqlalchemy import func, select
+from sqlalchemy import func, inspect, select
 from sqlalchemy.orm.exc import NoResultFound
 
 from anyblok import Declarations
 from anyblok.common import anyblok_column_prefix
 
+from .sqlbase import SqlMixin
+
 logger = getLogger(__name__)
 
 
@@ -49,8 +51,10 @@ class Query:
     def __repr__(self):
         return str(self.sql_statement)
 
-    def _execute(self):
-        res = self.Model.execute(self.sql_statement)
+    def _execute(self, **execution_options):
+        res = self.Model.execute(
+            self.sql_statement, execution_options=execution_options
+        )
         if self.elements:
             return res
 
@@ -115,6 +119,46 @@ class Query:
         res = self._execute().all()
         return self.anyblok.InstrumentedList(res)
 
+    def stream(self, batch_size=1000, expunge=True):
+        """Iterate on the result of the query without loading it in memory
+
+        The rows are fetched by a server side cursor (if the driver allows
+        it), ``batch_size`` by ``batch_size``::
+
+            for instance in Model.query().stream(batch_size=500):
+                ...
+
+        :param batch_size: number of rows fetched and loaded at once
+        :param expunge: if True the instances of a batch, which are not
+            modified and were not in the session before the stream, are
+            expunged from the session once the batch is consumed
+
+        .. warning::
+
+            the expunged instances are detached
+        """
+        session = self.anyblok.session
+        known_keys = set()
+        if expunge and not self.elements:
+            known_keys.update(session.identity_map.keys())
+
+        res = self._execute(stream_results=True, yield_per=batch_size)
+        try:
+            for partition in res.partitions():
+                yield from partition
+
+                if expunge and not self.elements:
+                    for instance in partition:
+                        state = inspect(instance)
+                        if (
+                            state.session is session
+                            and state.key not in known_keys
+                            and not session.is_modified(instance)
+                        ):
+                            session.expunge(instance)
+        finally:
+            res.close()
+
     def with_perm(self, principals, permission):
         """Add authorization pre- and post-filtering to query.
 
@@ -168,15 +212,54 @@ class Query:
             return val.to_dict()
 
     def dictall(self):
-        vals = self.all()
-        if not vals:
-            return []  # pragma: no cover
+        """Return the result of the query as a list of dict
 
+        When ``to_dict`` is not overridden by the model and the fields it
+        serializes are only columns, the values are read directly in the
+        rows, without ORM instance
+        """
         field2get = self.get_field_names_in_column_description()
         if field2get:
-            return [{x: getattr(y, z) for x, z in field2get} for y in vals]
-        else:
-            return vals.to_dict()
+            return [
+                {x: row[y] for x, y in field2get}
+                for row in self._execute().mappings()
+            ]
+
+        plan = self.Model.get_to_dict_plan()
+        if (
+            self.Model.to_dict is not SqlMixin.to_dict
+            or self.Model.SQLAMapper.polymorphic_map
+            or any(field.column is None for field in plan)
+        ):
+            return [val.to_dict() for val in self._execute()]
+
+        statement = self.sql_statement.with_only_columns(
+            *(field.column.label(field.name) for field in plan),
+            maintain_column_froms=True,
+        )
+        res = []
+        for row in self.Model.execute(statement):
+            val = {}
+            for field, value in zip(plan, row):
+                if field.getter_format_value is not None:
+                    value = field.getter_format_value(value)
+
+                val[field.name] = value
+
+            res.append(val)
+
+        return res
+
+    def dictstream(self, batch_size=1000):
+        """Iterate on the result of the query as dict without loading it
+        in memory, see ``stream``
+        """
+        field2get = self.get_field_names_in_column_description()
+        for val in self.stream(batch_size=batch_size):
+            if field2get:
+                yield {x: getattr(val, y) for x, y in field2get}
+            else:
+                yield val.to_dict()
 
     def get(self, primary_keys=None, **kwargs):
         """Return instance of the Model
@@ -19,3 +19,15 @@ class Session(SA_Session):
         Query = type("Query", (query.Query,), {"anyblok": self.anyblok})
         kwargs["query_cls"] = Query
         super(Session, self).__init__(*args, **kwargs)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """Execute the SELECT statements on a read only replica when the
+        registry has some, see ``Registry.get_ro_engine``
+        """
+        bind = self.anyblok.get_ro_engine(self, clause)
+        if bind is None:
+            bind = super(Session, self).get_bind(
+                mapper=mapper, clause=clause, **kwargs
+            )
+
+        return bind
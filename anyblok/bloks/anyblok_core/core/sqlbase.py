@@ -8,14 +8,21 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
-from sqlalchemy import and_, delete, inspect, or_, select
+from collections import namedtuple
+
+from sqlalchemy import and_, delete, insert, inspect, or_, select
 from sqlalchemy import update as sqla_update
 from sqlalchemy.orm import ColumnProperty, aliased
 from sqlalchemy.orm.base import LoaderCallableStatus
 from sqlalchemy.orm.session import object_state
 from sqlalchemy_utils.models import NOT_LOADED_REPR
 
-from anyblok.column import Column
+from anyblok.column import (
+    Column,
+    ModelReference,
+    Sequence,
+    load_model_references,
+)
 from anyblok.common import anyblok_column_prefix
 from anyblok.declarations import Declarations, classmethod_cache
 from anyblok.field import FieldException
@@ -24,6 +31,21 @@ from anyblok.relationship import Many2Many, RelationShip
 
 from ..exceptions import SqlBaseException
 
+ToDictField = namedtuple(
+    "ToDictField",
+    ["name", "column", "getter_format_value", "relationship", "related_fields"],
+)
+
+
+def freeze_fields(fields):
+    """Return the fields wanted by ``to_dict`` with tuple instead of list,
+    to be used as key of the cache
+    """
+    return tuple(
+        freeze_fields(field) if isinstance(field, (list, tuple)) else field
+        for field in fields
+    )
+
 
 class uniquedict(dict):
     def add_in_res(self, key, attrs):
@@ -37,6 +59,20 @@ class uniquedict(dict):
 
 class SqlMixin:
     __db_schema__ = None
+    # methods cached from the structure of the model, they are invalidated
+    # by clear_all_model_caches and not by the data of the table
+    structure_cached_methods = (
+        "_fields_description",
+        "fields_name",
+        "getFieldType",
+        "get_primary_keys",
+        "find_remote_attribute_to_expire",
+        "find_relationship",
+        "get_hybrid_property_columns",
+        "get_to_dict_plan",
+        "get_model_reference_columns",
+        "get_sequence_columns",
+    )
 
     def __repr__(self):
         state = inspect(self)
@@ -91,13 +127,8 @@ class SqlMixin:
     def clear_all_model_caches(cls):
         super().clear_all_model_caches()
         Cache = cls.anyblok.System.Cache
-        Cache.invalidate(cls, "_fields_description")
-        Cache.invalidate(cls, "fields_name")
-        Cache.invalidate(cls, "getFieldType")
-        Cache.invalidate(cls, "get_primary_keys")
-        Cache.invalidate(cls, "find_remote_attribute_to_expire")
-        Cache.invalidate(cls, "find_relationship")
-        Cache.invalidate(cls, "get_hybrid_property_columns")
+        for method in cls.structure_cached_methods:
+            Cache.invalidate(cls, method)
 
     @classmethod
     def define_table_args(cls):
@@ -253,18 +284,48 @@ class SqlMixin:
         :param _*pks: list of dict [{primary_key: value, ...}]
         :rtype: instances of the model
         """
-        where_clause = []
-        for _pks in pks:
-            where_clause.append(cls.get_where_clause_from_primary_keys(**_pks))
-
-        if not where_clause:
+        if not pks:
             return []
 
-        where_clause = or_(*[and_(*x) for x in where_clause])
+        where_clause = [
+            cls.get_where_clause_from_primary_keys(**_pks) for _pks in pks
+        ]
+        primary_keys = cls.get_primary_keys()
+        if len(primary_keys) == 1:
+            # one ``IN`` clause instead of one ``OR`` by entry
+            pk = primary_keys[0]
+            where_clause = getattr(cls, pk).in_([_pks[pk] for _pks in pks])
+        else:
+            where_clause = or_(*[and_(*x) for x in where_clause])
 
         query = cls.query().filter(where_clause)
         return query.all()
 
+    @classmethod
+    def from_identity_map(cls, **pks):
+        """return the instance of the model from the primary keys, only if
+        it is already loaded in the session, no query is done
+
+        :param **pks: dict {primary_key: value, ...}
+        :rtype: instance of the model or None
+        """
+        try:
+            identity_key = cls.SQLAMapper.identity_key_from_primary_key(
+                [pks[column.key] for column in cls.SQLAMapper.primary_key]
+            )
+        except KeyError:
+            return None
+
+        session = cls.anyblok.session
+        instance = session.identity_map.get(identity_key)
+        if instance is None or instance in session.deleted:
+            return None
+
+        if not isinstance(instance, cls):
+            return None
+
+        return instance
+
     def to_primary_keys(self):
         """return the primary keys and values for this instance
 
@@ -454,7 +515,80 @@ class SqlMixin:
 
         return hybrid_property_columns
 
-    def _format_field(self, field):
+    @classmethod_cache()
+    def get_model_reference_columns(cls):
+        """Return the name of the ``ModelReference`` columns of the model"""
+        fsp = cls.anyblok.loaded_namespaces_first_step[cls.__registry_name__]
+        return [
+            name
+            for name in cls.loaded_columns
+            if isinstance(fsp.get(name), ModelReference)
+        ]
+
+    @classmethod
+    def load_model_references(cls, *args):
+        """Load the instances referenced by the ``ModelReference`` columns
+        of the entries to insert, with one query by referenced model, so the
+        validation of each entry finds them in the session
+
+        :param args: list of dict {field name: value}
+        :rtype: list of the instances loaded
+        """
+        names = cls.get_model_reference_columns()
+        if not names:
+            return []
+
+        values = [
+            kwargs[name]
+            for kwargs in args
+            if isinstance(kwargs, dict)
+            for name in names
+            if name in kwargs
+        ]
+        return load_model_references(cls.anyblok, values)
+
+    @classmethod_cache()
+    def get_sequence_columns(cls):
+        """Return the ``Sequence`` columns of the model
+
+        :rtype: dict {field name: code of the sequence}
+        """
+        fsp = cls.anyblok.loaded_namespaces_first_step[cls.__registry_name__]
+        return {
+            name: fsp[name].get_sequence_code(cls.__registry_name__, name)
+            for name in cls.loaded_columns
+            if isinstance(fsp.get(name), Sequence)
+        }
+
+    @classmethod
+    def reserve_sequence_values(cls, *args):
+        """Return the entries to insert with the values of the ``Sequence``
+        columns, the values of one sequence are reserved in one call for
+        all the entries which do not give them
+
+        :param args: list of dict {field name: value}
+        :rtype: list of dict {field name: value}
+        """
+        columns = cls.get_sequence_columns()
+        if not columns:
+            return args
+
+        args = [dict(x) if isinstance(x, dict) else x for x in args]
+        SystemSequence = cls.anyblok.System.Sequence
+        for name, code in columns.items():
+            entries = [x for x in args if isinstance(x, dict) and name not in x]
+            if len(entries) < 2:
+                # the default value of the column is enough
+                continue
+
+            values = SystemSequence.nextvalsBy(len(entries), code=code) or ()
+            for kwargs, value in zip(entries, values):
+                kwargs[name] = value
+
+        return args
+
+    @classmethod
+    def _format_field(cls, field):
         related_fields = None
         if isinstance(field, (tuple, list)):
             if len(field) == 1:
@@ -549,28 +683,69 @@ class SqlMixin:
              }
         """
         result = {}
-        cls = self.__class__
+        for field in self.get_to_dict_plan(*freeze_fields(fields)):
+            field_value = getattr(self, field.name)
+            if field.relationship is None or field_value is None:
+                # If value is None, then do not go any further whatever
+                # the column property tells you.
+                result[field.name] = field_value
+            elif field.relationship.uselist:
+                # One2One, One2Many, Many2One or Many2Many ?
+                result[field.name] = [
+                    r.to_dict(*field.related_fields) for r in field_value
+                ]
+            else:
+                result[field.name] = field_value.to_dict(*field.related_fields)
+
+        return result
+
+    @classmethod_cache()
+    def get_to_dict_plan(cls, *fields):
+        """Return the serialization plan of ``to_dict``, the fields are
+        resolved only one time by model and fields wanted
+
+        :param fields: the fields wanted by ``to_dict``
+        :rtype: tuple of ``ToDictField``:
+
+            * name: name of the field
+            * column: the mapped column if the field is a column
+            * getter_format_value: format the value read in the column
+            * relationship: the relationship property if the field is a
+              relationship
+            * related_fields: the fields of the relationship to serialize
+        """
+        res = []
         fields = fields if fields else cls.fields_description().keys()
+        hybrid_property_columns = cls.get_hybrid_property_columns()
+        fsp = cls.anyblok.loaded_namespaces_first_step[cls.__registry_name__]
 
         for field in fields:
             # if field is ("relation_name", ("list", "of", "relation",
             # "fields")), deal with it.
-            field, related_fields = self._format_field(field)
-            # Get the actual data
-            field_value, field_property = getattr(self, field), None
+            field, related_fields = cls._format_field(field)
+            field_attribute, field_property = None, None
             try:
-                field_property = getattr(getattr(cls, field), "property", None)
+                field_attribute = getattr(cls, field)
+                field_property = getattr(field_attribute, "property", None)
             except FieldException:  # pragma: no cover
                 pass
 
-            # Deal with this data
             if field_property is None:
                 # it is the case of field function (hyprid property)
-                result[field] = field_value
-            elif field_value is None or type(field_property) == ColumnProperty:
-                # If value is None, then do not go any further whatever
-                # the column property tells you.
-                result[field] = field_value
+                res.append(ToDictField(field, None, None, None, None))
+            elif type(field_property) is ColumnProperty:
+                getter_format_value = None
+                if field in hybrid_property_columns:
+                    # the columns created by a Many2One are FakeColumn
+                    getter_format_value = getattr(
+                        fsp[field], "getter_format_value", None
+                    )
+
+                res.append(
+                    ToDictField(
+                        field, field_attribute, getter_format_value, None, None
+                    )
+                )
             else:
                 # it is should be RelationshipProperty
                 if related_fields is None:
@@ -578,15 +753,18 @@ class SqlMixin:
                     # use only primary keys
                     related_fields = field_property.mapper.entity
                     related_fields = related_fields.get_primary_keys()
-                # One2One, One2Many, Many2One or Many2Many ?
-                if field_property.uselist:
-                    result[field] = [
-                        r.to_dict(*related_fields) for r in field_value
-                    ]
-                else:
-                    result[field] = field_value.to_dict(*related_fields)
 
-        return result
+                res.append(
+                    ToDictField(
+                        field,
+                        None,
+                        None,
+                        field_property,
+                        freeze_fields(related_fields),
+                    )
+                )
+
+        return tuple(res)
 
     @classmethod_cache()
     def getFieldType(cls, name):
@@ -873,17 +1051,26 @@ class SqlBase(SqlMixin):
         return instance
 
     @classmethod
-    def multi_insert(cls, *args):
+    def multi_insert(cls, *args, bulk=False, returning=None):
         """Insert in the table one or more entry of the model::
 
             MyModel.multi_insert([{...}, ...])
 
         the flush will be done only one time at the end of the insert
 
+        :param bulk: if True, the entries are inserted by ``bulk_insert``
+            without ORM instance
+        :param returning: only used with ``bulk``, see ``bulk_insert``
         :exception: SqlBaseException
         """
+        if bulk:
+            return cls.bulk_insert(*args, returning=returning)
+
         instances = cls.anyblok.InstrumentedList()
         session = cls.anyblok.session
+        args = cls.reserve_sequence_values(*args)
+        # the referenced instances must stay in memory during the validation
+        references = cls.load_model_references(*args)
         for kwargs in args:
             if not isinstance(kwargs, dict):  # pragma: no cover
                 raise SqlBaseException("multi_insert method wait list of dict")
@@ -895,4 +1082,106 @@ class SqlBase(SqlMixin):
         if instances:
             session.flush()
 
+        del references
         return instances
+
+    @classmethod
+    def insert_sql_statement(cls):
+        """Return a statement to insert some entries"""
+        return cls.default_filter_on_sql_statement(insert(cls))
+
+    @classmethod
+    def format_bulk_values(cls, values):
+        """Return the values of one entry of ``bulk_insert`` with the
+        name of the mapped attributes and the values formatted by the
+        ``setter_format_value`` of the columns
+
+        :param values: dict {field name: value}
+        :exception: SqlBaseException
+        """
+        if not isinstance(values, dict):
+            raise SqlBaseException("bulk_insert method wait list of dict")
+
+        fsp = cls.anyblok.loaded_namespaces_first_step[cls.__registry_name__]
+        hybrid_property_columns = cls.get_hybrid_property_columns()
+        res = {}
+        for name, value in values.items():
+            if name in hybrid_property_columns:
+                setter_format_value = getattr(
+                    fsp[name], "setter_format_value", None
+                )
+                if setter_format_value is not None:
+                    value = setter_format_value(value)
+
+                name = anyblok_column_prefix + name
+
+            res[name] = value
+
+        return res
+
+    @classmethod
+    def bulk_insert(cls, *args, returning=None):
+        """Insert in the table one or more entry of the model without
+        ORM instance::
+
+            MyModel.bulk_insert({...}, ...)
+
+        The entries are inserted by the ``insert_sql_statement`` in one
+        executemany, the values are formatted as the setter of the columns
+        does and the default values of the columns are applied.
+
+        The methods cached on the model, except the
+        ``structure_cached_methods``, are invalidated as no ORM event is
+        called to do it.
+
+        .. warning::
+
+            no instance is created, so the ORM events are not called and
+            the instances already loaded in the session are not refreshed
+
+        :param returning: True to return the primary keys, or a list of
+            the field names to return
+        :rtype: number of entries inserted, or the list of the rows
+            returned
+        :exception: SqlBaseException
+        """
+        args = cls.reserve_sequence_values(*args)
+        references = cls.load_model_references(*args)
+        values = [cls.format_bulk_values(kwargs) for kwargs in args]
+        del references
+        if not values:
+            return [] if returning else 0
+
+        stmt = cls.insert_sql_statement()
+        if not returning:
+            cls.execute_sql_statement(stmt, values)
+            res = len(values)
+        else:
+            if returning is True:
+                returning = cls.get_primary_keys()
+
+            stmt = stmt.returning(
+                *(getattr(cls, x).label(x) for x in returning)
+            )
+            if cls.anyblok.engine.dialect.insert_executemany_returning:
+                res = cls.execute_sql_statement(stmt, values).all()
+            else:
+                res = [  # pragma: no cover
+                    cls.execute_sql_statement(stmt, [value]).one()
+                    for value in values
+                ]
+
+        cls.invalidate_data_cached_methods()
+        return res
+
+    @classmethod
+    def invalidate_data_cached_methods(cls):
+        """Invalidate the methods cached on the model, except the
+        ``structure_cached_methods``, after a modification of the table
+        done without ORM event
+        """
+        Cache = cls.anyblok.System.Cache
+        methods = cls.anyblok.caches.get(cls.__registry_name__, {})
+        for method in sorted(methods):
+            if method not in cls.structure_cached_methods:
+                Cache.invalidate(cls, method)
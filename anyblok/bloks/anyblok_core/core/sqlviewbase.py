@@ -5,7 +5,10 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from sqlalchemy import text
+
 from anyblok import Declarations
+from anyblok.common import sgdb_in
 from anyblok.model.exceptions import ViewException
 
 from .sqlbase import SqlMixin
@@ -26,3 +29,60 @@ class SqlViewBase(SqlMixin):
             "%r.delete method are not availlable on view "
             "model" % self.__registry_name__
         )
+
+    @classmethod
+    def is_materialized_view(cls):
+        """Return True if the view is created as a materialized view"""
+        if not getattr(cls, "__view_materialized__", False):
+            return False
+
+        return sgdb_in(cls.anyblok.engine, ["PostgreSQL"])
+
+    @classmethod
+    def get_refresh_view_statement(cls, concurrently=False):
+        """Return the statement to refresh the materialized view"""
+        preparer = cls.anyblok.engine.dialect.identifier_preparer
+        return text(
+            "REFRESH MATERIALIZED VIEW %s%s"
+            % (
+                "CONCURRENTLY " if concurrently else "",
+                preparer.format_table(cls.__view__),
+            )
+        )
+
+    @classmethod
+    def refresh_view(cls, concurrently=False):
+        """Refresh the data of the materialized view in the current
+        transaction, do nothing if the view is not materialized
+
+        :param concurrently: if True the view is refreshed without lock
+            against the read of the view
+        """
+        if not cls.is_materialized_view():
+            return
+
+        cls.anyblok.flush()
+        cls.execute_sql_statement(
+            cls.get_refresh_view_statement(concurrently=concurrently)
+        )
+        for instance in list(cls.anyblok.session.identity_map.values()):
+            if isinstance(instance, cls):
+                cls.anyblok.expire(instance)
+
+    @classmethod
+    def refresh_view_after_commit(cls, concurrently=True):
+        """Refresh the data of the materialized view in a new transaction,
+        called by the postcommit hook of ``schedule_refresh_view``
+        """
+        with cls.anyblok.engine.begin() as conn:
+            conn.execute(
+                cls.get_refresh_view_statement(concurrently=concurrently)
+            )
+
+    @classmethod
+    def schedule_refresh_view(cls, *args, **kwargs):
+        """Add a postcommit hook to refresh the materialized view, the view
+        is refreshed only one time after the commit
+        """
+        if cls.is_materialized_view():
+            cls.postcommit_hook("refresh_view_after_commit")
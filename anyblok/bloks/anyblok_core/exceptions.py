@@ -26,3 +26,7 @@ class CacheException(Exception):
 
 class ParameterException(Exception):
     """Simple exception for System.Parameter"""
+
+
+class SequenceException(Exception):
+    """Simple exception for System.Sequence"""
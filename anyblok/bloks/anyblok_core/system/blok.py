@@ -107,13 +107,28 @@ class Blok:
             return res[states[0]]
         return res  # pragma: no cover
 
+    @classmethod
+    def get_states(cls):
+        """Return the state of all the bloks with only one query
+
+        :rtype: dict {blok name: state}
+        """
+        query = cls.select_sql_statement(cls.name, cls.state)
+        return dict(cls.execute_sql_statement(query).all())
+
     @classmethod
     def update_list(cls):
-        """Populate the bloks list and update the state of existing bloks"""
+        """Populate the bloks list and update the state of existing bloks
+
+        The existing bloks are loaded by one query and compared in memory,
+        only the new and the modified bloks are flushed
+        """
         # Do not remove blok because 2 or More AnyBlok api may use the same
         # Database
+        existing_bloks = {b.name: b for b in cls.query().all()}
+        to_insert = []
         for order, blok in enumerate(BlokManager.ordered_bloks):
-            b = cls.query().filter(cls.name == blok).one_or_none()
+            b = existing_bloks.get(blok)
             Blok = BlokManager.bloks[blok]
 
             version = Blok.version
@@ -121,12 +136,14 @@ class Blok:
             is_undefined = issubclass(Blok, UndefinedBlok)
 
             if b is None:
-                cls.insert(
-                    name=blok,
-                    order=order,
-                    version=version,
-                    author=author,
-                    state="undefined" if is_undefined else "uninstalled",
+                to_insert.append(
+                    dict(
+                        name=blok,
+                        order=order,
+                        version=version,
+                        author=author,
+                        state="undefined" if is_undefined else "uninstalled",
+                    )
                 )
             else:
                 values = dict(order=order, version=version, author=author)
@@ -144,7 +161,12 @@ class Blok:
 
                     values["state"] = "undefined"
 
-                b.update(**values)
+                b.update(
+                    **{x: y for x, y in values.items() if getattr(b, x) != y}
+                )
+
+        if to_insert:
+            cls.multi_insert(*to_insert)
 
     @classmethod
     def apply_state(cls, *bloks):
@@ -156,30 +178,37 @@ class Blok:
 
         :param bloks: list of the blok name load by the registry
         """
+        bloks_by_name = {}
+        if bloks:
+            query = cls.query().filter(cls.name.in_(bloks))
+            bloks_by_name = {b.name: b for b in query.all()}
+
         for blok in bloks:
-            # Make the query in the loop to be sure to keep order
-            b = cls.query().filter(cls.name == blok).first()
+            # Loop on the bloks to be sure to keep order
+            b = bloks_by_name[blok]
             if b.state in ("uninstalled", "toinstall"):
                 b.install()
             elif b.state == "toupdate":
                 b.upgrade()
 
-        uninstalled_bloks = (
-            cls.query().filter(cls.state == "uninstalled").all().name
-        )
-
-        conditional_bloks_to_install = []
-        for blok in uninstalled_bloks:
-            if cls.check_if_the_conditional_are_installed(blok):
-                conditional_bloks_to_install.append(blok)
+        states = cls.get_states()
+        conditional_bloks_to_install = [
+            blok
+            for blok, state in states.items()
+            if (
+                state == "uninstalled"
+                and cls.check_if_the_conditional_are_installed(
+                    blok, states=states
+                )
+            )
+        ]
 
         if conditional_bloks_to_install:
-            for b in conditional_bloks_to_install:
-                cls.execute_sql_statement(
-                    cls.update_sql_statement()
-                    .where(cls.name == b)
-                    .values(state="toinstall")
-                )
+            cls.execute_sql_statement(
+                cls.update_sql_statement()
+                .where(cls.name.in_(conditional_bloks_to_install))
+                .values(state="toinstall")
+            )
 
             return True
 
@@ -206,19 +235,25 @@ class Blok:
             bloks.uninstall()
 
     @classmethod
-    def check_if_the_conditional_are_installed(cls, blok):
+    def check_if_the_conditional_are_installed(cls, blok, states=None):
         """Return True if all the conditions to install the blok are satisfied
 
         :param blok: blok name
+        :param states: dict {blok name: state} given by ``get_states``, if
+            None the states are read in the database
         :rtype: boolean
         """
         if blok in BlokManager.bloks:
             conditional = BlokManager.bloks[blok].conditional
             if conditional:
+                installed_states = ("installed", "toinstall", "toupdate")
+                if states is not None:
+                    return all(
+                        states.get(x) in installed_states for x in conditional
+                    )
+
                 query = cls.query().filter(cls.name.in_(conditional))
-                query = query.filter(
-                    cls.state.in_(["installed", "toinstall", "toupdate"])
-                )
+                query = query.filter(cls.state.in_(installed_states))
                 if len(conditional) == query.count():
                     return True
 
@@ -45,12 +45,30 @@ class Cache:
         for registry_name, methods in cls.anyblok.caches.items():
             for method, caches in methods.items():
                 res.append(dict(registry_name=registry_name, method=method))
+                cls.clear_at_rollback(registry_name, method)
                 for cache in caches:
                     cache.cache_clear()
 
         if res:
-            instances = cls.multi_insert(*res)
-            cls.last_cache_id = max(i.id for i in instances)
+            invalidations = cls.bulk_insert(
+                *res, returning=["id", "registry_name", "method"]
+            )
+            cls.last_cache_id = max(i.id for i in invalidations)
+            cls.anyblok.cache_invalidation_transport.publish(invalidations)
+
+    @classmethod
+    def clear_at_rollback(cls, registry_name, method):
+        """Clear the caches of the method, in this process, if the
+        transaction is rolled back. After an invalidation the cache can be
+        filled with values which are not committed
+
+        :param registry_name: namespace of the model
+        :param method: name of the method on the model
+        """
+        invalidated = cls.anyblok.session.info.setdefault(
+            "anyblok_invalidated_caches", set()
+        )
+        invalidated.add((registry_name, method))
 
     @classmethod
     def invalidate(cls, registry_name, method):
@@ -67,9 +85,12 @@ class Cache:
 
         if registry_name in caches:
             if method in caches[registry_name]:
-                cls.last_cache_id = cls.insert(
+                invalidation = cls.insert(
                     registry_name=registry_name, method=method
-                ).id
+                )
+                cls.last_cache_id = invalidation.id
+                cls.anyblok.cache_invalidation_transport.publish([invalidation])
+                cls.clear_at_rollback(registry_name, method)
                 for cache in caches[registry_name][method]:
                     cache.cache_clear()
             else:
@@ -80,8 +101,12 @@ class Cache:
             raise CacheException("Unknown cached model %r" % registry_name)
 
     @classmethod
-    def get_invalidation(cls):
-        """Return the pointer of the method to invalidate"""
+    def get_invalidated_methods(cls):
+        """Return the methods invalidated since the last known ``id`` by
+        reading the table
+
+        :rtype: list of tuple (registry_name, method)
+        """
         res = []
         query = cls.select_sql_statement(
             func.max(cls.id).label("id"),
@@ -91,13 +116,27 @@ class Cache:
         query = query.group_by(cls.registry_name, cls.method)
         query = query.where(cls.id > cls.last_cache_id)
         query_res = cls.execute_sql_statement(query)
-        caches = cls.anyblok.caches
         for id_, registry_name, method in query_res:
-            res.extend(caches[registry_name][method])
+            res.append((registry_name, method))
             cls.last_cache_id = max(cls.last_cache_id, id_)
 
         return res
 
+    @classmethod
+    def get_invalidation(cls):
+        """Return the pointer of the method to invalidate
+
+        The invalidations done by the other processes come from the
+        ``cache_invalidation_transport`` of the registry
+        """
+        res = []
+        caches = cls.anyblok.caches
+        transport = cls.anyblok.cache_invalidation_transport
+        for registry_name, method in set(transport.get_invalidation()):
+            res.extend(caches.get(registry_name, {}).get(method, []))
+
+        return res
+
     @classmethod
     def clear_invalidate_cache(cls):
         """Invalidate the cache that needs to be invalidated"""
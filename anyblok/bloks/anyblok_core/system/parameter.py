@@ -5,8 +5,14 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from copy import deepcopy
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
 from anyblok import Declarations
 from anyblok.column import Boolean, Json, String
+from anyblok.common import sgdb_in
+from anyblok.declarations import classmethod_cache
 
 from ..exceptions import ParameterException
 
@@ -28,6 +34,12 @@ class Parameter:
 
     A simple access API is provided with the :meth:`get`, :meth:`set`,
     :meth:`is_exist` and further methods.
+
+    The values read by :meth:`get` are cached by key, :meth:`set`,
+    :meth:`pop` and ``bulk_insert`` invalidate the cache with
+    ``Model.System.Cache``. The parameters modified without this API (by
+    ``update`` or ``delete`` on an instance) must invalidate the
+    ``get_cached_value`` method.
     """
 
     key = String(primary_key=True)
@@ -49,11 +61,63 @@ class Parameter:
         else:
             multi = True
 
-        if cls.is_exist(key):
-            param = cls.from_primary_keys(key=key)
-            param.update(value=value, multi=multi)
-        else:
-            cls.insert(key=key, value=value, multi=multi)
+        if not cls.upsert(key, value, multi):
+            if cls.is_exist(key):
+                param = cls.from_primary_keys(key=key)
+                param.update(value=value, multi=multi)
+            else:
+                cls.insert(key=key, value=value, multi=multi)
+
+        cls.invalidate_cached_value()
+
+    @classmethod
+    def upsert(cls, key, value, multi):
+        """Insert or update the parameter in one query, only if the database
+        allows ``INSERT ... ON CONFLICT``
+
+        :rtype: bool, False if the database does not allow it
+        """
+        if not sgdb_in(cls.anyblok.engine, ["PostgreSQL"]):
+            return False  # pragma: no cover
+
+        stmt = cls.default_filter_on_sql_statement(pg_insert(cls)).values(
+            cls.format_bulk_values(dict(key=key, value=value, multi=multi))
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.__table__.c.key],
+            set_=dict(value=stmt.excluded.value, multi=stmt.excluded.multi),
+        )
+        cls.execute_sql_statement(stmt)
+
+        session = cls.anyblok.session
+        param = session.identity_map.get(
+            cls.SQLAMapper.identity_key_from_primary_key([key])
+        )
+        if param is not None:
+            session.expire(param)
+
+        return True
+
+    @classmethod
+    def invalidate_cached_value(cls):
+        """Invalidate the values cached by :meth:`get`"""
+        cls.anyblok.System.Cache.invalidate(
+            cls.__registry_name__, "get_cached_value"
+        )
+
+    @classmethod_cache()
+    def get_cached_value(cls, key):
+        """Return the value of the key read in the database
+
+        :param key: key whose value to retrieve
+        :rtype: tuple (True, value) or (False, None) if the key does not exist
+        """
+        query = cls.select_sql_statement("value", "multi").where(cls.key == key)
+        param = cls.execute_sql_statement(query).one_or_none()
+        if param is None:
+            return False, None
+
+        return True, param.value if param.multi else param.value["value"]
 
     @classmethod
     def is_exist(cls, key):
@@ -90,6 +154,7 @@ class Parameter:
 
         if remove:
             param.delete()
+            cls.invalidate_cached_value()
 
         return res
 
@@ -104,7 +169,43 @@ class Parameter:
         :raises ParameterException: if the key doesn't exist and default is not
                                     set.
         """
-        return cls.get_parameter(key, default=default)
+        exist, value = cls.get_cached_value(key)
+        if not exist:
+            if default is NOT_PROVIDED:
+                raise ParameterException("unexisting key %r" % key)
+            return default
+
+        return deepcopy(value)
+
+    @classmethod
+    def get_many(cls, keys, default=NOT_PROVIDED):
+        """Return the values of the keys in one query
+
+        :param keys: keys whose values to retrieve
+        :param default: default value for the keys which do not exist
+        :return: associated values
+        :rtype: dict {key: value}
+        :raises ParameterException: if a key doesn't exist and default is not
+                                    set.
+        """
+        res = {}
+        if keys:
+            query = cls.select_sql_statement("key", "value", "multi").where(
+                cls.key.in_(keys)
+            )
+            for param in cls.execute_sql_statement(query):
+                res[param.key] = (
+                    param.value if param.multi else param.value["value"]
+                )
+
+        for key in keys:
+            if key not in res:
+                if default is NOT_PROVIDED:
+                    raise ParameterException("unexisting key %r" % key)
+
+                res[key] = default
+
+        return res
 
     @classmethod
     def pop(cls, key, default=NOT_PROVIDED):
@@ -6,10 +6,17 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from threading import Lock
+
 from sqlalchemy import Sequence as SQLASequence
+from sqlalchemy import func, inspect, select
 
 from anyblok import Declarations
 from anyblok.column import Boolean, Integer, String
+from anyblok.common import anyblok_column_prefix, sgdb_in
+from anyblok.declarations import classmethod_cache
+
+from ..exceptions import SequenceException
 
 register = Declarations.register
 System = Declarations.Model.System
@@ -64,9 +71,36 @@ class Sequence:
         ...
         sqlalchemy.exc.OperationalError: (psycopg2.errors.LockNotAvailable)
         ...
+
+    To get many formatted values at once::
+
+        >>> seq.nextvals(3)
+        ['SO-000003', 'SO-000004', 'SO-000005']
+
+    A Sequence with gap can reserve the values by block with
+    `allocation_size`, the database sequence is only called once by block
+    and the values are given from the memory of the process::
+
+        >>> seq = Sequence.insert(
+                code='SO', formater="{code}-{seq:06d}", allocation_size=50)
+
+    The sequences used by :meth:`nextvalBy` and :meth:`nextvalsBy` with the
+    ``code`` criteria are read in the database once by code, and cached.
+    The inserts, :meth:`update`, :meth:`delete` and the updates and deletes
+    flushed by the ORM invalidate the cache with ``Model.System.Cache``. The
+    sequences modified by another SQL statement must call
+    :meth:`invalidate_cached_sequence`.
     """
 
     _cls_seq_name = "system_sequence_seq_name"
+    _cached_fields = (
+        "id",
+        "code",
+        "seq_name",
+        "formater",
+        "no_gap",
+        "allocation_size",
+    )
 
     id = Integer(primary_key=True)
     code = String(nullable=False, index=True)
@@ -97,11 +131,24 @@ class Sequence:
     `sqlalchemy.exc.OperationalError: (psycopg2.errors.LockNotAvailable)`
     exception is raised.
     """
+    allocation_size = Integer(default=1, nullable=False)
+    """Only for the sequences with gap, the database sequence is incremented
+    by `allocation_size` and the values of the reserved block are given
+    from the memory of the process.
+
+    The values are unique but, with many processes, they are not given in
+    order, and the values not used by a process are lost.
+
+    It can not be modified after the insert, because the other processes
+    would keep reserving the blocks with the previous size.
+    """
 
     @classmethod
     def initialize_model(cls):
         """Create the sequence to determine name"""
         super(Sequence, cls).initialize_model()
+        cls._allocated_values = {}
+        cls._allocation_lock = Lock()
         seq = SQLASequence(cls._cls_seq_name)
         seq.create(cls.anyblok.bind)
 
@@ -142,48 +189,293 @@ class Sequence:
                 seq_name = "%s_%d" % (cls.__tablename__, seq_id)
                 values["seq_name"] = seq_name
 
-            if number:
-                seq = SQLASequence(seq_name, number)
-            else:
-                seq = SQLASequence(seq_name)
+            seq = SQLASequence(
+                seq_name,
+                start=number or None,
+                increment=values.get("allocation_size") or None,
+            )
             seq.create(cls.anyblok.bind)
         return values
 
     @classmethod
     def insert(cls, **kwargs):
         """Overwrite to call :meth:`create_sequence` on the fly."""
-        return super(Sequence, cls).insert(**cls.create_sequence(kwargs))
+        res = super(Sequence, cls).insert(**cls.create_sequence(kwargs))
+        cls.invalidate_cached_sequence()
+        return res
 
     @classmethod
-    def multi_insert(cls, *args):  # pragma: no cover
+    def multi_insert(cls, *args, **kwargs):
         """Overwrite to call :meth:`create_sequence` on the fly."""
+        if kwargs.get("bulk"):
+            # the sequences are created by format_bulk_values and the
+            # cached sequences are invalidated by bulk_insert
+            return super(Sequence, cls).multi_insert(*args, **kwargs)
+
         res = [cls.create_sequence(x) for x in args]
-        return super(Sequence, cls).multi_insert(*res)
+        res = super(Sequence, cls).multi_insert(*res, **kwargs)
+        cls.invalidate_cached_sequence()
+        return res
+
+    def update(self, *args, **kwargs):
+        """Overwrite to invalidate the cached sequences, the new values are
+        not flushed yet, the cache is cleared before the flush done by the
+        next query. The flushed updates are invalidated by
+        :meth:`after_update_orm_event`
+        """
+        res = super(Sequence, self).update(*args, **kwargs)
+        if kwargs.get("byquery"):
+            self.invalidate_cached_sequence()
+        else:
+            self.clear_cached_sequence()
 
-    def nextval(self):
-        """Format and return the next value of the sequence.
+        return res
 
-        :rtype: str
+    def delete(self, *args, **kwargs):
+        """Overwrite to invalidate the cached sequences deleted by query,
+        the ORM deletes are invalidated by :meth:`after_delete_orm_event`
         """
-        cls = self.__class__
-        if self.no_gap:
-            nextval = cls.execute_sql_statement(
-                cls.select_sql_statement(cls.number)
-                .with_for_update(nowait=True)
-                .where(cls.id == self.id)
+        res = super(Sequence, self).delete(*args, **kwargs)
+        if kwargs.get("byquery"):
+            self.invalidate_cached_sequence()
+
+        return res
+
+    @classmethod
+    def after_update_orm_event(cls, mapper, connection, target):
+        cls.clear_cached_sequence()
+
+    @classmethod
+    def after_delete_orm_event(cls, mapper, connection, target):
+        cls.clear_cached_sequence()
+
+    @classmethod
+    def before_update_orm_event(cls, mapper, connection, target):
+        attrs = inspect(target).attrs
+        key = anyblok_column_prefix + "allocation_size"
+        history = attrs[key if key in attrs else "allocation_size"].history
+        if not history.added:
+            return
+
+        if history.deleted:
+            size = history.deleted[0]
+        else:
+            # the saved size was not loaded before the assignment
+            size = connection.execute(
+                select(cls.allocation_size).where(cls.id == target.id)
             ).scalar()
 
-            nextval += 1
+        if history.added[0] != size:
+            raise SequenceException(
+                "The allocation_size of the sequence %r can not be modified"
+                % target.code
+            )
+
+    @classmethod
+    def invalidate_cached_sequence(cls):
+        """Invalidate the sequences cached by :meth:`get_cached_sequence`"""
+        cls.anyblok.System.Cache.invalidate(
+            cls.__registry_name__, "get_cached_sequence"
+        )
+
+    @classmethod
+    def clear_cached_sequence(cls):
+        """Clear the sequences cached by this process during a flush, the
+        invalidation is shared with the other processes just before the
+        commit, and the cache is cleared again if the transaction is rolled
+        back
+        """
+        caches = cls.anyblok.caches[cls.__registry_name__]
+        for cache in caches["get_cached_sequence"]:
+            cache.cache_clear()
+
+        cls.anyblok.System.Cache.clear_at_rollback(
+            cls.__registry_name__, "get_cached_sequence"
+        )
+        cls.precommit_hook("invalidate_cached_sequence")
+
+    @classmethod_cache()
+    def get_cached_sequence(cls, code):
+        """Return the fields of the sequence used to get its values, read
+        in the database
+
+        :param code: code of the sequence
+        :rtype: dict or None if no sequence exists for the code
+        """
+        query = (
+            cls.select_sql_statement(*cls._cached_fields)
+            .where(cls.code == code)
+            .order_by(cls.id)
+            .limit(1)
+        )
+        sequence = cls.execute_sql_statement(query).first()
+        if sequence is None:
+            return None
+
+        return dict(sequence._mapping)
+
+    @classmethod
+    def format_bulk_values(cls, values):
+        """Overwrite to call :meth:`create_sequence` on the fly."""
+        return super(Sequence, cls).format_bulk_values(
+            cls.create_sequence(dict(values))
+        )
+
+    @classmethod
+    def get_database_sequence_values(cls, seq_name, count):
+        """Return the ``count`` next values of the database sequence
+
+        :rtype: list of int
+        """
+        seq = SQLASequence(seq_name)
+        if count == 1:
+            return [cls.anyblok.scalar(seq)]
+
+        if sgdb_in(cls.anyblok.engine, ["PostgreSQL"]):
+            query = select(seq.next_value()).select_from(
+                func.generate_series(1, count)
+            )
+            return sorted(cls.anyblok.execute(query).scalars())
+
+        return [  # pragma: no cover
+            cls.anyblok.scalar(seq) for x in range(count)
+        ]
+
+    @classmethod
+    def get_allocated_values(cls, seq_name, allocation_size, count):
+        """Return the ``count`` next values of the sequence with gap, the
+        values are taken in the block already reserved by the process and
+        the missing blocks are reserved in one call of the database sequence
+
+        :rtype: list of int
+        """
+        size = allocation_size or 1
+        if size == 1:
+            return cls.get_database_sequence_values(seq_name, count)
+
+        with cls._allocation_lock:
+            block = cls._allocated_values.get(seq_name, range(0))
+            values = list(block[:count])
+            block = block[count:]
+            missing = count - len(values)
+            if missing:
+                nb_blocks = -(-missing // size)
+                for start in cls.get_database_sequence_values(
+                    seq_name, nb_blocks
+                ):
+                    block = range(start, start + size)
+                    values.extend(block[:missing])
+                    block = block[missing:]
+                    missing = count - len(values)
+
+            cls._allocated_values[seq_name] = block
 
-            cls.execute_sql_statement(
+        return values
+
+    @classmethod
+    def get_no_gap_values(cls, id_, count):
+        """Return the ``count`` next values of the sequence without gap, the
+        sequence row is locked until the end of the transaction
+
+        :rtype: list of int
+        """
+        locked = (
+            cls.select_sql_statement(cls.id)
+            .with_for_update(nowait=True)
+            .where(cls.id == id_)
+        )
+        if cls.anyblok.engine.dialect.update_returning:
+            # lock and increment the number in one statement
+            number = cls.execute_sql_statement(
                 cls.update_sql_statement()
-                .where(cls.id == self.id)
-                .values(number=nextval)
+                .where(cls.id == locked.scalar_subquery())
+                .values(number=cls.number + count)
+                .returning(cls.number)
+            ).scalar()
+            return list(range(number - count + 1, number + 1))
+
+        number = cls.execute_sql_statement(  # pragma: no cover
+            locked.with_only_columns(cls.number)
+        ).scalar()
+        cls.execute_sql_statement(  # pragma: no cover
+            cls.update_sql_statement()
+            .where(cls.id == id_)
+            .values(number=number + count)
+        )
+        return list(range(number + 1, number + count + 1))  # pragma: no cover
+
+    @classmethod
+    def get_formated_values(cls, sequence, count):
+        """Format and return the ``count`` next values of the sequence.
+
+        :param sequence: dict of the fields of the sequence, see
+            :meth:`get_cached_sequence`
+        :param count: number of values wanted
+        :rtype: list of str
+        """
+        if count <= 0:
+            return []
+
+        if sequence["no_gap"]:
+            values = cls.get_no_gap_values(sequence["id"], count)
+        else:
+            values = cls.get_allocated_values(
+                sequence["seq_name"], sequence["allocation_size"], count
+            )
+
+        return [
+            sequence["formater"].format(
+                code=sequence["code"], seq=value, id=sequence["id"]
             )
+            for value in values
+        ]
+
+    def nextvals(self, count):
+        """Format and return the ``count`` next values of the sequence.
+
+        :param count: number of values wanted
+        :rtype: list of str
+        """
+        return self.get_formated_values(
+            self.to_dict(*self._cached_fields), count
+        )
+
+    def nextval(self):
+        """Format and return the next value of the sequence.
+
+        :rtype: str
+        """
+        return self.nextvals(1)[0]
+
+    @classmethod
+    def nextvalsBy(cls, count, **crit):
+        """Return the ``count`` next values of the first Sequence matching
+        given criteria.
+
+        :param count: number of values wanted
+        :param crit: criteria to match, e.g., ``code=SO``, the sequence
+            found by ``code`` only is cached
+        :return: :meth:`nextvals` result for the first matching Sequence,
+                 or ``None`` if there's no match.
+        """
+        if list(crit) == ["code"]:
+            sequence = cls.get_cached_sequence(crit["code"])
         else:
-            nextval = self.anyblok.scalar(SQLASequence(self.seq_name))
+            filters = [getattr(cls, k) == v for k, v in crit.items()]
+            query = (
+                cls.select_sql_statement(*cls._cached_fields)
+                .where(*filters)
+                .order_by(cls.id)
+                .limit(1)
+            )
+            sequence = cls.execute_sql_statement(query).first()
+            if sequence is not None:
+                sequence = sequence._mapping
 
-        return self.formater.format(code=self.code, seq=nextval, id=self.id)
+        if sequence is None:
+            return None  # pragma: no cover
+
+        return cls.get_formated_values(sequence, count)
 
     @classmethod
     def nextvalBy(cls, **crit):
@@ -193,8 +485,8 @@ class Sequence:
         :return: :meth:`next_val` result for the first matching Sequence,
                  or ``None`` if there's no match.
         """
-        filters = [getattr(cls, k) == v for k, v in crit.items()]
-        seq = cls.query().filter(*filters).first()
-        if seq is None:
+        values = cls.nextvalsBy(1, **crit)
+        if values is None:
             return None  # pragma: no cover
-        return seq.nextval()
+
+        return values[0]
@@ -6,6 +6,8 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from unittest.mock import patch
+
 import pytest
 
 
@@ -154,3 +156,77 @@ class TestQueryScope:
         registry = rollback_registry
         query = registry.System.Sequence.query()
         assert repr(query) == str(query.sql_statement)
+
+    def test_stream(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Blok.query().order_by("name")
+        names = query.all().name
+        assert [blok.name for blok in query.stream(batch_size=2)] == names
+
+    def test_stream_expunge_the_instances(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Blok.query().order_by("name")
+        bloks = list(query.stream(batch_size=2))
+        assert len(bloks) > 2
+        assert not any(blok in registry.session for blok in bloks)
+
+    def test_stream_keep_the_instances_loaded_before(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Blok.query().order_by("name")
+        core = query.filter_by(name="anyblok-core").one()
+        bloks = list(query.stream(batch_size=2))
+        assert core in bloks
+        assert core in registry.session
+        assert not any(
+            blok in registry.session for blok in bloks if blok is not core
+        )
+
+    def test_stream_close_the_cursor(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Blok.query().order_by("name")
+        results = []
+        execute = query._execute
+
+        def _execute(*args, **kwargs):
+            res = execute(*args, **kwargs)
+            results.append(res)
+            return res
+
+        with patch.object(query, "_execute", _execute):
+            stream = query.stream(batch_size=2)
+            next(stream)
+            stream.close()
+
+        assert results[0].closed
+
+    def test_stream_without_expunge(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Blok.query().order_by("name")
+        bloks = list(query.stream(batch_size=2, expunge=False))
+        assert all(blok in registry.session for blok in bloks)
+
+    def test_stream_keep_the_modified_instances(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Blok.query().order_by("name")
+        bloks = []
+        for blok in query.stream(batch_size=2):
+            blok.author = "Modified"
+            bloks.append(blok)
+
+        assert all(blok in registry.session for blok in bloks)
+
+    def test_stream_on_some_column(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Blok.query("name").order_by("name")
+        assert list(query.stream(batch_size=2)) == query.all()
+
+    def test_dictstream(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Cache.query().order_by("id").limit(3)
+        assert list(query.dictstream(batch_size=2)) == query.dictall()
+
+    def test_dictstream_on_some_column(self, rollback_registry):
+        registry = rollback_registry
+        query = registry.System.Cache.query("id", "method")
+        query = query.order_by("id").limit(3)
+        assert list(query.dictstream(batch_size=2)) == query.dictall()
@@ -7,6 +7,7 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 import pytest
+from sqlalchemy import event
 
 
 @pytest.mark.usefixtures("rollback_registry")
@@ -24,3 +25,41 @@ class TestSystemBlok:
     def test_is_installed(self, rollback_registry):
         registry = rollback_registry
         assert registry.System.Blok.is_installed("anyblok-core") is True
+
+    def test_get_states(self, rollback_registry):
+        registry = rollback_registry
+        states = registry.System.Blok.get_states()
+        assert states["anyblok-core"] == "installed"
+
+    def test_check_if_the_conditional_are_installed_with_states(
+        self, rollback_registry
+    ):
+        registry = rollback_registry
+        Blok = registry.System.Blok
+        states = Blok.get_states()
+        for blok in states:
+            assert Blok.check_if_the_conditional_are_installed(
+                blok, states=states
+            ) is Blok.check_if_the_conditional_are_installed(blok)
+
+    def test_update_list_with_one_query(self, rollback_registry):
+        registry = rollback_registry
+        registry.System.Blok.update_list()
+        registry.flush()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(
+            registry.engine, "before_cursor_execute", before_cursor_execute
+        )
+        try:
+            registry.System.Blok.update_list()
+            registry.flush()
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", before_cursor_execute
+            )
+
+        assert len(statements) == 1
@@ -105,3 +105,94 @@ class TestSystemParameter:
         Parameter.set("test.parameter", False)
         assert query.count() == 1
         assert Parameter.get("test.parameter") is False
+
+    def test_get_is_cached(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        Parameter.set("test.parameter", True)
+        assert Parameter.get("test.parameter") is True
+        Parameter.execute_sql_statement(
+            Parameter.update_sql_statement()
+            .where(Parameter.key == "test.parameter")
+            .values(value={"value": False})
+        )
+        assert Parameter.get("test.parameter") is True
+        Parameter.invalidate_cached_value()
+        assert Parameter.get("test.parameter") is False
+
+    def test_set_invalidate_the_cache(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        assert Parameter.get("test.parameter", None) is None
+        Parameter.set("test.parameter", True)
+        assert Parameter.get("test.parameter") is True
+        Parameter.set("test.parameter", {"test": True})
+        assert Parameter.get("test.parameter") == {"test": True}
+
+    def test_rollback_clear_the_cache(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        Parameter.set("test.parameter", True)
+        savepoint = registry.begin_nested()
+        Parameter.set("test.parameter", False)
+        assert Parameter.get("test.parameter") is False
+        savepoint.rollback()
+        assert Parameter.get("test.parameter") is True
+
+    def test_bulk_insert_invalidate_the_cache(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        assert Parameter.get("test.parameter", None) is None
+        Parameter.bulk_insert(
+            {"key": "test.parameter", "value": {"value": True}}
+        )
+        assert Parameter.get("test.parameter") is True
+
+    def test_pop_invalidate_the_cache(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        Parameter.set("test.parameter", True)
+        assert Parameter.get("test.parameter") is True
+        Parameter.pop("test.parameter")
+        assert Parameter.get("test.parameter", None) is None
+
+    def test_get_return_a_copy_of_the_cached_value(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        Parameter.set("test.parameter", {"test": True})
+        Parameter.get("test.parameter")["test"] = False
+        assert Parameter.get("test.parameter") == {"test": True}
+
+    def test_set_existing_key_loaded_in_the_session(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        Parameter.set("test.parameter", True)
+        param = Parameter.from_primary_keys(key="test.parameter")
+        assert param.value == {"value": True}
+        Parameter.set("test.parameter", {"test": True})
+        assert param.value == {"test": True}
+        assert param.multi is True
+
+    def test_get_many(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        Parameter.set("test.parameter", True)
+        Parameter.set("test.parameter.multi", {"test": True})
+        assert Parameter.get_many(
+            ["test.parameter", "test.parameter.multi"]
+        ) == {"test.parameter": True, "test.parameter.multi": {"test": True}}
+        assert Parameter.get_many([]) == {}
+
+    def test_get_many_with_default(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        Parameter.set("test.parameter", True)
+        assert Parameter.get_many(
+            ["test.parameter", "test.parameter.unexisting"], default=None
+        ) == {"test.parameter": True, "test.parameter.unexisting": None}
+
+    def test_get_many_unexisting_key(self, rollback_registry):
+        registry = rollback_registry
+        Parameter = registry.System.Parameter
+        with pytest.raises(ParameterException):
+            Parameter.get_many(["test.parameter"])
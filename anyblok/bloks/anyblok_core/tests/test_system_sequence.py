@@ -6,10 +6,17 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from itertools import count
+from threading import Event, Thread, current_thread, main_thread
+from unittest.mock import patch
+
 import pytest
+from sqlalchemy import event
 
 from anyblok.testing import sgdb_in
 
+from ..exceptions import SequenceException
+
 
 @pytest.mark.skipif(sgdb_in(["MySQL", "MariaDB", "MsSQL"]), reason="ISSUE #89")
 @pytest.mark.usefixtures("rollback_registry")
@@ -76,3 +83,259 @@ class TestSystemSequence:
         assert Sequence.nextvalBy(code=seq.code) == str(number + 1)
         assert Sequence.nextvalBy(code=seq.code) == str(number + 2)
         assert Sequence.nextvalBy(code=seq.code) == str(number + 3)
+
+    def test_nextvals(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", formater="prefix_{seq}")
+        assert seq.nextvals(3) == ["prefix_1", "prefix_2", "prefix_3"]
+        assert seq.nextval() == "prefix_4"
+        assert seq.nextvals(0) == []
+
+    def test_nextvals_no_gap(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", no_gap=True)
+        assert seq.nextvals(3) == ["1", "2", "3"]
+        assert seq.nextval() == "4"
+        assert Sequence.query().get(seq.id).number == 4
+
+    def test_nextvals_by_attribute(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        Sequence.insert(code="test.sequence", formater="prefix_{seq}")
+        assert Sequence.nextvalsBy(2, code="test.sequence") == [
+            "prefix_1",
+            "prefix_2",
+        ]
+        assert Sequence.nextvalsBy(1, formater="prefix_{seq}") == ["prefix_3"]
+
+    def test_nextval_by_code_is_cached(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence")
+        assert Sequence.nextvalBy(code="test.sequence") == "1"
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(registry.engine, "before_cursor_execute", count_statements)
+        try:
+            assert Sequence.nextvalBy(code="test.sequence") == "2"
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", count_statements
+            )
+
+        assert len(statements) == 1
+        seq.update(formater="prefix_{seq}")
+        assert Sequence.nextvalBy(code="test.sequence") == "prefix_3"
+
+    def test_assignment_invalidate_the_cached_sequence(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence")
+        assert Sequence.nextvalBy(code="test.sequence") == "1"
+        seq.formater = "prefix_{seq}"
+        registry.flush()
+        assert Sequence.nextvalBy(code="test.sequence") == "prefix_2"
+
+    def test_delete_invalidate_the_cached_sequence(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence")
+        assert Sequence.nextvalBy(code="test.sequence") == "1"
+        seq.delete()
+        assert Sequence.get_cached_sequence("test.sequence") is None
+
+    def test_delete_by_query_invalidate_the_cached_sequence(
+        self, rollback_registry
+    ):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence")
+        assert Sequence.nextvalBy(code="test.sequence") == "1"
+        seq.delete(byquery=True)
+        assert Sequence.get_cached_sequence("test.sequence") is None
+
+    def test_update_by_query_invalidate_the_cached_sequence(
+        self, rollback_registry
+    ):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence")
+        assert Sequence.nextvalBy(code="test.sequence") == "1"
+        seq.update(byquery=True, formater="prefix_{seq}")
+        assert Sequence.nextvalBy(code="test.sequence") == "prefix_2"
+
+    def test_orm_invalidation_is_shared_at_commit(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence")
+        registry.flush()
+        seq.formater = "prefix_{seq}"
+        with patch.object(Sequence, "invalidate_cached_sequence") as invalidate:
+            registry.flush()
+            invalidate.assert_not_called()
+            registry.apply_precommit_hook()
+            invalidate.assert_called_once_with()
+
+    def test_bulk_insert_invalidate_the_cached_sequences(
+        self, rollback_registry
+    ):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        assert Sequence.get_cached_sequence("test.sequence") is None
+        Sequence.bulk_insert({"code": "test.sequence"})
+        assert Sequence.nextvalBy(code="test.sequence") == "1"
+
+    def test_nextvals_no_gap_in_one_statement(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", no_gap=True)
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(registry.engine, "before_cursor_execute", count_statements)
+        try:
+            assert seq.nextvals(3) == ["1", "2", "3"]
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", count_statements
+            )
+
+        assert len(statements) == 1
+        assert seq.number == 3
+
+    def test_nextval_with_allocation_size(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", allocation_size=5)
+        assert [seq.nextval() for x in range(7)] == [
+            str(x) for x in range(1, 8)
+        ]
+        assert Sequence._allocated_values[seq.seq_name] == range(8, 11)
+
+    def test_nextvals_with_allocation_size(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", allocation_size=5)
+        assert seq.nextvals(2) == ["1", "2"]
+        assert seq.nextvals(12) == [str(x) for x in range(3, 15)]
+        assert seq.nextval() == "15"
+        assert seq.nextval() == "16"
+
+    def test_nextvals_with_allocation_size_in_one_call(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", allocation_size=5)
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(registry.engine, "before_cursor_execute", count_statements)
+        try:
+            assert len(seq.nextvals(20)) == 20
+            assert len(seq.nextvals(3)) == 3
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", count_statements
+            )
+
+        assert len(statements) == 2
+
+    def test_allocation_size_increment_the_database_sequence(
+        self, rollback_registry
+    ):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", allocation_size=5)
+        other = Sequence.query().get(seq.id)
+        Sequence._allocated_values.clear()
+        assert seq.nextval() == "1"
+        Sequence._allocated_values.clear()
+        assert other.nextval() == "6"
+
+    def test_allocation_size_can_not_be_modified(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", allocation_size=5)
+        seq.update(allocation_size=5, formater="prefix_{seq}")
+        registry.flush()
+        with pytest.raises(SequenceException):
+            seq.update(allocation_size=10)
+            registry.flush()
+
+    def test_allocation_size_not_loaded_can_not_be_modified(
+        self, rollback_registry
+    ):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq = Sequence.insert(code="test.sequence", allocation_size=5)
+        registry.flush()
+        registry.expire(seq, ["allocation_size"])
+        seq.allocation_size = 10
+        with pytest.raises(SequenceException):
+            registry.flush()
+
+    def test_multi_insert(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        seq1, seq2 = Sequence.multi_insert(
+            {"code": "test.sequence1"},
+            {"code": "test.sequence2", "formater": "prefix_{seq}"},
+        )
+        assert seq1.seq_name != seq2.seq_name
+        assert Sequence.nextvalBy(code="test.sequence1") == "1"
+        assert Sequence.nextvalBy(code="test.sequence2") == "prefix_1"
+
+    def test_multi_insert_bulk(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        assert Sequence.get_cached_sequence("test.sequence") is None
+        rows = Sequence.multi_insert(
+            {"code": "test.sequence"}, bulk=True, returning=["seq_name"]
+        )
+        assert rows[0].seq_name
+        assert Sequence.nextvalBy(code="test.sequence") == "1"
+
+    def test_allocated_values_with_threads(self, rollback_registry):
+        registry = rollback_registry
+        Sequence = registry.System.Sequence
+        Sequence._allocated_values.pop("test.sequence", None)
+        starts = count(1, 5)
+        in_database = Event()
+        allocated = Event()
+
+        def get_database_sequence_values(seq_name, nb_blocks):
+            if current_thread() is not main_thread():
+                # the main thread allocates during the database call
+                in_database.set()
+                allocated.wait(0.2)
+
+            return [next(starts) for x in range(nb_blocks)]
+
+        def allocate(nb_values):
+            values.extend(
+                Sequence.get_allocated_values("test.sequence", 5, nb_values)
+            )
+
+        values = []
+        with patch.object(
+            Sequence,
+            "get_database_sequence_values",
+            side_effect=get_database_sequence_values,
+        ):
+            allocate(3)
+            thread = Thread(target=allocate, args=(3,))
+            thread.start()
+            in_database.wait(1)
+            allocate(1)
+            allocated.set()
+            thread.join()
+
+        assert sorted(values) == [1, 2, 3, 4, 5, 6, 7]
@@ -7,12 +7,65 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 from anyblok import Declarations
 from anyblok.column import String
+from anyblok.declarations import classmethod_cache
 
 
 @Declarations.register(Declarations.Model.Authorization)
 class ModelPermissionGrant:
-    """Default model for ModelBasedAuthorizationRule"""
+    """Default model for ModelBasedAuthorizationRule
+
+    The grants are cached by principals and permission, the cache is
+    invalidated when a grant is inserted, updated or deleted by the ORM,
+    or inserted by ``bulk_insert``. The grants modified by another SQL
+    statement must call :meth:`invalidate_grants`
+    """
 
     model = String(primary_key=True)
     principal = String(primary_key=True)
     permission = String(primary_key=True)
+
+    @classmethod_cache()
+    def get_granted_models(cls, principals, permission):
+        """Return the models on which one of the principals has the permission
+
+        :param principals: frozenset of strings
+        :rtype: frozenset of registry names
+        """
+        query = cls.select_sql_statement(cls.model).where(
+            cls.principal.in_(principals), cls.permission == permission
+        )
+        return frozenset(cls.execute_sql_statement(query.distinct()).scalars())
+
+    @classmethod
+    def invalidate_grants(cls):
+        """Invalidate the cache of the grants"""
+        cls.anyblok.System.Cache.invalidate(
+            cls.__registry_name__, "get_granted_models"
+        )
+
+    @classmethod
+    def clear_grants_cache(cls):
+        """Clear the cache of the grants of this process, the invalidation
+        is shared with the other processes just before the commit, and the
+        cache is cleared again if the transaction is rolled back
+        """
+        caches = cls.anyblok.caches[cls.__registry_name__]
+        for cache in caches["get_granted_models"]:
+            cache.cache_clear()
+
+        cls.anyblok.System.Cache.clear_at_rollback(
+            cls.__registry_name__, "get_granted_models"
+        )
+        cls.precommit_hook("invalidate_grants")
+
+    @classmethod
+    def after_insert_orm_event(cls, mapper, connection, target):
+        cls.clear_grants_cache()
+
+    @classmethod
+    def after_update_orm_event(cls, mapper, connection, target):
+        cls.clear_grants_cache()
+
+    @classmethod
+    def after_delete_orm_event(cls, mapper, connection, target):
+        cls.clear_grants_cache()
@@ -0,0 +1,237 @@
+# This file is a part of the AnyBlok project
+#
+#    Copyright (C) 2024 Jean-Sebastien SUZANNE <js.suzanne@gmail.com>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file,You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+"""Transports used by ``Model.System.Cache`` to share the invalidations of
+the cached methods between the processes connected to the same database.
+
+The invalidations are always saved in the ``system_cache`` table, the
+transport only defines how the other processes learn about them:
+
+* ``table``: poll the ``system_cache`` table (available for all the dialects)
+* ``postgresql-notify``: PostgreSQL ``LISTEN`` / ``NOTIFY``, the table is only
+  read when the listening connection is (re)opened
+
+The transport is chosen with the ``cache_invalidation_transport``
+configuration, by default the first available transport for the dialect is
+used. New transports must be exposed as entry point in the namespace
+``anyblok.cache.invalidation``.
+"""
+from abc import ABC, abstractmethod
+from json import dumps, loads
+from logging import getLogger
+
+from sqlalchemy import text
+
+from .common import sgdb_in
+from .config import Configuration
+from .pkg_metadata import iter_entry_points
+
+logger = getLogger(__name__)
+
+CACHE_INVALIDATION_NAMESPACE = "anyblok.cache.invalidation"
+
+
+class CacheInvalidationTransportException(Exception):
+    """Simple exception for the cache invalidation transports"""
+
+
+class CacheInvalidationTransport(ABC):
+    """Base class of the cache invalidation transports
+
+    Must be exposed as entry point in namespace
+    ``anyblok.cache.invalidation``, the subclasses must define
+    ``get_invalidation``
+    """
+
+    dialect = None
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    @classmethod
+    def is_available(cls, registry):
+        """Return True if the transport can be used by the registry"""
+        if cls.dialect is None:
+            return True
+
+        dialects = cls.dialect
+        if not isinstance(dialects, (list, tuple)):
+            dialects = [dialects]
+
+        return sgdb_in(registry.engine, dialects)
+
+    def publish(self, invalidations):
+        """Propagate the invalidations saved by the current process
+
+        :param invalidations: list of ``Model.System.Cache`` instances or rows
+            with the ``id``, ``registry_name`` and ``method``
+        """
+
+    @abstractmethod
+    def get_invalidation(self):
+        """Return the invalidations done by the other processes
+
+        :rtype: list of tuple (registry_name, method)
+        """
+
+    def close(self):
+        """Release the resources of the transport"""
+
+
+class TableInvalidationTransport(CacheInvalidationTransport):
+    """Poll the ``system_cache`` table on each call"""
+
+    def get_invalidation(self):
+        return self.registry.System.Cache.get_invalidated_methods()
+
+
+class PostgreSQLNotifyInvalidationTransport(TableInvalidationTransport):
+    """Use ``LISTEN`` / ``NOTIFY`` on a PostgreSQL channel
+
+    The ``NOTIFY`` is sent in the same transaction than the insertion in
+    ``system_cache``, so the other processes receive it only after the
+    commit. A dedicated connection, outside of the pool, listens the
+    channel. The table is polled when this connection is opened, to get
+    the invalidations missed while nobody was listening.
+    """
+
+    dialect = ["PostgreSQL"]
+    drivers = ("psycopg2", "psycopg")
+    channel = "anyblok_cache_invalidation"
+
+    def __init__(self, registry):
+        super(PostgreSQLNotifyInvalidationTransport, self).__init__(registry)
+        self.connection = None
+
+    @classmethod
+    def is_available(cls, registry):
+        """The notifications are only sent on commit, the unittest
+        registries are never commited
+        """
+        if registry.unittest:
+            return False
+
+        if registry.engine.dialect.driver not in cls.drivers:
+            return False  # pragma: no cover
+
+        return super(PostgreSQLNotifyInvalidationTransport, cls).is_available(
+            registry
+        )
+
+    def format_payload(self, id_, registry_name, method):
+        return dumps(dict(id=id_, registry_name=registry_name, method=method))
+
+    def publish(self, invalidations):
+        for invalidation in invalidations:
+            self.registry.execute(
+                text("SELECT pg_notify(:channel, :payload)").bindparams(
+                    channel=self.channel,
+                    payload=self.format_payload(
+                        invalidation.id,
+                        invalidation.registry_name,
+                        invalidation.method,
+                    ),
+                )
+            )
+
+    def listen(self):
+        """Open the dedicated connection and listen the channel"""
+        engine = self.registry.engine
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        connection = engine.dialect.connect(*cargs, **cparams)
+        connection.autocommit = True
+        cursor = connection.cursor()
+        cursor.execute('LISTEN "%s"' % self.channel)
+        cursor.close()
+        self.connection = connection
+
+    def receive(self):
+        """Return the payloads received since the last call"""
+        if hasattr(self.connection, "poll"):
+            # psycopg2
+            self.connection.poll()
+            notifies = self.connection.notifies[:]
+            del self.connection.notifies[:]
+        else:
+            # psycopg >= 3.2
+            notifies = list(self.connection.notifies(timeout=0))
+
+        return [notify.payload for notify in notifies]
+
+    def get_invalidation(self):
+        Cache = self.registry.System.Cache
+        res = []
+        try:
+            if self.connection is None:
+                self.listen()
+                res.extend(Cache.get_invalidated_methods())
+
+            payloads = self.receive()
+        except Exception as e:
+            logger.warning(
+                "The cache invalidation channel is lost (%s), "
+                "the next call will listen it again",
+                e,
+            )
+            self.close()
+            return res or Cache.get_invalidated_methods()
+
+        for payload in payloads:
+            payload = loads(payload)
+            Cache.last_cache_id = max(Cache.last_cache_id, payload["id"])
+            res.append((payload["registry_name"], payload["method"]))
+
+        return res
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:  # pragma: no cover
+                pass
+
+            self.connection = None
+
+
+def get_cache_invalidation_transport(registry, name=None):
+    """Return the cache invalidation transport instance for the registry
+
+    :param registry: the registry which uses the transport
+    :param name: name of the entry point, if None the configuration
+        ``cache_invalidation_transport`` is used, and if it is not defined
+        the first available transport for the dialect
+    :rtype: instance of ``CacheInvalidationTransport``
+    :exception: CacheInvalidationTransportException
+    """
+    if name is None:
+        name = Configuration.get("cache_invalidation_transport")
+
+    entry_points = {
+        entry_point.name: entry_point
+        for entry_point in iter_entry_points(CACHE_INVALIDATION_NAMESPACE)
+    }
+    if name:
+        if name not in entry_points:
+            raise CacheInvalidationTransportException(
+                "Unknown cache invalidation transport %r" % name
+            )
+
+        return entry_points[name].load()(registry)
+
+    def dialect_sort(transport):
+        """Sort transports with dialect not None first"""
+        return (transport.dialect is None, str(transport.dialect))
+
+    transports = sorted(
+        (entry_point.load() for entry_point in entry_points.values()),
+        key=dialect_sort,
+    )
+    for transport in transports:
+        if transport.is_available(registry):
+            return transport(registry)
+
+    return TableInvalidationTransport(registry)  # pragma: no cover
@@ -17,11 +17,21 @@ from hashlib import md5
 from inspect import ismethod
 from json import dumps, loads
 from logging import getLogger
+from types import MappingProxyType
 
 import pytz
 from dateutil.parser import parse
 from sqlalchemy import JSON as SA_JSON
-from sqlalchemy import CheckConstraint, and_, or_, types
+from sqlalchemy import (
+    CheckConstraint,
+    Index,
+    and_,
+    column,
+    or_,
+    table,
+    text,
+    types,
+)
 from sqlalchemy.schema import Column as SA_Column
 from sqlalchemy.schema import Sequence as SA_Sequence
 from sqlalchemy_utils.types.color import ColorType
@@ -36,7 +46,7 @@ from sqlalchemy_utils.types.uuid import UUIDType
 
 from anyblok.config import Configuration
 
-from .common import sgdb_in
+from .common import model_name, sgdb_in
 from .field import Field, FieldException
 from .mapper import ModelAttribute, ModelAttributeAdapter
 
@@ -168,6 +178,15 @@ class Column(Field):
     foreign_key = None
     sqlalchemy_type = None
     type = None
+    direct_mapping_methods = (
+        "get_property",
+        "wrap_getter_column",
+        "wrap_setter_column",
+        "wrap_expr_column",
+        "getter_format_value",
+        "setter_format_value",
+    )
+    """Methods which must not be overwritten to map the column directly"""
 
     def __init__(self, *args, **kwargs):
         """Initialize the column
@@ -351,6 +370,23 @@ class Column(Field):
 
         return False
 
+    def can_be_mapped_directly(self):
+        """Return True if the column can be mapped by SQLAlchemy under its
+        name, without hybrid property
+
+        The getter and the setter must not format the value, and the
+        primary and foreign keys are always wrapped, the relationships use
+        them
+        """
+        if self.foreign_key is not None or self.kwargs.get("primary_key"):
+            return False
+
+        cls = self.__class__
+        return all(
+            getattr(cls, method) is getattr(Column, method)
+            for method in self.direct_mapping_methods
+        )
+
 
 class ForbiddenPrimaryKey:
     """Mixin to forbid primary key on column type"""
@@ -959,18 +995,42 @@ class StrSelection(str):
     selections = dumps({})
     registry = None
     namespace = None
+    compiled_selections = MappingProxyType({})
+    """Frozen mapping {key: label} of the selections, None if the
+    selections are given by the method ``selections_method`` of the model"""
+    selections_method = None
+    last_selections = (None, None)
+
+    @classmethod
+    def compile_selections(cls, selections):
+        """Return the frozen mapping {key: label} of the selections
+
+        :param selections: dict or list of tuple (key, label)
+        :rtype: MappingProxyType
+        """
+        return MappingProxyType(dict(selections))
 
     def get_selections(self):
-        """Return a dict of selections
+        """Return the selections
 
-        :return: selections dict
+        The selections given by a method of the model are compiled again
+        only if the method returns another object, the method can be cached
+        with ``classmethod_cache``
+
+        :return: frozen mapping {key: label}
         """
-        selections = loads(self.selections)
-        if isinstance(selections, dict):
-            return selections
-        if isinstance(selections, str):
-            m = self.registry.get(self.namespace)
-            return dict(getattr(m, selections)())
+        cls = self.__class__
+        if cls.compiled_selections is not None:
+            return cls.compiled_selections
+
+        Model = self.registry.get(self.namespace)
+        selections = getattr(Model, cls.selections_method)()
+        last_selections, compiled_selections = cls.last_selections
+        if last_selections is not selections:
+            compiled_selections = cls.compile_selections(selections)
+            cls.last_selections = (selections, compiled_selections)
+
+        return compiled_selections
 
     def validate(self):
         """Validate if the key is in the selections
@@ -978,7 +1038,7 @@ class StrSelection(str):
         :return: True or False
         """
         a = super(StrSelection, self).__str__()
-        return a in self.get_selections().keys()
+        return a in self.get_selections()
 
     @property
     def label(self):
@@ -997,7 +1057,7 @@ class SelectionType(types.TypeDecorator):
     cache_ok = True
 
     def __init__(self, selections, size, registry=None, namespace=None):
-        super(SelectionType, self).__init__(length=size)
+        super(SelectionType, self).__init__(**self.get_impl_kwargs(size))
         self.size = size
         if isinstance(selections, (dict, str)):
             self.selections = selections
@@ -1018,6 +1078,15 @@ class SelectionType(types.TypeDecorator):
                         % (k, len(k), size)
                     )
 
+        if isinstance(self.selections, dict):
+            compiled_selections = StrSelection.compile_selections(
+                self.selections
+            )
+            selections_method = None
+        else:
+            compiled_selections = None
+            selections_method = self.selections
+
         self.selections = dumps(self.selections)
         self._StrSelection = type(
             "StrSelection",
@@ -1026,9 +1095,15 @@ class SelectionType(types.TypeDecorator):
                 "selections": self.selections,
                 "registry": registry,
                 "namespace": namespace,
+                "compiled_selections": compiled_selections,
+                "selections_method": selections_method,
             },
         )
 
+    def get_impl_kwargs(self, size):
+        """Return the kwargs of the type used to save the keys"""
+        return {"length": size}
+
     @property
     def python_type(self):
         return self._StrSelection
@@ -1043,6 +1118,77 @@ class SelectionType(types.TypeDecorator):
         return value
 
 
+class SmallIntSelectionType(SelectionType):
+    """Type for Column Selection which saves the code of the keys
+
+    ::
+
+        SmallIntSelectionType({'draft': 'Draft', 'done': 'Done'}, 64,
+                              codes={'draft': 1, 'done': 2})
+
+    The codes are required, a code deduced from the position of the key
+    would change with the order of the selections
+    """
+
+    impl = types.SmallInteger
+    cache_ok = True
+
+    def __init__(
+        self, selections, size, codes=None, registry=None, namespace=None
+    ):
+        super(SmallIntSelectionType, self).__init__(
+            selections, size, registry=registry, namespace=namespace
+        )
+        if codes is None:
+            raise FieldException(
+                "The codes must be defined for the storage 'smallint'"
+            )
+        elif isinstance(codes, (list, tuple)):
+            codes = dict(codes)
+
+        compiled_selections = self._StrSelection.compiled_selections or {}
+        missing = set(compiled_selections) - set(codes)
+        if missing:
+            raise FieldException(
+                "No code defined for the keys %s" % ", ".join(sorted(missing))
+            )
+
+        for key, code in codes.items():
+            if not isinstance(code, int) or isinstance(code, bool):
+                raise FieldException("The code of %r must be an int" % key)
+
+        if len(set(codes.values())) != len(codes):
+            raise FieldException("The codes must be unique, get %r" % codes)
+
+        # tuple to keep the type hashable for the SQLAlchemy cache key
+        self.codes = tuple(sorted(codes.items(), key=lambda x: x[1]))
+        self.code_by_key = dict(self.codes)
+        self.key_by_code = {code: key for key, code in self.codes}
+
+    def get_impl_kwargs(self, size):
+        return {}
+
+    def process_bind_param(self, value, engine):
+        if value is None:
+            return None
+
+        if value not in self.code_by_key:
+            raise FieldException(
+                "%r is not in the selections (%s)"
+                % (value, ", ".join(self.code_by_key))
+            )
+
+        return self.code_by_key[value]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+
+        # an unknown code is returned as is, like an unknown key saved as
+        # string
+        return self.key_by_code.get(value, str(value))
+
+
 class Selection(Column):
     """Selection column
 
@@ -1061,16 +1207,53 @@ class Selection(Column):
 
             x = Selection(selections=STATUS, size=64, default=u'draft')
 
+    The selections can be given by a classmethod of the model
+    (``selections='get_status'``). The method is called by each validation
+    and each label, and the selections are compiled again only when it
+    returns another object. It is not cached by the column, because it may
+    return dynamic selections, decorate it with ``classmethod_cache`` to
+    call it once by invalidation of ``Model.System.Cache``.
+
+    The keys are saved as string, with ``storage='smallint'`` only the code
+    of the keys is saved, the codes are required::
+
+            x = Selection(selections=STATUS, storage='smallint',
+                          codes={'draft': 1, 'done': 2})
     """
 
+    storages = ("string", "smallint")
+
     def __init__(self, *args, **kwargs):
         self.selections = tuple()
         if "selections" in kwargs:
             self.selections = kwargs.pop("selections")
 
         self.size = kwargs.pop("size", 64)
+        self.storage = kwargs.pop("storage", "string")
+        self.codes = kwargs.pop("codes", None)
         self.sqlalchemy_type = "tmp value for assert"
 
+        if self.storage not in self.storages:
+            raise FieldException(
+                "Unknown storage %r, waiting one of %s"
+                % (self.storage, ", ".join(self.storages))
+            )
+
+        if self.storage == "string" and self.codes is not None:
+            raise FieldException(
+                "The codes are only used by the storage 'smallint'"
+            )
+
+        if self.storage == "smallint" and self.codes is None:
+            raise FieldException(
+                "The codes must be defined for the storage 'smallint'"
+            )
+
+        if self.storage != "string" and kwargs.get("encrypt_key"):
+            raise FieldException(
+                "The storage %r can not be encrypted" % self.storage
+            )
+
         super(Selection, self).__init__(*args, **kwargs)
 
     def autodoc_get_properties(self):
@@ -1081,6 +1264,7 @@ class Selection(Column):
         res = super(Selection, self).autodoc_get_properties()
         res["selections"] = self.selections
         res["size"] = self.size
+        res["storage"] = self.storage
         return res
 
     def getter_format_value(self, value):
@@ -1122,13 +1306,31 @@ class Selection(Column):
         :param properties: the properties of the model
         :return: instance of the real field
         """
-        self.sqlalchemy_type = SelectionType(
-            self.selections, self.size, registry=registry, namespace=namespace
-        )
+        self.sqlalchemy_type = self.get_selection_type(registry, namespace)
         return super(Selection, self).get_sqlalchemy_mapping(
             registry, namespace, fieldname, properties
         )
 
+    def get_selection_type(self, registry, namespace):
+        """Return the SQLAlchemy type of the storage
+
+        :param registry: the current registry
+        :param namespace: the namespace of the model
+        :return: instance of SelectionType
+        """
+        if self.storage == "smallint":
+            return SmallIntSelectionType(
+                self.selections,
+                self.size,
+                codes=self.codes,
+                registry=registry,
+                namespace=namespace,
+            )
+
+        return SelectionType(
+            self.selections, self.size, registry=registry, namespace=namespace
+        )
+
     def update_description(self, registry, model, res):
         """Update model description
 
@@ -1193,13 +1395,26 @@ class Selection(Column):
 
             enum = enum.keys()
 
+        quote, suffix = "'", "_types"
+        if self.storage == "smallint":
+            code_by_key = self.sqlalchemy_type.code_by_key
+            enum = [str(code_by_key[x]) for x in enum if x in code_by_key]
+            quote, suffix = "", "_codes"
+
         if len(enum) > 1:
-            constraint = """"%s" in ('%s')""" % (
+            constraint = """"%s" in (%s%s%s)""" % (
                 self.fieldname,
-                "', '".join(enum),
+                quote,
+                (quote + ", " + quote).join(enum),
+                quote,
             )
         elif enum:
-            constraint = """"%s" = '%s'""" % (self.fieldname, list(enum)[0])
+            constraint = """"%s" = %s%s%s""" % (
+                self.fieldname,
+                quote,
+                list(enum)[0],
+                quote,
+            )
         else:
             constraint = None
 
@@ -1208,7 +1423,7 @@ class Selection(Column):
             enum.sort()
             key = md5()
             key.update(str(enum).encode("utf-8"))
-            name = self.fieldname + "_" + key.hexdigest() + "_types"
+            name = self.fieldname + "_" + key.hexdigest() + suffix
             return [CheckConstraint(constraint, name=name)]
 
         return []
@@ -1387,6 +1602,15 @@ class Sequence(String):
         res["no_gap"] = self.no_gap
         return res
 
+    def get_sequence_code(self, namespace, fieldname):
+        """Return the code of the ``Model.System.Sequence`` used
+
+        :param namespace: the namespace of the model
+        :param fieldname: the fieldname of the model
+        :rtype: str
+        """
+        return self.code if self.code else "%s=>%s" % (namespace, fieldname)
+
     def wrap_default(self, registry, namespace, fieldname, properties):
         """Return default wrapper
 
@@ -1402,7 +1626,7 @@ class Sequence(String):
         elif registry._need_sequence_to_create_if_not_exist is None:
             registry._need_sequence_to_create_if_not_exist = []
 
-        code = self.code if self.code else "%s=>%s" % (namespace, fieldname)
+        code = self.get_sequence_code(namespace, fieldname)
         registry._need_sequence_to_create_if_not_exist.append(
             {"code": code, "formater": self.formater, "no_gap": self.no_gap}
         )
@@ -2336,6 +2560,54 @@ def instance_validator_all(instance):
     return True
 
 
+def load_model_references(registry, values):
+    """Load the instances referenced by the values of ``ModelReference``
+    columns, with one query by referenced model. The instances already
+    in the session are not loaded again
+
+    .. note::
+
+        The session keeps only weak references on the unmodified
+        instances, the returned list must be kept while the referenced
+        instances are used
+
+    :param registry: the current registry
+    :param values: list of the values {model: , primary_keys: }
+    :rtype: list of the referenced instances
+    """
+    res = []
+    pks_by_model = {}
+    seen = set()
+    for value in values:
+        if not isinstance(value, dict):
+            continue
+
+        model = value.get("model")
+        pks = value.get("primary_keys")
+        if model not in registry.loaded_namespaces or not pks:
+            continue
+
+        key = (model, tuple(sorted(pks.items())))
+        if key in seen:
+            continue
+
+        seen.add(key)
+        Model = registry.get(model)
+        if not hasattr(Model, "from_identity_map"):
+            continue
+
+        instance = Model.from_identity_map(**pks)
+        if instance is not None:
+            res.append(instance)
+        else:
+            pks_by_model.setdefault(model, []).append(pks)
+
+    for model, pks in pks_by_model.items():
+        res.extend(registry.get(model).from_multi_primary_keys(*pks))
+
+    return res
+
+
 class ModelReferenceType(types.JSON):
     """Generic type for Column ModelFieldSelection"""
 
@@ -2388,9 +2660,7 @@ class ModelReferenceType(types.JSON):
             return model_validator(Model)
 
         def validate_instance(value):
-            instance = registry.get(value["model"]).from_primary_keys(
-                **value["primary_keys"]
-            )
+            instance = self.get_instance(value)
 
             if isinstance(instance_validator, str):
                 return getattr(instance, instance_validator)()
@@ -2407,11 +2677,21 @@ class ModelReferenceType(types.JSON):
         super(ModelReferenceType, self).__init__(none_as_null=True)
 
     def get_instance(self, value):
+        """Return the referenced instance, the session is used before
+        to query the database
+
+        :param value: dict {model: , primary_keys: }
+        :return: instance or None
+        """
         if value:
             value = instanceToDict(value)
-            value = self.registry.get(value["model"]).from_primary_keys(
-                **value["primary_keys"]
-            )
+            Model = self.registry.get(value["model"])
+            pks = value["primary_keys"]
+            instance = Model.from_identity_map(**pks)
+            if instance is None:
+                instance = Model.from_primary_keys(**pks)
+
+            value = instance
 
         return value
 
@@ -2462,9 +2742,22 @@ class ModelReference(Json):
 
         anyblok.Test.query().filter(Test.x.is_(instance))
         anyblok.Test.query().filter(Test.x.with_models(anyblok.System.Blok))
+
+    With ``index=True`` an expression index is added on the model of the
+    reference, and on the primary keys given by ``index_primary_keys``, the
+    filters ``is_`` and ``with_models`` use this index::
+
+        x = ModelReference(index=True, index_primary_keys=["id"])
+
+    .. warning::
+
+        MySQL, MariaDB and MsSQL can not index these expressions, the index
+        is not created
     """
 
     def __init__(self, *args, **kwargs):
+        self.index = kwargs.pop("index", False)
+        self.index_primary_keys = tuple(kwargs.pop("index_primary_keys", ()))
         self.model_validator = None
         if "model_validator" in kwargs:
             self.model_validator = kwargs.pop("model_validator")
@@ -2487,8 +2780,78 @@ class ModelReference(Json):
         res = super(ModelReference, self).autodoc_get_properties()
         res["model_validator"] = str(self.model_validator)
         res["instance_validator"] = str(self.instance_validator)
+        res["index"] = self.index
+        res["index_primary_keys"] = self.index_primary_keys
         return res
 
+    autodoc_omit_property_values = Json.autodoc_omit_property_values.union(
+        (
+            ("index", False),
+            ("index_primary_keys", ()),
+        )
+    )
+
+    def update_properties(self, registry, namespace, fieldname, properties):
+        """Update column properties
+
+        :param registry: the current registry
+        :param namespace: the namespace of the model
+        :param fieldname: the fieldname of the model
+        :param properties: the properties of the model
+        """
+        super(ModelReference, self).update_properties(
+            registry, namespace, fieldname, properties
+        )
+        self.fieldname = fieldname
+        if self.index:
+            properties["add_in_table_args"].append(self)
+
+    def get_index_expressions(self, registry):
+        """Return the expressions of the index, compiled as the filters
+        ``is_`` and ``with_models`` are compiled to be used by the database
+
+        :param registry: the current registry
+        :return: list of text expressions
+        """
+        expr = column(self.db_column_name or self.fieldname, SA_JSON())
+        expressions = [expr["model"].as_string()]
+        expressions.extend(
+            expr["primary_keys"][pk].as_string()
+            for pk in self.index_primary_keys
+        )
+        return [
+            text(
+                str(
+                    expression.compile(
+                        dialect=registry.engine.dialect,
+                        compile_kwargs={"literal_binds": True},
+                    )
+                )
+            )
+            for expression in expressions
+        ]
+
+    def update_table_args(self, registry, Model):
+        """Return the expression index on the model and the primary keys
+
+        :param registry:
+        :param Model:
+        :return: list of Index
+        """
+        if self.encrypt_key:
+            # the value is crypted, the expressions can not be extracted
+            return []
+
+        if sgdb_in(registry.engine, ["MariaDB", "MsSQL", "MySQL"]):
+            # No index on the JSON expressions
+            return []
+
+        name = "anyblok_ix_%s__%s_references" % (
+            model_name(None, table(Model.__tablename__)),
+            self.fieldname,
+        )
+        return [Index(name, *self.get_index_expressions(registry))]
+
     def getter_format_value(self, value):
         """Return formatted value
 
@@ -846,6 +846,20 @@ def add_configuration_file(parser):
         dest="withoutautomigration",
         action="store_true",
     )
+    parser.add_argument(
+        "--skip-unchanged-migration",
+        dest="skip_unchanged_migration",
+        action="store_true",
+        help="Skip the migration when the installed bloks and their "
+        "declarations did not change since the last migration",
+    )
+    parser.add_argument(
+        "--scoped-migration",
+        dest="scoped_migration",
+        action="store_true",
+        help="Only compare the tables of the bloks to install or to update "
+        "during the migration",
+    )
     parser.add_argument(
         "--ignore-migration-for-models",
         nargs="+",
@@ -867,6 +881,28 @@ def add_configuration_file(parser):
             "AUTOCOMMIT",
         ],
     )
+    parser.add_argument(
+        "--cache-invalidation-transport",
+        default=os.environ.get("ANYBLOK_CACHE_INVALIDATION_TRANSPORT"),
+        help="Name of the entry point (anyblok.cache.invalidation) used to "
+        "share the cache invalidations between the processes, by default "
+        "the first available for the database dialect",
+    )
+    parser.add_argument(
+        "--cache-memory-budget",
+        type=int,
+        default=os.environ.get("ANYBLOK_CACHE_MEMORY_BUDGET"),
+        help="Approximate size in bytes of the values kept by all the "
+        "cached methods of a registry, by default no limit",
+    )
+    parser.add_argument(
+        "--direct-column-mapping",
+        dest="direct_column_mapping",
+        action="store_true",
+        default=bool(os.environ.get("ANYBLOK_DIRECT_COLUMN_MAPPING")),
+        help="Map the columns which do not format their value directly by "
+        "SQLAlchemy, without hybrid property",
+    )
     parser.add_argument(
         "--default-timezone",
         default=os.environ.get("ANYBLOK_DEFAULT_TIMEZONE"),
@@ -935,6 +971,24 @@ def add_database(group):
     group.add_argument("--db-echo-pool", action="store_true", default=False)
     group.add_argument("--db-max-overflow", type=int, default=10)
     group.add_argument("--db-pool-size", type=int, default=5)
+    group.add_argument(
+        "--db-ro-urls",
+        nargs="+",
+        default=[
+            x
+            for x in os.environ.get("ANYBLOK_DATABASE_RO_URLS", "").split(",")
+            if x
+        ],
+        help="Complete URLs of the read only replicas, the SELECT "
+        "statements are executed on them while the session did not write",
+    )
+    group.add_argument("--db-ro-max-overflow", type=int, default=None)
+    group.add_argument("--db-ro-pool-size", type=int, default=None)
+    group.add_argument(
+        "--db-async-driver-name",
+        default=os.environ.get("ANYBLOK_DATABASE_ASYNC_DRIVER"),
+        help="the name of the asyncio driver used by AsyncRegistry",
+    )
     group.add_argument(
         "--default-encrypt-key",
         default=os.environ.get("ANYBLOK_ENCRYPT_KEY"),
@@ -151,11 +151,11 @@ class Declarations:
             return wrapper
 
 
-def cache(size=128):
+def cache(size=128, ttl=None):
     autodoc = """
-    **Cached method** with size=%(size)s
+    **Cached method** with size=%(size)s and ttl=%(ttl)s
     """ % dict(
-        size=size
+        size=size, ttl=ttl
     )
 
     def wrapper(method):
@@ -163,16 +163,17 @@ def cache(size=128):
         method.is_cache_method = True
         method.is_cache_classmethod = False
         method.size = size
+        method.ttl = ttl
         return method
 
     return wrapper
 
 
-def classmethod_cache(size=128):
+def classmethod_cache(size=128, ttl=None):
     autodoc = """
-    **Cached classmethod** with size=%(size)s
+    **Cached classmethod** with size=%(size)s and ttl=%(ttl)s
     """ % dict(
-        size=size
+        size=size, ttl=ttl
     )
 
     def wrapper(method):
@@ -180,6 +181,7 @@ def classmethod_cache(size=128):
         method.is_cache_method = True
         method.is_cache_classmethod = True
         method.size = size
+        method.ttl = ttl
         return method
 
     return wrapper
@@ -6,7 +6,13 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 import threading
+from asyncio import current_task
+from collections.abc import MutableMapping
+from contextvars import ContextVar
 from inspect import ismethod
+from weakref import ref
+
+from sqlalchemy.orm.scoping import ScopedRegistry
 
 
 class EnvironmentException(AttributeError):
@@ -79,15 +85,153 @@ class EnvironmentManager:
         """Save the value of the key in the environment"""
         return cls.environment.scoped_function_for_session
 
+    @classmethod
+    def scoped_registry_for_session(cls, createfunc):
+        """Return the registry which saves the sessions of the
+        ``scoped_session``, or None to use the registry of SQLAlchemy
+
+        :param createfunc: the factory of the sessions
+        :rtype: ScopedRegistry or None
+        """
+        get_registry = getattr(
+            cls.environment, "scoped_registry_for_session", None
+        )
+        if get_registry is None:
+            return None
+
+        return get_registry(createfunc)
+
+
+class ContextVarRegistry(ScopedRegistry):
+    """Registry of the sessions saved in a ``ContextVar``
+
+    The session is saved with its scope (asyncio task or thread). A task
+    starts with a copy of the context of the task which creates it, it does
+    not reuse the session of this task but creates its own one. No dict
+    keeps the session, it is released with the context of its task or of
+    its thread
+
+    :param createfunc: the factory of the sessions
+    :param scopefunc: return the current scope
+    """
+
+    def __init__(self, createfunc, scopefunc):
+        self.createfunc = createfunc
+        self.scopefunc = scopefunc
+        self.variable = ContextVar("anyblok_session_%d" % id(self))
+
+    def __call__(self):
+        scope = self.scopefunc()
+        owner, value = self.variable.get((None, None))
+        if owner is None or owner() is not scope:
+            value = self.createfunc()
+            self.variable.set((ref(scope), value))
+
+        return value
+
+    def has(self):
+        owner, _ = self.variable.get((None, None))
+        return owner is not None and owner() is self.scopefunc()
+
+    def set(self, obj):
+        self.variable.set((ref(self.scopefunc()), obj))
+
+    def clear(self):
+        self.variable.set((None, None))
+
+
+class ThreadValues(threading.local, MutableMapping):
+    """Dict of the values of the current thread
+
+    Each thread sees its own values, they are released with the thread
+    """
+
+    def __getitem__(self, key):
+        return self.__dict__[key]
+
+    def __setitem__(self, key, value):
+        self.__dict__[key] = value
+
+    def __delitem__(self, key):
+        del self.__dict__[key]
+
+    def __iter__(self):
+        return iter(self.__dict__)
+
+    def __len__(self):
+        return len(self.__dict__)
+
 
 class ThreadEnvironment:
-    """Use the thread, to get the environment"""
+    """Use the thread, to get the environment
+
+    The values are saved in a ``ThreadValues``, a dict by thread, they are
+    released with the thread
+    """
 
     scoped_function_for_session = None
     """ No scoped function here because for none value sqlalchemy already uses
     a thread to save the session """
 
-    values = {}
+    values = ThreadValues()
+
+    @classmethod
+    def setter(cls, key, value):
+        """Save the value of the key in the environment
+
+        :param key: the key of the value to save
+        :param value: the value to save
+        """
+        cls.values[key] = value
+
+    @classmethod
+    def getter(cls, key, default):
+        """Get the value of the key in the environment
+
+        :param key: the key of the value to retrieve
+        :param default: return this value if no value loaded for the key
+        :rtype: the value of the key
+        """
+        return cls.values.get(key, default)
+
+
+class ContextVarEnvironment:
+    """Use ``contextvars`` to get the environment
+
+    The values are isolated by thread and by asyncio task, a new task
+    starts with the values of the task which creates it. The sessions are
+    scoped by asyncio task, or by thread outside of an asyncio task, they
+    are saved in a ``ContextVarRegistry`` and released with the task or the
+    thread
+
+    Each key has its own ``ContextVar``, the values are released with the
+    context
+    """
+
+    variables = {}
+
+    @classmethod
+    def scoped_function_for_session(cls):
+        """Return the asyncio task or the thread which owns the session"""
+        try:
+            task = current_task()
+        except RuntimeError:
+            task = None
+
+        if task is None:
+            return threading.current_thread()
+
+        return task
+
+    @classmethod
+    def scoped_registry_for_session(cls, createfunc):
+        """Return the registry of the sessions scoped by asyncio task or by
+        thread
+
+        :param createfunc: the factory of the sessions
+        :rtype: ContextVarRegistry
+        """
+        return ContextVarRegistry(createfunc, cls.scoped_function_for_session)
 
     @classmethod
     def setter(cls, key, value):
@@ -96,10 +240,13 @@ class ThreadEnvironment:
         :param key: the key of the value to save
         :param value: the value to save
         """
-        if str(threading.current_thread()) not in cls.values:
-            cls.values[str(threading.current_thread())] = {}
+        variable = cls.variables.get(key)
+        if variable is None:
+            variable = cls.variables.setdefault(
+                key, ContextVar("anyblok_environment_%s" % key)
+            )
 
-        cls.values[str(threading.current_thread())][key] = value
+        variable.set(value)
 
     @classmethod
     def getter(cls, key, default):
@@ -109,10 +256,11 @@ class ThreadEnvironment:
         :param default: return this value if no value loaded for the key
         :rtype: the value of the key
         """
-        if str(threading.current_thread()) not in cls.values:
+        variable = cls.variables.get(key)
+        if variable is None:
             return default
 
-        return cls.values[str(threading.current_thread())].get(key, default)
+        return variable.get(default)
 
 
 EnvironmentManager.define_environment_cls(ThreadEnvironment)
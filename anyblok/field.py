@@ -5,7 +5,14 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from sqlalchemy import inspect
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm.attributes import (
+    NO_VALUE,
+    PASSIVE_NO_FETCH,
+    PASSIVE_NO_RESULT,
+    PASSIVE_OFF,
+)
 
 from anyblok.common import anyblok_column_prefix
 from anyblok.mapper import ModelRepr
@@ -127,20 +134,65 @@ class Field:
 
         return expr_column
 
+    def get_mapped_key(self, state, fieldname):
+        """Return the key of the field in the mapper of the instance"""
+        key = anyblok_column_prefix + fieldname
+        return key if key in state.manager else fieldname
+
+    def get_related_instance(self, model_self, fieldname):
+        """Return the instance linked by the relationship if it is already
+        known by the session, no query is done
+
+        If the local columns of the relationship are expired, the old related
+        instance can not be found without them: they are loaded
+
+        :param model_self: instance of the model
+        :param fieldname: name of the relationship
+        """
+        state = inspect(model_self)
+        key = self.get_mapped_key(state, fieldname)
+        passive = PASSIVE_NO_FETCH
+        if state.persistent and any(
+            state.mapper.get_property_by_column(column).key
+            in state.expired_attributes
+            for column in state.manager[key].property.local_columns
+        ):
+            passive = PASSIVE_OFF
+
+        value = state.manager[key].impl.get(state, state.dict, passive=passive)
+        if value is PASSIVE_NO_RESULT or value is NO_VALUE:
+            return None
+
+        return value
+
+    def expire_loaded_attribute(self, obj, fieldname):
+        """Expire the attribute of the instance only if it is loaded, an
+        attribute which is not loaded will be read after the autoflush
+
+        :param obj: instance of the model
+        :param fieldname: name of the attribute
+        """
+        state = inspect(obj)
+        session = state.session
+        if session is None or not state.persistent:
+            return
+
+        key = self.get_mapped_key(state, fieldname)
+        if key in state.dict:
+            session.expire(obj, [key])
+
     def expire_related_attribute(self, model_self, action_todos):
         for action_todo in action_todos:
             if len(action_todo) == 1:
                 obj = model_self
-                attrs = [action_todo[0]]
+                attr = action_todo[0]
             else:
-                obj = getattr(model_self, action_todo[0])
-                attrs = [action_todo[1]]
+                obj = self.get_related_instance(model_self, action_todo[0])
+                attr = action_todo[1]
                 if obj is None:
                     continue
 
-            if obj in model_self.anyblok.session:
-                if obj._sa_instance_state.persistent:
-                    model_self.anyblok.expire(obj, attrs)
+            self.expire_loaded_attribute(obj, attr)
 
     def setter_format_value(self, value):
         return value
@@ -201,6 +253,10 @@ class Field:
         """Return False, it is the default value"""
         return False
 
+    def can_be_mapped_directly(self):
+        """Return False, the field is not a column mapped by SQLAlchemy"""
+        return False
+
     def must_be_copied_before_declaration(self):
         """Return False, it is the default value"""
         return False
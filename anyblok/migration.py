@@ -17,16 +17,27 @@ from logging import getLogger
 from alembic.autogenerate import compare_metadata
 from alembic.migration import MigrationContext
 from alembic.operations import Operations
-from sqlalchemy import and_, func, inspect, select, text, update
+from sqlalchemy import (
+    and_,
+    bindparam,
+    func,
+    inspect,
+    select,
+    text,
+    tuple_,
+    update,
+)
 from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.schema import (
     CheckConstraint,
+    Column,
     DDLElement,
     PrimaryKeyConstraint,
     UniqueConstraint,
 )
 from sqlalchemy.sql.ddl import CreateSchema, DropSchema
+from sqlalchemy.sql.elements import TextClause
 
 from anyblok.config import Configuration
 
@@ -39,6 +50,22 @@ logger = getLogger(__name__)
 MIGRATION_TYPE_PLUGINS_NAMESPACE = "anyblok.migration_type.plugins"
 
 
+def index_expression_name(expression):
+    """Return the name of the column, or the text of the expression, used
+    by an index
+
+    :param expression: sqlalchemy column or text expression of the index
+    :rtype: str
+    """
+    if isinstance(expression, Column):
+        return expression.name
+
+    if isinstance(expression, TextClause):
+        return expression.text
+
+    return expression.key
+
+
 class AlterSchema(DDLElement):
     def __init__(self, oldname, newname):
         self.oldname = oldname
@@ -206,7 +233,7 @@ class MigrationReport:
         ):
             return True  # pragma: no cover
 
-        columns = [x.name for x in constraint.columns]
+        columns = [index_expression_name(x) for x in constraint.expressions]
         if self.table_is_added(constraint.table):
             return True  # pragma: no cover
 
@@ -520,7 +547,10 @@ class MigrationReport:
                     or sgdb_in(self.migration.conn.engine, dialects)
                 )
             ):
-                return plugin()
+                selected_plugin = plugin()
+                selected_plugin.from_value = oldvalue
+                selected_plugin.to_value = newvalue
+                return selected_plugin
 
         return None
 
@@ -719,7 +749,7 @@ class MigrationReport:
     def apply_change_add_index(self, action):
         _, constraint = action
         table = self.get_migration_table(constraint.table)
-        table.index().add(*constraint.columns, name=constraint.name)
+        table.index().add(*constraint.expressions, name=constraint.name)
 
     def apply_remove_table(self, action):
         table = self.get_migration_table(action[1])
@@ -756,7 +786,23 @@ class MigrationReport:
             "remove_table": self.apply_remove_table,
             "remove_column": self.apply_remove_column,
         }
-        for action in self.actions:
+        # the check constraints removed from a table whose columns change
+        # of type are removed before the other changes: they can forbid the
+        # new values (the keys of a Selection replaced by their codes).
+        # They are removed by the migration anyway, the other actions keep
+        # their order
+        modified_tables = {
+            (x[1], x[2]) for x in self.actions if x[0] == "modify_type"
+        }
+
+        def remove_ck_first(action):
+            return not (
+                action[0] == "remove_ck"
+                and (action[2]["schema"], action[1]) in modified_tables
+            )
+
+        actions = sorted(self.actions, key=remove_ck_first)
+        for action in actions:
             fnct = mappers.get(action[0])
             if fnct:
                 fnct(action)
@@ -834,6 +880,10 @@ class MigrationColumnTypePlugin:
                       communicate with the DBMS
     :param dialect: DB dialect (list of strings or string)
 
+    The instance returned by ``MigrationReport.get_plugin_for`` knows the
+    compared types with the attributes ``from_value`` (reflected type) and
+    ``to_value`` (type of the Model)
+
     Example::
 
     class BooleanToTinyIntMySQL(MigrationColumnTypePlugin):
@@ -854,6 +904,8 @@ class MigrationColumnTypePlugin:
     to_type = None
     from_type = None
     dialect = None
+    from_value = None
+    to_value = None
 
     def apply(self, column, **kwargs):
         """Apply column migration, this method MUST be overriden in plugins
@@ -886,6 +938,8 @@ class MigrationColumn:
         c.drop()
     """
 
+    default_value_batch_size = 1000
+
     def __init__(self, table, name):
         self.table = table
         self.name = name
@@ -908,6 +962,15 @@ class MigrationColumn:
                 )
 
     def apply_default_value(self, column):
+        """Fill the NULL values of the new column with its default
+
+        A callable default is computed for each row, the rows are read by
+        batch of ``default_value_batch_size`` ordered by primary key and
+        updated with one executemany by batch, the progress is logged after
+        each batch
+
+        :param column: sqlalchemy column
+        """
         if column.default:
             execute = self.table.migration.conn.execute
             val = column.default.arg
@@ -918,27 +981,54 @@ class MigrationColumn:
                 columns = [col for col in table.columns if col.primary_key]
                 query_count = select(func.count()).select_from(table)
                 query_count = query_count.where(cname.is_(None))
-                nb_row = self.table.migration.conn.execute(
-                    query_count
-                ).fetchone()[0]
-                for offset in range(nb_row):
-                    query = select(*columns)
-                    query = query.where(cname.is_(None))
-                    query = query.limit(1)
-                    res = execute(query).fetchone()
-                    where = []
-                    for index, col in enumerate(columns):
-                        where.append(col == res[index])
-
-                    if len(where) == 1:
-                        where = where[0]
-                    else:
-                        where = and_(*where)
-
-                    query_update = update(table)
-                    query_update = query_update.where(where)
-                    query_update = query_update.values({cname: val(None)})
-                    execute(query_update)
+                nb_row = execute(query_count).fetchone()[0]
+                query_update = update(table)
+                query_update = query_update.where(
+                    and_(
+                        *[
+                            col == bindparam("anyblok_pk_value_%d" % index)
+                            for index, col in enumerate(columns)
+                        ]
+                    )
+                )
+                query_update = query_update.values(
+                    {cname: bindparam("anyblok_default_value")}
+                )
+                done = 0
+                last = None
+                while done < nb_row:
+                    query = select(*columns).where(cname.is_(None))
+                    if last is not None:
+                        query = query.where(tuple_(*columns) > tuple_(*last))
+
+                    query = query.order_by(*columns)
+                    query = query.limit(self.default_value_batch_size)
+                    rows = execute(query).fetchall()
+                    if not rows:
+                        break  # pragma: no cover
+
+                    execute(
+                        query_update,
+                        [
+                            dict(
+                                anyblok_default_value=val(None),
+                                **{
+                                    "anyblok_pk_value_%d" % index: value
+                                    for index, value in enumerate(row)
+                                },
+                            )
+                            for row in rows
+                        ],
+                    )
+                    last = rows[-1]
+                    done += len(rows)
+                    logger.info(
+                        "Default value of %s.%s: %d/%d rows",
+                        self.table.name,
+                        column.name,
+                        done,
+                        nb_row,
+                    )
             else:
                 query = (
                     update(table).where(cname.is_(None)).values({cname: val})
@@ -1327,7 +1417,7 @@ class MigrationIndex:
     def add(self, *columns, **kwargs):
         """Add the constraint
 
-        :param *columns: list of SQLalchemy column
+        :param *columns: list of SQLalchemy column or text expression
         :param **kwargs: other attribute fir l __init__
         :rtype: MigrationIndex instance
         :exception: MigrationException
@@ -1337,8 +1427,15 @@ class MigrationIndex:
                 "To add an index you must define one or more columns"
             )
 
-        index_name = kwargs.get("name", self.format_name(*columns))
-        columns_name = [x.name for x in columns]
+        if "name" in kwargs:
+            index_name = kwargs["name"]
+        else:
+            index_name = self.format_name(*columns)
+
+        columns_name = [
+            x.name if isinstance(x, (Column, MigrationColumn)) else x
+            for x in columns
+        ]
         self.table.migration.operation.create_index(
             index_name, self.table.name, columns_name, schema=self.table.schema
         )
@@ -1575,12 +1672,15 @@ class Migration:
             self.conn.dialect, None
         )
         self.ignore_migration_for = registry.ignore_migration_for
+        self.tables_scope = None
 
         opts = {
             "include_schemas": True,
             "compare_server_default": True,
             "render_item": self.render_item,
             "compare_type": self.compare_type,
+            "include_name": self.include_name,
+            "include_object": self.include_object,
         }
         self.context = MigrationContext.configure(self.conn, opts=opts)
         self.operation = Operations(self.context)
@@ -1615,11 +1715,16 @@ class Migration:
     def detect_changed(self, schema_only=False):
         """Detect the difference between the metadata and the database
 
+        The constraints reflected by the AnyBlok detections are loaded once
+        by schema
+
         :rtype: MigrationReport instance
         """
         inspector = inspect(self.conn)
         if schema_only:
             diff = self.detect_added_new_schema(inspector)
+        elif self.tables_scope is not None and not self.tables_scope:
+            diff = []
         else:
             diff = compare_metadata(self.context, self.metadata)
             diff.extend(
@@ -1628,6 +1733,60 @@ class Migration:
 
         return MigrationReport(self, diff)
 
+    def is_in_scope(self, table):
+        """Return True if the table must be compared by the migration
+
+        :param table: key of the table in the metadata (``schema.table``)
+        :rtype: bool
+        """
+        if self.tables_scope is None:
+            return True
+
+        return table in self.tables_scope
+
+    def include_name(self, name, type_, parent_names):
+        """Filter the tables reflected by alembic with the scope"""
+        if type_ == "table":
+            schema = parent_names.get("schema_name")
+            return self.is_in_scope(
+                "%s.%s" % (schema, name) if schema else name
+            )
+
+        return True
+
+    def include_object(self, object_, name, type_, reflected, compare_to):
+        """Filter the tables of the metadata compared by alembic with the
+        scope"""
+        if type_ == "table":
+            return self.is_in_scope(object_.key)
+
+        return True
+
+    def get_reflected_tables(self, inspector, key):
+        """Return the reflected information of the tables known by the
+        metadata, with one reflection by schema filtered by the names of
+        these tables
+
+        :param inspector: sqlalchemy inspector of the connection
+        :param key: name of the information, ``get_multi_<key>`` method of
+            the inspector
+        :rtype: list of tuple (schema, table name, Table, information)
+        """
+        res = []
+        names_by_schema = {}
+        for table in self.metadata.tables.values():
+            if self.is_in_scope(table.key):
+                names_by_schema.setdefault(table.schema, []).append(table.name)
+
+        reflect = getattr(inspector, "get_multi_" + key)
+        for schema, names in names_by_schema.items():
+            reflected = reflect(schema=schema, filter_names=names)
+            for (_, table), info in sorted(reflected.items()):
+                table_ = "%s.%s" % (schema, table) if schema else table
+                res.append((schema, table, self.metadata.tables[table_], info))
+
+        return res
+
     def detect_added_new_schema(self, inspector):
         diff = []
         schemas = self.metadata._schemas
@@ -1667,78 +1826,54 @@ class Migration:
             return []
 
         diff = []
-        schemas = list(self.metadata._schemas)
-        schemas.append(None)
-        for schema in schemas:
-            for table in inspector.get_table_names(schema=schema):
-                table_ = "%s.%s" % (schema, table) if schema else table
-                if table_ not in self.metadata.tables:
-                    continue
-
-                reflected_constraints = {
-                    ck["name"]: ck
-                    for ck in inspector.get_check_constraints(
-                        table, schema=schema
-                    )
-                }
-                constraints = {
-                    ck.name: ck
-                    for ck in self.metadata.tables[table_].constraints
-                    if isinstance(ck, CheckConstraint)
-                    if ck.name != "_unnamed_"
-                }
-                todrop = set(reflected_constraints.keys()) - set(
-                    constraints.keys()
-                )
-                toadd = set(constraints.keys()) - set(
-                    reflected_constraints.keys()
-                )
-
-                # check a constraint have not been truncated
-                todrop_ = todrop.copy()
-                for x in todrop_:
-                    for y in toadd:
-                        if self.check_constraint_is_same(
-                            reflected_constraints[x], constraints[y]
-                        ):
-                            toadd.remove(y)
-                            todrop.remove(x)
-                            break
-
-                for ck in todrop:
-                    ck_ = reflected_constraints[ck]
-                    ck_["schema"] = schema
-                    diff.append(("remove_ck", table, ck_))
-
-                for ck in toadd:
-                    diff.append(("add_ck", table, constraints[ck]))
+        reflected_tables = self.get_reflected_tables(
+            inspector, "check_constraints"
+        )
+        for schema, table, table_, reflected in reflected_tables:
+            reflected_constraints = {ck["name"]: ck for ck in reflected}
+            constraints = {
+                ck.name: ck
+                for ck in table_.constraints
+                if isinstance(ck, CheckConstraint)
+                if ck.name != "_unnamed_"
+            }
+            todrop = set(reflected_constraints.keys()) - set(constraints.keys())
+            toadd = set(constraints.keys()) - set(reflected_constraints.keys())
+
+            # check a constraint have not been truncated
+            todrop_ = todrop.copy()
+            for x in todrop_:
+                for y in toadd:
+                    if self.check_constraint_is_same(
+                        reflected_constraints[x], constraints[y]
+                    ):
+                        toadd.remove(y)
+                        todrop.remove(x)
+                        break
+
+            for ck in todrop:
+                ck_ = reflected_constraints[ck]
+                ck_["schema"] = schema
+                diff.append(("remove_ck", table, ck_))
+
+            for ck in toadd:
+                diff.append(("add_ck", table, constraints[ck]))
 
         return diff
 
     def detect_pk_constraint_changed(self, inspector):
         diff = []
-        schemas = list(self.metadata._schemas)
-        schemas.append(None)
-        for schema in schemas:
-            for table in inspector.get_table_names(schema=schema):
-                table_ = "%s.%s" % (schema, table) if schema else table
-                if table_ not in self.metadata.tables:
-                    continue
-
-                reflected_constraint = inspector.get_pk_constraint(
-                    table, schema=schema
-                )
-                constraint = [
-                    pk
-                    for pk in self.metadata.tables[table_].constraints
-                    if isinstance(pk, PrimaryKeyConstraint)
-                ][0]
-                reflected_columns = set(
-                    reflected_constraint["constrained_columns"]
-                )
-                columns = set(x.name for x in constraint.columns)
-                if columns != reflected_columns:
-                    diff.append(("change_pk", table, constraint))
+        reflected_tables = self.get_reflected_tables(inspector, "pk_constraint")
+        for _, table, table_, reflected_constraint in reflected_tables:
+            constraint = [
+                pk
+                for pk in table_.constraints
+                if isinstance(pk, PrimaryKeyConstraint)
+            ][0]
+            reflected_columns = set(reflected_constraint["constrained_columns"])
+            columns = set(x.name for x in constraint.columns)
+            if columns != reflected_columns:
+                diff.append(("change_pk", table, constraint))
 
         return diff
 
@@ -12,8 +12,8 @@
 import inspect
 from copy import deepcopy
 
-from sqlalchemy import inspection
-from sqlalchemy.orm import declared_attr
+from sqlalchemy import event, inspection
+from sqlalchemy.orm import declared_attr, synonym
 from texttable import Texttable
 
 from anyblok import Declarations
@@ -222,6 +222,23 @@ class Model:
         """
         RegistryManager.remove_in_register(cls_)
 
+    @classmethod
+    def must_be_mapped_directly(cls, registry, field, properties):
+        """Return True if the column is mapped by SQLAlchemy under its name,
+        without hybrid property
+
+        :param registry: the current  registry
+        :param field: the declaration field / column or relationship
+        :param properties: the properties of the model
+        """
+        if not registry.direct_column_mapping:
+            return False
+
+        if not properties["__model_factory__"].allow_direct_column_mapping:
+            return False
+
+        return field.can_be_mapped_directly()
+
     @classmethod
     def declare_field(
         cls,
@@ -248,7 +265,10 @@ class Model:
             field = deepcopy(field)
 
         attr_name = name
-        if field.use_hybrid_property:
+        mapped_directly = cls.must_be_mapped_directly(
+            registry, field, properties
+        )
+        if field.use_hybrid_property and not mapped_directly:
             attr_name = anyblok_column_prefix + name
 
         if field.must_be_declared_as_attr():
@@ -267,7 +287,11 @@ class Model:
                 registry, namespace, name, properties
             )
 
-        if field.use_hybrid_property:
+        if mapped_directly:
+            # the internal accesses by the prefixed name are kept
+            properties[anyblok_column_prefix + name] = synonym(name)
+            properties["direct_mapped_columns"].append(name)
+        elif field.use_hybrid_property:
             properties[name] = field.get_property(
                 registry, namespace, name, properties
             )
@@ -468,6 +492,7 @@ class Model:
     def init_core_properties_and_bases(cls, registry, bases, properties):
         properties["loaded_columns"] = []
         properties["hybrid_property_columns"] = []
+        properties["direct_mapped_columns"] = []
         properties["loaded_fields"] = {}
         properties["__model_factory__"].insert_core_bases(bases, properties)
 
@@ -644,6 +669,7 @@ class Model:
         """
         registry.loaded_namespaces_first_step = {}
         registry.loaded_views = {}
+        registry.call_plugins("before_assemble")
 
         # get all the information to create a namespace
         for namespace in registry.loaded_registries["Model_names"]:
@@ -654,6 +680,38 @@ class Model:
         for namespace in registry.loaded_registries["Model_names"]:
             cls.load_namespace_second_step(registry, namespace)
 
+        # the relationships fill the expire attributes of all the models
+        for namespace in registry.loaded_registries["Model_names"]:
+            cls.listen_direct_mapped_columns(registry, namespace)
+
+    @classmethod
+    def listen_direct_mapped_columns(cls, registry, namespace):
+        """Expire the related attributes when a direct mapped column is set,
+        as the setter of the hybrid property does
+
+        :param registry: the current registry
+        :param namespace: the namespace of the model
+        """
+        Model = registry.loaded_namespaces[namespace]
+        expire_attributes = registry.expire_attributes.get(namespace, {})
+        fields = registry.loaded_namespaces_first_step[namespace]
+        for name in getattr(Model, "direct_mapped_columns", ()):
+            action_todos = expire_attributes.get(name)
+            if not action_todos:
+                continue
+
+            def expire(
+                target,
+                value,
+                oldvalue,
+                initiator,
+                field=fields[name],
+                action_todos=action_todos,
+            ):
+                field.expire_related_attribute(target, action_todos)
+
+            event.listen(getattr(Model, name), "set", expire, propagate=True)
+
     @classmethod
     def initialize_callback(cls, registry):
         """initialize callback is called after assembling all entries
@@ -1,22 +1,319 @@
 # This file is a part of the AnyBlok project
 #
 #    Copyright (C) 2017 Jean-Sebastien SUZANNE <jssuzanne@anybox.fr>
+#    Copyright (C) 2024 Jean-Sebastien SUZANNE <js.suzanne@gmail.com>
 #
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
-from anyblok.common import apply_cache
+import sys
+from collections import OrderedDict, namedtuple
+from functools import update_wrapper
+from threading import RLock
+from time import monotonic
+from types import MethodType
+from weakref import ref
+
+from anyblok.config import Configuration
 
 from .plugins import ModelPluginBase
 
+CacheInfo = namedtuple(
+    "CacheInfo",
+    [
+        "hits",
+        "misses",
+        "maxsize",
+        "currsize",
+        "evictions",
+        "expirations",
+        "memory",
+    ],
+)
+
+
+class InstanceRef(ref):
+    """Weak reference on the instance of a cached method, the cache keys
+    of the instance are removed when the instance is garbage collected
+    """
+
+    __slots__ = ("key", "cache_keys")
+
+
+class MethodCache:
+    """Cache engine of the methods decorated by ``cache`` or
+    ``classmethod_cache``
+
+    * ``maxsize``: number of entries kept, the least recently used entry is
+      evicted first
+    * ``ttl``: lifetime of an entry in second, None for no limit
+    * the instance of the ``cache`` methods is weakly referenced, the
+      entries are removed when the instance is garbage collected
+    * the memory is the approximate (shallow) size of the cached values,
+      accounted in the ``RegistryCaches``
+
+    The API of ``functools.lru_cache`` (``cache_clear``, ``cache_info``) is
+    kept
+    """
+
+    kwd_mark = (object(),)
+
+    def __init__(self, method, caches, namespace, attr):
+        update_wrapper(self, method)
+        self.method = method
+        self.caches = caches
+        self.indentify = (namespace, attr)
+        self.maxsize = method.size
+        self.ttl = getattr(method, "ttl", None)
+        self.weak_instance = not method.is_cache_classmethod
+        self.lock = RLock()
+        self.entries = OrderedDict()
+        self.refs = {}
+        self.dead_refs = []
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.memory = 0
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        return MethodType(self, instance)
+
+    def get_instance_key(self, instance):
+        key = id(instance)
+        instance_ref = self.refs.get(key)
+        if instance_ref is not None and instance_ref() is instance:
+            return key, instance_ref
+
+        try:
+            instance_ref = InstanceRef(instance, self.dead_refs.append)
+        except TypeError:
+            return instance, None
+
+        instance_ref.key = key
+        instance_ref.cache_keys = set()
+        self.refs[key] = instance_ref
+        return key, instance_ref
+
+    def make_key(self, args, kwargs):
+        instance_ref = None
+        if self.weak_instance and args:
+            instance_key, instance_ref = self.get_instance_key(args[0])
+            args = (instance_key,) + args[1:]
+
+        key = args
+        if kwargs:
+            key += self.kwd_mark + tuple(kwargs.items())
+
+        return key, instance_ref
+
+    def purge_dead_refs(self):
+        while self.dead_refs:
+            instance_ref = self.dead_refs.pop()
+            if self.refs.get(instance_ref.key) is instance_ref:
+                del self.refs[instance_ref.key]
+
+            for key in instance_ref.cache_keys:
+                self.remove(key, discard_ref=False)
+
+    def remove(self, key, discard_ref=True):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        self.memory -= entry[2]
+        self.caches.add_memory(-entry[2])
+        if discard_ref and self.weak_instance:
+            instance_ref = self.refs.get(key[0]) if key else None
+            if instance_ref is not None:
+                instance_ref.cache_keys.discard(key)
+
+    def evict(self):
+        """Remove the least recently used entry"""
+        with self.lock:
+            if not self.entries:
+                return False
+
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+            return True
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.purge_dead_refs()
+            key, instance_ref = self.make_key(args, kwargs)
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] is None or entry[1] > monotonic():
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return entry[0]
+
+                self.expirations += 1
+                self.remove(key)
+
+            self.misses += 1
+
+        value = self.method(*args, **kwargs)
+        if self.maxsize == 0:
+            return value
+
+        expire_at = monotonic() + self.ttl if self.ttl is not None else None
+        size = sys.getsizeof(value)
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = (value, expire_at, size)
+            self.memory += size
+            self.caches.add_memory(size)
+            if instance_ref is not None:
+                instance_ref.cache_keys.add(key)
+
+            if self.maxsize is not None:
+                while len(self.entries) > self.maxsize:
+                    self.evict()
+
+        self.caches.check_memory_budget(self)
+        return value
+
+    def cache_clear(self):
+        """Remove all the entries"""
+        with self.lock:
+            self.caches.add_memory(-self.memory)
+            self.memory = 0
+            self.entries.clear()
+            self.refs.clear()
+            del self.dead_refs[:]
+
+    def cache_info(self):
+        """Return the statistics of the cache"""
+        with self.lock:
+            self.purge_dead_refs()
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.maxsize,
+                len(self.entries),
+                self.evictions,
+                self.expirations,
+                self.memory,
+            )
+
+
+class RegistryCaches(dict):
+    """Cached methods of the registry::
+
+        {registry_name: {method name: [MethodCache, ...]}}
+
+    The memory of all the caches is accounted, if the ``memory_budget`` (in
+    bytes) is exceeded, the least recently used entries of the cache filled
+    are evicted first, then those of the biggest caches
+    """
+
+    def __init__(self, memory_budget=None):
+        super(RegistryCaches, self).__init__()
+        self.memory_budget = memory_budget
+        self.memory = 0
+        self.lock = RLock()
+
+    def add_memory(self, size):
+        """Account the memory added (or removed if negative) by a cache"""
+        with self.lock:
+            self.memory += size
+
+    def reset(self):
+        """Clear and forget all the caches, the methods are cached again by
+        the next load of the registry
+        """
+        for cache in self.iter_caches():
+            cache.cache_clear()
+
+        self.clear()
+        with self.lock:
+            self.memory = 0
+
+    def iter_caches(self):
+        for methods in self.values():
+            for caches in methods.values():
+                yield from caches
+
+    def check_memory_budget(self, cache):
+        if not self.memory_budget:
+            return
+
+        while self.memory > self.memory_budget and cache.evict():
+            pass
+
+        if self.memory > self.memory_budget:
+            caches = sorted(
+                self.iter_caches(), key=lambda x: x.memory, reverse=True
+            )
+            for other in caches:
+                while self.memory > self.memory_budget and other.evict():
+                    pass
+
+                if self.memory <= self.memory_budget:
+                    break
+
+    def stats(self):
+        """Return the statistics of each cached method
+
+        :rtype: dict {registry_name: {method name: CacheInfo}}, the
+            ``CacheInfo`` is the sum of the ``MethodCache`` of the method
+        """
+        res = {}
+        for registry_name, methods in self.items():
+            for method, caches in methods.items():
+                infos = [cache.cache_info() for cache in caches]
+                if not infos:
+                    continue
+
+                res.setdefault(registry_name, {})[method] = CacheInfo(
+                    *(sum(x) if x[0] is not None else None for x in zip(*infos))
+                )
+
+        return res
+
+
+def apply_cache(attr, method, registry, namespace, base, properties):
+    """Find the cached methods in the base to apply the real cache decorator.
+
+    :param attr: name of the attribute
+    :param method: method pointer
+    :param registry: the current registry
+    :param namespace: the namespace of the model
+    :rtype: new base
+    """
+    if hasattr(method, "is_cache_method") and method.is_cache_method is True:
+        cmodel = registry.caches.setdefault(namespace, {attr: []})
+        cattr = cmodel.setdefault(attr, [])
+        wrapper = MethodCache(method, registry.caches, namespace, attr)
+        cattr.append(wrapper)
+        if method.is_cache_classmethod:
+            return {attr: classmethod(wrapper)}
+        else:
+            return {attr: wrapper}
+
+    return {}
+
 
 class CachePlugin(ModelPluginBase):
     def __init__(self, registry):
         if not hasattr(registry, "caches"):
-            registry.caches = {}
+            registry.caches = RegistryCaches(
+                memory_budget=registry.additional_setting.get(
+                    "cache_memory_budget",
+                    Configuration.get("cache_memory_budget"),
+                )
+            )
 
         super(CachePlugin, self).__init__(registry)
 
+    def before_assemble(self):
+        """Forget the cached methods of the previous load of the registry,
+        they are cached again by the assembly of the models
+        """
+        self.registry.caches.reset()
+
     def insert_in_bases(
         self, new_base, namespace, properties, transformation_properties
     ):
@@ -5,16 +5,183 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
-from sqlalchemy import and_, event, table
+from hashlib import sha256
+
+from sqlalchemy import and_, event, table, text
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Query, relationship
+from sqlalchemy.schema import DDLElement
 from sqlalchemy_views import CreateView, DropView
 
-from anyblok.common import anyblok_column_prefix
+from anyblok.common import anyblok_column_prefix, sgdb_in
 from anyblok.field import Field, FieldException
+from anyblok.mapper import ModelAttribute, ModelMapper
 
 from .exceptions import ModelFactoryException, ViewException
 
 
+class CreateMaterializedView(DDLElement):
+    """Prepares a CREATE MATERIALIZED VIEW statement"""
+
+    def __init__(self, element, selectable):
+        self.element = element
+        self.selectable = selectable
+
+
+@compiles(CreateMaterializedView)
+def visit_create_materialized_view(create, compiler, **kw):
+    selectable = compiler.sql_compiler.process(
+        create.selectable, literal_binds=True
+    )
+    return "CREATE MATERIALIZED VIEW %s AS %s" % (
+        compiler.preparer.format_table(create.element),
+        selectable,
+    )
+
+
+class CreateMaterializedViewIndex(DDLElement):
+    """Prepares the unique index on the primary keys of a materialized
+    view, this index is required to refresh the view concurrently
+    """
+
+    def __init__(self, element, primary_keys):
+        self.element = element
+        self.primary_keys = primary_keys
+
+
+@compiles(CreateMaterializedViewIndex)
+def visit_create_materialized_view_index(create, compiler, **kw):
+    preparer = compiler.preparer
+    return "CREATE UNIQUE INDEX %s ON %s (%s)" % (
+        preparer.quote("anyblok_uq_%s__pks" % create.element.name),
+        preparer.format_table(create.element),
+        ", ".join(preparer.quote(x) for x in create.primary_keys),
+    )
+
+
+class DropMaterializedView(DDLElement):
+    """Prepares a DROP MATERIALIZED VIEW statement"""
+
+    def __init__(self, element):
+        self.element = element
+
+
+@compiles(DropMaterializedView)
+def visit_drop_materialized_view(drop, compiler, **kw):
+    return "DROP MATERIALIZED VIEW IF EXISTS %s" % (
+        compiler.preparer.format_table(drop.element)
+    )
+
+
+class CommentMaterializedView(DDLElement):
+    """Prepares a COMMENT ON MATERIALIZED VIEW statement"""
+
+    def __init__(self, element, comment):
+        self.element = element
+        self.comment = comment
+
+
+@compiles(CommentMaterializedView)
+def visit_comment_materialized_view(comment, compiler, **kw):
+    return "COMMENT ON MATERIALIZED VIEW %s IS '%s'" % (
+        compiler.preparer.format_table(comment.element),
+        comment.comment.replace("'", "''"),
+    )
+
+
+def get_view_relation(connection, view):
+    """Return the kind (``v`` for a view, ``m`` for a materialized view)
+    and the comment of the relation of the view in the PostgreSQL database
+
+    :param connection: sqlalchemy connection
+    :param view: the view
+    :rtype: tuple (relkind, comment), (None, None) if it does not exist
+    """
+    query = text(
+        "SELECT relkind, obj_description(oid, 'pg_class') FROM pg_class "
+        "WHERE oid = to_regclass(:name)"
+    ).bindparams(name=connection.dialect.identifier_preparer.format_table(view))
+    res = connection.execute(query).fetchone()
+    if res is None:
+        return None, None
+
+    return tuple(res)
+
+
+class ViewDDL:
+    """Create and drop the view with the metadata, the view is created
+    again at each creation of the metadata. On PostgreSQL, a
+    materialized view with the same name is dropped before
+    """
+
+    def __init__(self, view, selectable, pks):
+        self.view = view
+        self.selectable = selectable
+        self.pks = pks
+
+    def drop(self, target, connection, **kw):
+        if not sgdb_in(connection.engine, ["PostgreSQL"]):
+            connection.execute(DropView(self.view, if_exists=True))
+            return
+
+        relkind, _ = get_view_relation(connection, self.view)
+        if relkind == "v":
+            connection.execute(DropView(self.view))
+        elif relkind == "m":
+            connection.execute(DropMaterializedView(self.view))
+
+    def before_create(self, target, connection, **kw):
+        self.drop(target, connection, **kw)
+
+    def after_create(self, target, connection, **kw):
+        connection.execute(CreateView(self.view, self.selectable))
+
+    def before_drop(self, target, connection, **kw):
+        self.drop(target, connection, **kw)
+
+
+class MaterializedViewDDL(ViewDDL):
+    """Create and drop the materialized view with the metadata
+
+    The hash of the definition of the view is saved in its comment, the
+    view is only dropped and created again, then filled, if its definition
+    changed or if it is not a materialized view
+    """
+
+    def __init__(self, view, selectable, pks):
+        super(MaterializedViewDDL, self).__init__(view, selectable, pks)
+        self.up_to_date = False
+
+    def get_definition(self, connection):
+        """Return the hash of the statements which create the view"""
+        statements = (
+            CreateMaterializedView(self.view, self.selectable),
+            CreateMaterializedViewIndex(self.view, self.pks),
+        )
+        definition = "\n".join(
+            str(x.compile(dialect=connection.dialect)) for x in statements
+        )
+        return "anyblok:%s" % sha256(definition.encode("utf-8")).hexdigest()
+
+    def before_create(self, target, connection, **kw):
+        relkind, comment = get_view_relation(connection, self.view)
+        self.up_to_date = relkind == "m" and (
+            comment == self.get_definition(connection)
+        )
+        if not self.up_to_date:
+            self.drop(target, connection, **kw)
+
+    def after_create(self, target, connection, **kw):
+        if self.up_to_date:
+            return
+
+        connection.execute(CreateMaterializedView(self.view, self.selectable))
+        connection.execute(CreateMaterializedViewIndex(self.view, self.pks))
+        connection.execute(
+            CommentMaterializedView(self.view, self.get_definition(connection))
+        )
+
+
 def has_sql_fields(bases):
     """Tells whether the model as field or not
 
@@ -35,6 +202,8 @@ def has_sql_fields(bases):
 
 
 class BaseFactory:
+    allow_direct_column_mapping = False
+
     def __init__(self, registry):
         self.registry = registry
 
@@ -46,6 +215,8 @@ class BaseFactory:
 
 
 class ModelFactory(BaseFactory):
+    allow_direct_column_mapping = True
+
     def insert_core_bases(self, bases, properties):
         if has_sql_fields(bases):
             bases.extend([x for x in self.registry.loaded_cores["SqlBase"]])
@@ -83,8 +254,58 @@ class ViewFactory(BaseFactory):
     def build_model(self, modelname, bases, properties):
         Model = type(modelname, tuple(bases), properties)
         self.apply_view(Model, properties)
+        self.apply_view_refresh(Model)
         return Model
 
+    def is_materialized(self, base):
+        """Return True if the view must be created as a materialized view,
+        only PostgreSQL has the materialized views, for the others
+        dialects a view is created
+        """
+        if not getattr(base, "__view_materialized__", False):
+            return False
+
+        return sgdb_in(self.registry.engine, ["PostgreSQL"])
+
+    def apply_view_refresh(self, base):
+        """Schedule the refresh of the materialized view after the commit
+        when the entries of the models of ``__view_refresh_on__`` are
+        inserted, updated or deleted by the ORM
+
+        :param base: Model cls
+        """
+        if not self.is_materialized(base):
+            return
+
+        namespace = base.__registry_name__
+        for model in getattr(base, "__view_refresh_on__", ()):
+            for eventtype in ("after_insert", "after_update", "after_delete"):
+                self.registry._sqlalchemy_known_events.append(
+                    (
+                        ModelMapper(model, eventtype),
+                        namespace,
+                        ModelAttribute(namespace, "schedule_refresh_view"),
+                    )
+                )
+
+    def add_view_events(self, base, view, selectable, pks):
+        """Add the events to create and drop the view with the metadata
+
+        :param base: Model cls
+        :param view: the view
+        :param selectable: the query of the view
+        :param pks: name of the primary keys
+        """
+        metadata = self.registry.declarativebase.metadata
+        if self.is_materialized(base):
+            ddl = MaterializedViewDDL(view, selectable, pks)
+        else:
+            ddl = ViewDDL(view, selectable, pks)
+
+        event.listen(metadata, "before_create", ddl.before_create)
+        event.listen(metadata, "after_create", ddl.after_create)
+        event.listen(metadata, "before_drop", ddl.before_drop)
+
     def apply_view(self, base, properties):
         """Transform the sqlmodel to view model
 
@@ -94,6 +315,17 @@ class ViewFactory(BaseFactory):
         :exception: ViewException
         """
         tablename = base.__tablename__
+        pks = [
+            col
+            for col in properties["loaded_columns"]
+            if getattr(
+                getattr(base, anyblok_column_prefix + col), "primary_key", False
+            )
+        ]
+
+        if not pks:
+            raise ViewException("%r have any primary key defined" % base)
+
         if hasattr(base, "__view__"):
             view = base.__view__
         elif tablename in self.registry.loaded_views:
@@ -116,27 +348,9 @@ class ViewFactory(BaseFactory):
                 col = c._make_proxy(view)[1]
                 view._columns.replace(col)
 
-            metadata = self.registry.declarativebase.metadata
-            event.listen(
-                metadata, "before_create", DropView(view, if_exists=True)
-            )
-            event.listen(metadata, "after_create", CreateView(view, selectable))
-            event.listen(
-                metadata, "before_drop", DropView(view, if_exists=True)
-            )
+            self.add_view_events(base, view, selectable, pks)
             self.registry.loaded_views[tablename] = view
 
-        pks = [
-            col
-            for col in properties["loaded_columns"]
-            if getattr(
-                getattr(base, anyblok_column_prefix + col), "primary_key", False
-            )
-        ]
-
-        if not pks:
-            raise ViewException("%r have any primary key defined" % base)
-
         pks = [getattr(view.c, x) for x in pks]
         mapper_properties = self.get_mapper_properties(base, view, properties)
         base.anyblok.declarativebase.registry.map_imperatively(
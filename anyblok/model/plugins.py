@@ -25,6 +25,11 @@ class ModelPluginBase:
     def __init__(self, registry):
         self.registry = registry
 
+    # def before_assemble(self):
+    #     """Called at each load of the registry, before assembling the
+    #     models
+    #     """
+
     # def initialisation_tranformation_properties(self, properties,
     #                                             transformation_properties):
     #     """ Initialise the transform properties
@@ -191,9 +191,13 @@ class TableMapperPlugin(ModelPluginBase):
 
             def __mapper_args__(cls_):
                 res = cls_.define_mapper_args()
-                if "polymorphic_on" in res and res["polymorphic_on"]:
+                if res.get("polymorphic_on") is not None:
                     column = res["polymorphic_on"]
-                    res["polymorphic_on"] = column.descriptor.sqla_column
+                    if hasattr(column, "descriptor"):
+                        # hybrid property
+                        column = column.descriptor.sqla_column
+
+                    res["polymorphic_on"] = column
 
                 return res
 
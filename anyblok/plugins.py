@@ -6,12 +6,16 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+import re
 from logging import getLogger
 
+from sqlalchemy import inspect, text
 from sqlalchemy.dialects.mssql.base import BIT
 from sqlalchemy.dialects.mysql.types import TINYINT
-from sqlalchemy.sql.sqltypes import Boolean, DateTime
+from sqlalchemy.sql.sqltypes import Boolean, DateTime, SmallInteger, String
 
+from .column import SmallIntSelectionType
+from .common import model_name, sgdb_in
 from .migration import MigrationColumnTypePlugin
 
 logger = getLogger(__name__)
@@ -57,3 +61,125 @@ class BooleanToBitMsSQL(MigrationColumnTypePlugin):
         """Boolean are Bit in MsSQL DataBases"""
         # do nothing
         pass  # pragma: no cover
+
+
+class StringToSmallIntSelection(MigrationColumnTypePlugin):
+    """Replace the keys of a Selection column by their codes when the
+    storage of the column becomes ``smallint``
+
+    The keys without code become NULL
+    """
+
+    to_type = SmallIntSelectionType
+    from_type = String
+    dialect = None
+
+    def need_to_modify_type(self):
+        return True
+
+    def get_case(self, column_name, as_string=False):
+        """Return the SQL expression which gives the code of the key"""
+        whens = [
+            "WHEN '%s' THEN %s"
+            % (key.replace("'", "''"), "'%d'" % code if as_string else code)
+            for key, code in self.to_value.codes
+        ]
+        return "CASE %s %s END" % (column_name, " ".join(whens))
+
+    def is_selection_check_constraint(self, name, column):
+        """Return True if the check constraint is the one created by AnyBlok
+        on the keys of the Selection column
+
+        The name is ``anyblok_ck_<model>__<column>_<md5>_types``, or this
+        name truncated by SQLAlchemy to the max length of the dialect
+
+        :param name: name of the reflected check constraint
+        :param column: MigrationColumn instance
+        """
+        prefix = "anyblok_ck_%s__%s_" % (
+            model_name(None, column.table),
+            column.name,
+        )
+        if re.fullmatch(re.escape(prefix) + "[0-9a-f]{32}_types", name):
+            return True
+
+        dialect = column.table.migration.conn.dialect
+        max_length = (
+            dialect.max_constraint_name_length or dialect.max_identifier_length
+        )
+        if len(name) != max_length - 3 or not re.search("_[0-9a-f]{4}$", name):
+            return False
+
+        # truncated: name[:max_length - 8] + "_" + 4 characters of a md5
+        head = name[: max_length - 8]
+        if len(head) <= len(prefix):
+            return prefix.startswith(head)
+
+        if not head.startswith(prefix):
+            return False
+
+        rest = head[len(prefix) :]
+        return bool(
+            re.fullmatch("[0-9a-f]{0,32}", rest[:32])
+        ) and "_types".startswith(rest[32:])
+
+    def drop_check_constraints(self, column):
+        """Drop the check constraint of AnyBlok on the keys, it forbids the
+        codes. The other check constraints on the column are kept"""
+        table = column.table
+        migration = table.migration
+        if sgdb_in(migration.conn.engine, ["MySQL", "MariaDB", "MsSQL"]):
+            # the check constraints are not reflected
+            return
+
+        inspector = inspect(migration.conn)
+        for ck in inspector.get_check_constraints(
+            table.name, schema=table.schema
+        ):
+            if ck["name"] and self.is_selection_check_constraint(
+                ck["name"], column
+            ):
+                table.check(ck["name"]).drop()
+
+    def apply(self, column, **kwargs):
+        table = column.table
+        migration = table.migration
+        preparer = migration.conn.dialect.identifier_preparer
+        column_name = preparer.quote(column.name)
+        self.drop_check_constraints(column)
+        if sgdb_in(migration.conn.engine, ["PostgreSQL"]):
+            migration.operation.alter_column(
+                table.name,
+                column.name,
+                schema=table.schema,
+                type_=SmallInteger(),
+                existing_type=self.from_value,
+                postgresql_using=self.get_case(column_name),
+                **kwargs,
+            )
+        else:
+            table_name = preparer.quote(table.name)
+            if table.schema:
+                table_name = "%s.%s" % (
+                    preparer.quote_schema(table.schema),
+                    table_name,
+                )
+
+            migration.conn.execute(
+                text(
+                    "UPDATE %s SET %s = %s"
+                    % (
+                        table_name,
+                        column_name,
+                        self.get_case(column_name, as_string=True),
+                    )
+                )
+            )
+            migration.operation.alter_column(
+                table.name,
+                column.name,
+                schema=table.schema,
+                type_=SmallInteger(),
+                existing_type=self.from_value,
+                **kwargs,
+            )
@@ -7,9 +7,14 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from hashlib import sha256
+from itertools import cycle
+from json import dumps
 from logging import getLogger
+from os import walk
+from os.path import dirname, join
 
-from sqlalchemy import MetaData, create_engine, event, text
+from sqlalchemy import JSON, MetaData, create_engine, event, text
 from sqlalchemy.exc import (
     InternalError,
     InvalidRequestError,
@@ -19,17 +24,20 @@ from sqlalchemy.exc import (
 from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
 from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy.orm.session import close_all_sessions
+from sqlalchemy.sql import functions, visitors
 from sqlalchemy_utils.functions import database_exists
 
 from anyblok.common import anyblok_column_prefix, naming_convention
 
 from .authorization.query import QUERY_WITH_NO_RESULTS, PostFilteredQuery
 from .blok import BlokManager
+from .cache_invalidation import get_cache_invalidation_transport
 from .config import Configuration, get_url
 from .environment import EnvironmentManager
 from .logging import log
 from .migration import Migration
 from .pkg_metadata import iter_entry_points
+from .release import version as anyblok_version
 from .version import parse_version
 
 try:
@@ -45,6 +53,11 @@ except ImportError:
 
 logger = getLogger(__name__)
 
+MIGRATION_SNAPSHOT_PARAMETER = "anyblok.registry.migration_snapshot"
+PRIMARY_ONLY_FUNCTIONS = {"nextval", "setval", "currval", "lastval"}
+"""Functions which write or read the state of the session, the SELECT
+statements which call them are never executed on a replica"""
+
 
 class RegistryManagerException(Exception):
     """Simple Exception for Registry"""
@@ -456,6 +469,183 @@ class RegistryManager:
             del cls.loaded_bloks[blok]["properties"][property_]
 
 
+class HookQueue:
+    """Ordered queue of the commit hooks
+
+    The entries are indexed by their value to find an existing entry
+    without scanning the queue, only the entries with unhashable arguments
+    are compared one by one
+    """
+
+    def __init__(self, entries=None):
+        self.entries = {}
+        self.unhashables = {}
+        for entry in entries or []:
+            self.add(entry)
+
+    def get_key(self, entry):
+        """Return the index key of the entry, None if it is unhashable"""
+        try:
+            key = tuple(
+                frozenset(x.items()) if isinstance(x, dict) else x
+                for x in entry
+            )
+            hash(key)
+        except TypeError:
+            return None
+
+        return key
+
+    def find(self, entry):
+        """Return the index key of the entry in the queue, None if the
+        entry is not in the queue"""
+        key = self.get_key(entry)
+        if key is not None:
+            return key if key in self.entries else None
+
+        for key, other in self.unhashables.items():
+            if other == entry:
+                return key
+
+        return None
+
+    def add(self, entry, put_at_the_end_if_exist=False):
+        """Add the entry at the end of the queue if it does not exist
+
+        :param entry: the hook to add
+        :param put_at_the_end_if_exist: if True the existing entry is moved
+            at the end of the queue
+        :rtype: the entry saved in the queue
+        """
+        key = self.find(entry)
+        if key is None:
+            key = self.get_key(entry)
+            if key is None:
+                key = object()
+                self.unhashables[key] = entry
+
+            self.entries[key] = entry
+        elif put_at_the_end_if_exist:
+            self.entries[key] = self.entries.pop(key)
+
+        return self.entries[key]
+
+    def remove(self, entry):
+        """Remove the entry from the queue
+
+        :exception: ValueError if the entry is not in the queue
+        """
+        key = self.find(entry)
+        if key is None:
+            raise ValueError("%r is not in the hook queue" % (entry,))
+
+        del self.entries[key]
+        self.unhashables.pop(key, None)
+
+    def __contains__(self, entry):
+        return self.find(entry) is not None
+
+    def __iter__(self):
+        return iter(list(self.entries.values()))
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class HookBatch:
+    """Arguments of all the registrations of a batched hook
+
+    The method of the hook is called once, with one list by positional
+    argument, each list contains the value of the argument for each
+    registration
+    """
+
+    def __init__(self):
+        self.registrations = HookQueue()
+        self.arity = None
+
+    def __eq__(self, other):
+        return isinstance(other, HookBatch)
+
+    def __hash__(self):
+        return hash(HookBatch)
+
+    def __repr__(self):
+        return "<HookBatch %r>" % list(self.registrations)
+
+    def add(self, args):
+        if self.arity is None:
+            self.arity = len(args)
+        elif self.arity != len(args):
+            raise RegistryException(
+                "A batched hook waits %d arguments, not %d: %r"
+                % (self.arity, len(args), args)
+            )
+
+        self.registrations.add(args)
+
+    def get_args(self):
+        """Return the list of the values of each positional argument"""
+        return [list(x) for x in zip(*self.registrations)]
+
+
+def get_hook_queue(name):
+    """Return the hook queue saved in the EnvironmentManager
+
+    :param name: ``_precommit_hook`` or ``_postcommit_hook``
+    :rtype: HookQueue
+    """
+    queue = EnvironmentManager.get(name)
+    if not isinstance(queue, HookQueue):
+        queue = HookQueue(queue)
+        EnvironmentManager.set(name, queue)
+
+    return queue
+
+
+def calls_primary_only_function(clause):
+    """Return True if the statement calls a sequence or one of the
+    ``PRIMARY_ONLY_FUNCTIONS``
+
+    :param clause: the statement to execute
+    :rtype: bool
+    """
+    for element in visitors.iterate(clause):
+        if isinstance(element, functions.next_value):
+            return True
+
+        if isinstance(element, functions.FunctionElement) and (
+            getattr(element, "name", "").lower() in PRIMARY_ONLY_FUNCTIONS
+        ):
+            return True
+
+    return False
+
+
+def clean_ro_session_info(session, transaction):
+    """Forget the writes and the replica of the session at the end of the
+    root transaction"""
+    if transaction.parent is None:
+        session.info.pop("anyblok_written", None)
+        session.info.pop("anyblok_ro_engine", None)
+
+
+def clear_invalidated_caches(session):
+    """Clear the caches invalidated during the transaction at the rollback,
+    they may have been filled with values which are rolled back"""
+    caches = session.anyblok.caches
+    invalidated = session.info.get("anyblok_invalidated_caches", ())
+    for registry_name, method in invalidated:
+        for cache in caches.get(registry_name, {}).get(method, []):
+            cache.cache_clear()
+
+
+def forget_invalidated_caches(session, transaction):
+    """Forget the caches invalidated at the end of the root transaction"""
+    if transaction.parent is None:
+        session.info.pop("anyblok_invalidated_caches", None)
+
+
 class Registry:
     """Define one registry
 
@@ -474,6 +664,7 @@ class Registry:
         self.additional_setting = kwargs
         self.init_engine(db_name=db_name)
         self.init_bind()
+        self.init_cache_invalidation_transport()
         self.registry_base = type(
             "RegistryBase",
             tuple(),
@@ -495,6 +686,13 @@ class Registry:
             self.bind = self.engine
             self.unittest_transaction = None
 
+    def init_cache_invalidation_transport(self):
+        """Define the transport used to share the cache invalidations
+        between the processes"""
+        self.cache_invalidation_transport = get_cache_invalidation_transport(
+            self, self.additional_setting.get("cache_invalidation_transport")
+        )
+
     def init_engine_options(self, url):
         """Define the options to initialize the engine"""
         return dict(
@@ -518,6 +716,74 @@ class Registry:
         kwargs["future"] = True
         self.rw_engine = create_engine(url, **kwargs)
         self.apply_engine_events(self.rw_engine)
+        self.init_ro_engines()
+
+    def init_ro_engines(self):
+        """Define the engines of the read only replicas
+
+        The urls come from the registry additional_setting ``db_ro_urls``
+        or from the configuration ``db_ro_urls``
+        """
+        self.ro_routing = False
+        self.ro_engines = []
+        urls = self.additional_setting.get(
+            "db_ro_urls", Configuration.get("db_ro_urls")
+        )
+        for url in urls or []:
+            kwargs = self.init_engine_options(url)
+            kwargs["future"] = True
+            kwargs["pool_size"] = (
+                Configuration.get("db_ro_pool_size") or kwargs["pool_size"]
+            )
+            kwargs["max_overflow"] = (
+                Configuration.get("db_ro_max_overflow")
+                or kwargs["max_overflow"]
+            )
+            engine = create_engine(url, **kwargs)
+            self.apply_engine_events(engine)
+            self.ro_engines.append(engine)
+
+        self.ro_engines_cycle = cycle(self.ro_engines)
+
+    def get_ro_engine(self, session, clause):
+        """Return the engine of a read only replica to execute the clause,
+        or None if the clause must be executed on the primary
+
+        Only the SELECT statements are executed on a replica, when the
+        session writes (flush, DML, SELECT FOR UPDATE, ...) the next
+        statements are executed on the primary until the end of the
+        transaction, to read the writes of the session. The SELECT
+        statements which call a sequence (``nextvals``) or a function of
+        ``PRIMARY_ONLY_FUNCTIONS`` are executed on the primary. The same
+        replica is used during the transaction. The sessions of
+        ``AsyncRegistry`` always use the primary
+
+        :param session: the session which executes the clause
+        :param clause: the statement to execute
+        :rtype: engine or None
+        """
+        info = session.info
+        if not self.ro_routing or info.get("anyblok_async"):
+            return None
+
+        if info.get("anyblok_written"):
+            return None
+
+        if (
+            clause is None
+            or not getattr(clause, "is_select", False)
+            or getattr(clause, "_for_update_arg", None) is not None
+        ):
+            info["anyblok_written"] = True
+            return None
+
+        if calls_primary_only_function(clause):
+            return None
+
+        if "anyblok_ro_engine" not in info:
+            info["anyblok_ro_engine"] = next(self.ro_engines_cycle)
+
+        return info["anyblok_ro_engine"]
 
     def apply_engine_events(self, engine):
         """Add engine events
@@ -566,8 +832,8 @@ class Registry:
         self.children_namespaces = {}
         self.properties = {}
         self.removed = []
-        EnvironmentManager.set("_precommit_hook", [])
-        EnvironmentManager.set("_postcommit_hook", [])
+        EnvironmentManager.set("_precommit_hook", HookQueue())
+        EnvironmentManager.set("_postcommit_hook", HookQueue())
         self._sqlalchemy_known_events = []
         self.expire_attributes = {}
 
@@ -689,6 +955,178 @@ class Registry:
 
         return toinstall
 
+    @property
+    def skip_unchanged_migration(self):
+        """Return True if the registry may skip the migration when the
+        installed bloks and their code did not change since the last
+        migration, the models are still assembled"""
+        return self.additional_setting.get(
+            "skip_unchanged_migration",
+            Configuration.get("skip_unchanged_migration", False),
+        )
+
+    @property
+    def direct_column_mapping(self):
+        """Return True if the columns which do not format their value are
+        mapped by SQLAlchemy under their name, without hybrid property"""
+        return self.additional_setting.get(
+            "direct_column_mapping",
+            Configuration.get("direct_column_mapping", False),
+        )
+
+    def get_migration_fingerprint(self):
+        """Return the fingerprint of the installed bloks saved by the
+        migration
+
+        The fingerprint is computed from the state and the installed
+        version of the bloks saved in the database, the version of the bloks
+        known by the ``BlokManager``, the source of the ``anyblok`` package
+        and the source of the declaration modules of the installed bloks
+
+        :rtype: str, None if a blok must be installed, updated or uninstalled
+        """
+        query = "SELECT name, state, installed_version FROM system_blok"
+        try:
+            res = self.execute(text(query), fetchall=True)
+        except (
+            ProgrammingError,
+            OperationalError,
+            PyODBCProgrammingError,
+            InternalError,
+        ):
+            # During the first connection the database is empty
+            return None
+
+        states = sorted(tuple(x) for x in res)
+        if not states or any(
+            x[1] in ("toinstall", "toupdate", "touninstall") for x in states
+        ):
+            return None
+
+        fingerprint = sha256()
+        fingerprint.update(
+            dumps(
+                [
+                    anyblok_version,
+                    self.engine.dialect.name,
+                    states,
+                    [
+                        (blok, BlokManager.bloks[blok].version)
+                        for blok in BlokManager.ordered_bloks
+                    ],
+                ]
+            ).encode("utf-8")
+        )
+        paths = {
+            BlokManager.getPath(blok)
+            for blok, state, _ in states
+            if state == "installed" and blok in BlokManager.bloks
+        }
+        paths.add(dirname(__file__))
+        # a set, the bloks of the anyblok package are also in its path
+        filenames = set()
+        for path in paths:
+            for root, dirs, files in walk(path):
+                dirs[:] = [x for x in dirs if x != "tests"]
+                filenames.update(
+                    join(root, x) for x in files if x.endswith(".py")
+                )
+
+        for filename in sorted(filenames):
+            with open(filename, "rb") as fp:
+                fingerprint.update(fp.read())
+
+        return fingerprint.hexdigest()
+
+    def read_migration_snapshot(self):
+        """Return the snapshot saved by the last registry which migrated
+        the database, without checking it
+
+        :rtype: dict, None if no snapshot exists
+        """
+        query = text(
+            "SELECT value FROM system_parameter WHERE key = :key"
+        ).bindparams(key=MIGRATION_SNAPSHOT_PARAMETER)
+        try:
+            res = self.execute(
+                query.columns(value=JSON(none_as_null=True)), fetchall=True
+            )
+        except (
+            ProgrammingError,
+            OperationalError,
+            PyODBCProgrammingError,
+            InternalError,
+        ):
+            return None  # pragma: no cover
+
+        return res[0][0] if res else None
+
+    def get_migration_snapshot(self, toinstall):
+        """Return the snapshot if the migration of the registry can be
+        skipped
+
+        :param toinstall: list of the bloks to install
+        :rtype: dict, None if the fingerprint does not match the snapshot
+        """
+        if (
+            not self.skip_unchanged_migration
+            or self.loadwithoutmigration
+            or toinstall
+        ):
+            return None
+
+        snapshot = self.read_migration_snapshot()
+        if not snapshot:
+            return None
+
+        if snapshot.get("fingerprint") != self.get_migration_fingerprint():
+            return None
+
+        return snapshot
+
+    def check_migration_snapshot(self, snapshot):
+        """Migrate the database if the assembled models differ from the
+        snapshot used to skip the migration
+
+        :param snapshot: dict returned by ``get_migration_snapshot``
+        """
+        if not self.migration_skipped:
+            return
+
+        description = self.get_assembly_description()
+        if any(snapshot.get(x) != y for x, y in description.items()):
+            logger.warning(
+                "The assembled models differ from the migration snapshot, "
+                "the database is migrated"
+            )
+            self.migration_skipped = self.loadwithoutmigration = False
+
+    def get_assembly_description(self):
+        """Return the namespaces and the tables assembled by the registry"""
+        return dict(
+            namespaces=sorted(self.loaded_namespaces),
+            tables=sorted(self.declarativebase.metadata.tables),
+        )
+
+    def save_migration_snapshot(self):
+        """Save the fingerprint and the assembly description of the registry
+        in ``Model.System.Parameter``, the next registries loaded with
+        ``skip_unchanged_migration`` and the same fingerprint do not migrate
+        the database
+
+        The snapshot is written in the transaction of the migration, it is
+        committed with it by the caller of the load
+        """
+        fingerprint = self.get_migration_fingerprint()
+        if fingerprint is None:
+            return  # pragma: no cover
+
+        snapshot = dict(fingerprint=fingerprint)
+        snapshot.update(self.get_assembly_description())
+        Parameter = self.System.Parameter
+        if Parameter.get(MIGRATION_SNAPSHOT_PARAMETER, None) != snapshot:
+            Parameter.set(MIGRATION_SNAPSHOT_PARAMETER, snapshot)
+
     def check_permission(self, target, principals, permission):
         """Check that one of the principals has permisson on target.
 
@@ -703,6 +1141,31 @@ class Registry:
             target, principals, permission
         )
 
+    def check_permissions(self, targets, principals, permission):
+        """Check that one of the principals has permisson on each target.
+
+        The targets are grouped by policy, and each policy checks all its
+        targets at once (see ``check_many`` of the policies).
+
+        :param targets: list of model instances (records) or classes
+        :param principals: list, set or tuple of strings
+        :rtype: list of bool, in the order of the targets
+        """
+        policies = {}
+        for index, target in enumerate(targets):
+            policy = self.lookup_policy(target, permission)
+            policies.setdefault(id(policy), (policy, []))[1].append(index)
+
+        res = [False] * len(targets)
+        for policy, indexes in policies.values():
+            checks = policy.check_many(
+                [targets[index] for index in indexes], principals, permission
+            )
+            for index, check in zip(indexes, checks):
+                res[index] = check
+
+        return res
+
     def wrap_query_permission(self, query, principals, permission, models=()):
         """Wrap query to return only authorized results
 
@@ -1016,10 +1479,26 @@ class Registry:
             session_bases = [self.registry_base] + self.loaded_cores["Session"]
             Session = type("Session", tuple(session_bases), {})
 
+            session_factory = sessionmaker(
+                bind=bind, class_=Session, future=True
+            )
             self.Session = scoped_session(
-                sessionmaker(bind=bind, class_=Session, future=True),
+                session_factory,
                 EnvironmentManager.scoped_function_for_session(),
             )
+            scoped_registry = EnvironmentManager.scoped_registry_for_session(
+                session_factory
+            )
+            if scoped_registry is not None:
+                self.Session.registry = scoped_registry
+
+            event.listen(
+                Session, "after_transaction_end", clean_ro_session_info
+            )
+            event.listen(Session, "after_rollback", clear_invalidated_caches)
+            event.listen(
+                Session, "after_transaction_end", forget_invalidated_caches
+            )
 
             self.nb_session_bases = len(self.loaded_cores["Session"])
             self.apply_session_events()
@@ -1045,6 +1524,7 @@ class Registry:
         """
         mustreload = False
         blok2install = None
+        self.ro_routing = False
         try:
             self.declarativebase = declarative_base(
                 metadata=MetaData(naming_convention=naming_convention),
@@ -1061,6 +1541,12 @@ class Registry:
                 logger.warning("Impossible to use loadwithoumigration")
                 self.loadwithoutmigration = False  # pragma: no cover
 
+            snapshot = self.get_migration_snapshot(toinstall)
+            self.migration_skipped = snapshot is not None
+            if self.migration_skipped:
+                logger.info("Unchanged bloks: the migration is skipped")
+                self.loadwithoutmigration = True
+
             self.load_bloks(toload, False, toload)
             if toinstall and not self.loadwithoutmigration:
                 blok2install = toinstall[0]
@@ -1072,6 +1558,7 @@ class Registry:
                 "InstrumentedList", tuple(instrumentedlist_base), {}
             )
             self.assemble_entries()
+            self.check_migration_snapshot(snapshot)
             self.create_query_factory()
             self.create_session_factory()
 
@@ -1087,8 +1574,16 @@ class Registry:
             self.reload()
         else:
             self.System.Blok.load_all()
+            if (
+                self.skip_unchanged_migration
+                and not self.migration_skipped
+                and not self.loadwithoutmigration
+            ):
+                self.save_migration_snapshot()
 
         self.loadwithoutmigration = False
+        # the unittest transaction is never seen by the replicas
+        self.ro_routing = bool(self.ro_engines) and not self.unittest
 
     def apply_session_events(self):
         """Add session events
@@ -1156,6 +1651,17 @@ class Registry:
         res = self.execute(
             text(query).bindparams(bloks_name=blok2install), fetchall=True
         )
+        if self.scoped_migration and not self.get_bloks_by_states(
+            "touninstall"
+        ):
+            # the tables of the bloks to uninstall are not known any more,
+            # all the tables must be compared
+            bloks = {x[0] for x in res}
+            if blok2install:
+                bloks.add(blok2install)
+
+            self.migration.tables_scope = self.get_migration_scope(bloks)
+
         if res:
             for blok, installed_version in res:
                 b = BlokManager.get(blok)(self)
@@ -1184,6 +1690,65 @@ class Registry:
         else:
             self.migration.auto_upgrade_database()
 
+    @property
+    def scoped_migration(self):
+        """Return True if the migration only compares the tables of the
+        bloks to install or to update"""
+        return self.additional_setting.get(
+            "scoped_migration", Configuration.get("scoped_migration", False)
+        )
+
+    def get_migration_scope(self, bloks):
+        """Return the tables which must be compared by the migration for
+        the bloks to install or to update
+
+        The tables are those of the models declared or overloaded by the
+        bloks, directly or by a mixin, and the tables linked to them by a
+        foreign key
+
+        :param bloks: names of the bloks to install or to update
+        :rtype: set of the keys of the tables, None if all the tables must be
+            compared
+        """
+        if any(
+            Configuration.get(x, False)
+            for x in (
+                "reinit_all",
+                "reinit_tables",
+                "reinit_columns",
+                "reinit_indexes",
+                "reinit_constraints",
+            )
+        ):
+            return None
+
+        declarations = set()
+        for blok in bloks:
+            loaded_blok = RegistryManager.loaded_bloks.get(blok)
+            if loaded_blok is None or any(loaded_blok["Core"].values()):
+                # the cores are shared by all the models
+                return None
+
+            for entry in ("Model", "Mixin"):
+                for key in loaded_blok[entry]["registry_names"]:
+                    declarations.update(loaded_blok[entry][key]["bases"])
+
+        metadata_tables = set(self.declarativebase.metadata.tables.values())
+        tables = metadata_tables.intersection(
+            getattr(Model, "__table__", None)
+            for Model in self.loaded_namespaces.values()
+            if Model.is_sql and declarations.intersection(Model.__mro__)
+        )
+        neighbours = set()
+        for table in metadata_tables:
+            referred = {fk.column.table for fk in table.foreign_keys}
+            if table in tables:
+                neighbours.update(referred)
+            elif referred.intersection(tables):
+                neighbours.add(table)
+
+        return {table.key for table in tables.union(neighbours)}
+
     def is_reload_needed(self):
         """Determines whether a reload is needed or not."""
 
@@ -1287,8 +1852,8 @@ class Registry:
     def rollback(self, *args, **kwargs):
         logger.debug("[ROLLBACK] with args=%r and kwargs = %r", args, kwargs)
         self.session.rollback(*args, **kwargs)
-        EnvironmentManager.set("_precommit_hook", [])
-        EnvironmentManager.set("_postcommit_hook", [])
+        EnvironmentManager.set("_precommit_hook", HookQueue())
+        EnvironmentManager.set("_postcommit_hook", HookQueue())
 
     def close_session(self):
         """Close only the session, not the registry
@@ -1314,7 +1879,10 @@ class Registry:
     def close(self):
         """Release the session, connection and engine"""
         self.close_session()
+        self.cache_invalidation_transport.close()
         self.engine.dispose()
+        for engine in self.ro_engines:
+            engine.dispose()
         if self.db_name in RegistryManager.registries:
             del RegistryManager.registries[self.db_name]
 
@@ -1340,20 +1908,18 @@ class Registry:
         :param method: method to call on the registryname
         :param put_at_the_end_if_exist: if true and hook allready exist then the
             hook are moved at the end
+        :param batch: if true the arguments of all the registrations of the
+            hook are given to only one call, see ``HookBatch``
         """
         put_at_the_end_if_exist = kwargs.pop("put_at_the_end_if_exist", False)
+        batch = kwargs.pop("batch", False)
 
-        entry = (registryname, method, args, kwargs)
-        _precommit_hook = EnvironmentManager.get("_precommit_hook", [])
-        if entry in _precommit_hook:
-            if put_at_the_end_if_exist:
-                _precommit_hook.remove(entry)
-                _precommit_hook.append(entry)
-
-        else:
-            _precommit_hook.append(entry)
-
-        EnvironmentManager.set("_precommit_hook", _precommit_hook)
+        entry = (registryname, method, HookBatch() if batch else args, kwargs)
+        entry = get_hook_queue("_precommit_hook").add(
+            entry, put_at_the_end_if_exist=put_at_the_end_if_exist
+        )
+        if batch:
+            entry[2].add(args)
 
     def postcommit_hook(self, registryname, method, *args, **kwargs):
         """Add a method in the postcommit_hook list
@@ -1372,43 +1938,40 @@ class Registry:
         :param put_at_the_end_if_exist: if true and hook allready exist then the
             hook are moved at the end
         :param call_only_if: ['commited' (default), 'raised', 'always']
+        :param batch: if true the arguments of all the registrations of the
+            hook are given to only one call, see ``HookBatch``
         """
         put_at_the_end_if_exist = kwargs.pop("put_at_the_end_if_exist", False)
         call_only_if = kwargs.pop("call_only_if", "commited")
-
-        entry = (registryname, method, call_only_if, args, kwargs)
-        _postcommit_hook = EnvironmentManager.get("_postcommit_hook", [])
-        if entry in _postcommit_hook:
-            if put_at_the_end_if_exist:
-                _postcommit_hook.remove(entry)
-                _postcommit_hook.append(entry)
-
-        else:
-            _postcommit_hook.append(entry)
-
-        EnvironmentManager.set("_postcommit_hook", _postcommit_hook)
+        batch = kwargs.pop("batch", False)
+
+        entry = (
+            registryname,
+            method,
+            call_only_if,
+            HookBatch() if batch else args,
+            kwargs,
+        )
+        entry = get_hook_queue("_postcommit_hook").add(
+            entry, put_at_the_end_if_exist=put_at_the_end_if_exist
+        )
+        if batch:
+            entry[3].add(args)
 
     def apply_precommit_hook(self):
-        hooks = []
-        _precommit_hook = EnvironmentManager.get("_precommit_hook")
-        if _precommit_hook:
-            hooks.extend(_precommit_hook)
-
-        for hook in hooks:
-            Model = self.loaded_namespaces[hook[0]]
-            method = hook[1]
-            a = hook[2]
-            kw = hook[3]
+        _precommit_hook = get_hook_queue("_precommit_hook")
+        for hook in _precommit_hook:
+            registryname, method, a, kw = hook
+            if isinstance(a, HookBatch):
+                a = a.get_args()
+
+            Model = self.loaded_namespaces[registryname]
             getattr(Model, method)(*a, **kw)
             _precommit_hook.remove(hook)
 
     def apply_postcommit_hook(self, withexception=False):
-        hooks = []
-        _postcommit_hook = EnvironmentManager.get("_postcommit_hook")
-        if _postcommit_hook:
-            hooks.extend(_postcommit_hook)
-
-        for hook in hooks:
+        _postcommit_hook = get_hook_queue("_postcommit_hook")
+        for hook in _postcommit_hook:
             registryname, method, call_only_if, a, kw = hook
             if withexception is False and call_only_if == "raised":
                 _postcommit_hook.remove(hook)
@@ -1418,6 +1981,9 @@ class Registry:
                 _postcommit_hook.remove(hook)
                 continue
 
+            if isinstance(a, HookBatch):
+                a = a.get_args()
+
             Model = self.loaded_namespaces[registryname]
             try:
                 getattr(Model, method)(*a, **kw)
@@ -582,7 +582,11 @@ class Many2One(RelationShip):
 
         if namespace == self.model.model_name:
             self.kwargs["remote_side"] = [
-                properties[anyblok_column_prefix + x.attribute_name]
+                (
+                    properties[x.attribute_name]
+                    if x.attribute_name in properties["direct_mapped_columns"]
+                    else properties[anyblok_column_prefix + x.attribute_name]
+                )
                 for x in self.remote_columns
             ]
 
@@ -0,0 +1,231 @@
+# This file is a part of the AnyBlok project
+#
+#    Copyright (C) 2024 Jean-Sebastien SUZANNE <js.suzanne@gmail.com>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file,You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+from asyncio import gather, run, sleep
+
+import pytest
+from sqlalchemy.engine import make_url
+
+from anyblok import Declarations
+from anyblok.aio import AsyncRegistry, get_async_url
+from anyblok.column import Integer, String
+from anyblok.environment import (
+    ContextVarEnvironment,
+    ContextVarRegistry,
+    EnvironmentManager,
+    ThreadEnvironment,
+)
+from anyblok.registry import RegistryException
+from anyblok.testing import sgdb_in
+
+from .conftest import init_registry_with_bloks
+
+hook_calls = []
+
+
+def add_model_with_hook():
+    @Declarations.register(Declarations.Model)
+    class Test:
+        id = Integer(primary_key=True)
+        name = String()
+
+        @classmethod
+        def record_hook(cls, name):
+            hook_calls.append((name, cls.anyblok.Session()))
+
+
+def run_async(async_registry, coroutine):
+    """Run the coroutine and release the connections in the same event
+    loop"""
+
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await async_registry.close()
+
+    return run(main())
+
+
+def init_async_registry(request, function):
+    pytest.importorskip("asyncpg")
+    EnvironmentManager.define_environment_cls(ContextVarEnvironment)
+    registry = init_registry_with_bloks([], function)
+    async_registry = AsyncRegistry(
+        registry, url=get_async_url(registry.engine.url, driver="asyncpg")
+    )
+
+    def close():
+        registry.close()
+        EnvironmentManager.define_environment_cls(ThreadEnvironment)
+
+    request.addfinalizer(close)
+    return async_registry
+
+
+@pytest.fixture(scope="function")
+def async_registry(request, bloks_loaded):
+    return init_async_registry(request, None)
+
+
+@pytest.fixture(scope="function")
+def async_registry_with_hook(request, bloks_loaded):
+    del hook_calls[:]
+    return init_async_registry(request, add_model_with_hook)
+
+
+class TestAsyncRegistryException:
+    def test_get_async_url(self):
+        url = get_async_url(make_url("postgresql:///db"), driver="asyncpg")
+        assert url.drivername == "postgresql+asyncpg"
+        assert url.database == "db"
+
+    def test_get_async_url_without_driver(self):
+        with pytest.raises(RegistryException):
+            get_async_url(make_url("postgresql:///db"))
+
+    def test_sessions_scoped_by_thread(self, registry_blok):
+        with pytest.raises(RegistryException):
+            AsyncRegistry(registry_blok, url="postgresql+asyncpg:///db")
+
+
+@pytest.mark.skipif(
+    not sgdb_in(["PostgreSQL"]), reason="asyncpg driver for PostgreSQL"
+)
+class TestAsyncRegistry:
+    def test_query(self, async_registry):
+        registry = async_registry.registry
+        Blok = async_registry.get("Model.System.Blok")
+
+        async def query():
+            async with async_registry:
+                query = Blok.query().filter_by(name="anyblok-core")
+                return (
+                    await Blok.query().count(),
+                    await query.one(),
+                    await query.dictfirst(),
+                    await Blok.query("name").all(),
+                )
+
+        count, blok, values, names = run_async(async_registry, query())
+        assert count == registry.System.Blok.query().count()
+        assert blok.name == "anyblok-core"
+        assert values["name"] == "anyblok-core"
+        assert ("anyblok-core",) in names
+
+    def test_insert_and_commit(self, async_registry):
+        Parameter = async_registry.get("Model.System.Parameter")
+
+        async def insert():
+            async with async_registry:
+                await Parameter.insert(key="test-aio", value={"value": 1})
+                await async_registry.commit()
+
+            async with async_registry:
+                parameter = (
+                    await Parameter.query().filter_by(key="test-aio").one()
+                )
+                await async_registry.run(parameter.delete)
+                await async_registry.commit()
+                return parameter.value
+
+        assert run_async(async_registry, insert()) == {"value": 1}
+
+    def test_commit_with_hooks(self, async_registry):
+        Blok = async_registry.get("Model.System.Blok")
+
+        async def commit():
+            async with async_registry:
+                await async_registry.run(
+                    Blok.Model.precommit_hook, "get_states"
+                )
+                before = len(EnvironmentManager.get("_precommit_hook"))
+                await async_registry.commit()
+                return before, len(EnvironmentManager.get("_precommit_hook"))
+
+        assert run_async(async_registry, commit()) == (1, 0)
+
+    def test_rollback_on_exception(self, async_registry):
+        Parameter = async_registry.get("Model.System.Parameter")
+
+        async def insert():
+            with pytest.raises(ValueError):
+                async with async_registry:
+                    await Parameter.insert(key="test-aio", value={})
+                    raise ValueError()
+
+            async with async_registry:
+                return await Parameter.query().filter_by(key="test-aio").count()
+
+        assert run_async(async_registry, insert()) == 0
+
+    def test_session_by_task(self, async_registry):
+        async def get_session():
+            async with async_registry:
+                await async_registry.run(async_registry.registry.flush)
+                return async_registry.get_session()
+
+        async def get_sessions():
+            return await gather(get_session(), get_session())
+
+        session1, session2 = run_async(async_registry, get_sessions())
+        assert session1 is not session2
+
+    def test_hooks_by_task(self, async_registry_with_hook):
+        async_registry = async_registry_with_hook
+        Test = async_registry.get("Model.Test")
+
+        async def request(name):
+            async with async_registry:
+                await async_registry.run(
+                    Test.Model.precommit_hook, "record_hook", name
+                )
+                await sleep(0)
+                await async_registry.commit()
+                return name, async_registry.get_session().sync_session
+
+        async def requests():
+            async with async_registry:
+                # the hooks of the parent task are not shared either
+                await async_registry.run(
+                    Test.Model.precommit_hook, "record_hook", "parent"
+                )
+                return await gather(request("request1"), request("request2"))
+
+        sessions = run_async(async_registry, requests())
+        assert sorted(hook_calls, key=lambda x: x[0]) == sorted(sessions)
+
+    def test_sessions_in_context_variable(self, async_registry):
+        registry = async_registry.registry
+        assert isinstance(registry.Session.registry, ContextVarRegistry)
+
+    def test_child_task_has_its_own_session(self, async_registry):
+        async def get_session():
+            return async_registry.get_session()
+
+        async def main():
+            async with async_registry:
+                session = async_registry.get_session()
+                return session, await gather(get_session())
+
+        session, (child_session,) = run_async(async_registry, main())
+        assert session is not child_session
+
+    def test_multi_insert_with_keywords(self, async_registry):
+        Parameter = async_registry.get("Model.System.Parameter")
+
+        async def insert():
+            async with async_registry:
+                return await Parameter.multi_insert(
+                    {"key": "test-aio-1", "value": 1},
+                    {"key": "test-aio-2", "value": 2},
+                    bulk=True,
+                    returning=["key"],
+                )
+
+        rows = run_async(async_registry, insert())
+        assert [x.key for x in rows] == ["test-aio-1", "test-aio-2"]
@@ -6,10 +6,15 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 import pytest
+from sqlalchemy import event
 
+from anyblok import Declarations
+from anyblok.column import Integer, String
 from anyblok.test_bloks.authorization import TestRuleOne, TestRuleTwo
 
 from ..authorization.rule.base import RuleNotForModelClasses, deny_all
+from ..authorization.rule.modelaccess import ModelAccessRule
+from .conftest import init_registry_with_bloks, reset_db
 
 
 class TestAuthorizationDeclaration:
@@ -86,6 +91,74 @@ class TestAuthorizationDeclaration:
         assert filtered.first() is None
         assert len(filtered.all()) == 0
 
+    def test_model_based_policy_grants_are_cached(self, registry_testblok_func):
+        registry = registry_testblok_func
+        registry.upgrade(install=("test-blok9",))
+        model = registry.Test2
+        Grant = registry.Authorization.ModelPermissionGrant
+        grant = Grant.insert(
+            model="Model.Test2", principal="Franck", permission="Read"
+        )
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(registry.engine, "before_cursor_execute", count_statements)
+        try:
+            for x in range(5):
+                assert registry.check_permission(model, ("Franck",), "Read")
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", count_statements
+            )
+
+        assert len(statements) == 1
+
+        # the ORM modifications of the grants invalidate the cache
+        grant.permission = "Write"
+        registry.flush()
+        assert not registry.check_permission(model, ("Franck",), "Read")
+        assert registry.check_permission(model, ("Franck",), "Write")
+        grant.delete()
+        assert not registry.check_permission(model, ("Franck",), "Write")
+        Grant.insert(model="Model.Test2", principal="Franck", permission="Read")
+        assert registry.check_permission(model, ("Franck",), "Read")
+        assert not registry.check_permission(model, ("Franck",), "Write")
+        Grant.bulk_insert(
+            dict(model="Model.Test2", principal="Franck", permission="Write")
+        )
+        assert registry.check_permission(model, ("Franck",), "Write")
+
+    def test_model_based_policy_grants_rolled_back(
+        self, registry_testblok_func
+    ):
+        registry = registry_testblok_func
+        registry.upgrade(install=("test-blok9",))
+        model = registry.Test2
+        Grant = registry.Authorization.ModelPermissionGrant
+        assert not registry.check_permission(model, ("Franck",), "Read")
+        savepoint = registry.begin_nested()
+        Grant.insert(model="Model.Test2", principal="Franck", permission="Read")
+        assert registry.check_permission(model, ("Franck",), "Read")
+        savepoint.rollback()
+        assert not registry.check_permission(model, ("Franck",), "Read")
+
+    def test_check_permissions(self, registry_testblok_func):
+        registry = registry_testblok_func
+        registry.upgrade(install=("test-blok10",))
+        Grant = registry.Authorization.ModelPermissionGrant
+        Grant.insert(model="Model.Test2", principal="Franck", permission="Read")
+        record1 = registry.Test2.insert(id=1, owner="Georges")
+        record2 = registry.Test2.insert(id=2, owner="Franck")
+        assert registry.check_permissions(
+            [record1, record2, registry.Test2], ("Franck",), "Read"
+        ) == [True, True, True]
+        assert registry.check_permissions(
+            [record1, record2], ("Franck",), "Write"
+        ) == [False, True]
+        assert registry.check_permissions([], ("Franck",), "Write") == []
+
     def test_attr_based_policy(self, registry_testblok_func):
         """Test the attribute based policy, in conjunction with the model one.
 
@@ -173,3 +246,44 @@ class TestAuthorizationDeclaration:
         )
         assert filtered.count() == 2
         assert filtered.all().id == [1, 2]
+
+
+def grant_model_without_cache():
+    @Declarations.register(Declarations.Model)
+    class Test:
+        id = Integer(primary_key=True)
+
+    @Declarations.register(Declarations.Model)
+    class Grant:
+        model = String(primary_key=True)
+        principal = String(primary_key=True)
+        permission = String(primary_key=True)
+
+    Declarations.AuthorizationBinding(
+        Declarations.Model.Test,
+        ModelAccessRule(grant_model=Declarations.Model.Grant),
+    )
+
+
+@pytest.fixture(scope="function")
+def registry_grant_model_without_cache(request, testbloks_loaded):
+    reset_db()
+    registry = init_registry_with_bloks([], grant_model_without_cache)
+    request.addfinalizer(registry.close)
+    return registry
+
+
+class TestModelAccessRule:
+    def test_grant_model_without_cache(
+        self, registry_grant_model_without_cache
+    ):
+        registry = registry_grant_model_without_cache
+        registry.Grant.insert(
+            model="Model.Test", principal="Franck", permission="Read"
+        )
+        record = registry.Test.insert()
+        assert registry.check_permission(registry.Test, ("Franck",), "Read")
+        assert not registry.check_permission(record, ("Franck",), "Write")
+        assert registry.check_permissions(
+            [record, registry.Test], ("Franck",), "Read"
+        ) == [True, True]
@@ -815,6 +815,18 @@ class TestBlokModel:
             registry.Test2.delete_sql_statement()
         )
 
+    def test_install_with_scoped_migration(self, registry_testblok):
+        registry = registry_testblok
+        registry.additional_setting["scoped_migration"] = True
+        try:
+            registry.upgrade(install=("test-blok7", "test-blok8"))
+            t2 = registry.Test2.insert(label="test2")
+            registry.Test.insert(label="Test1", test2=t2.id)
+            # test-blok8 is installed by the last load
+            assert registry.migration.tables_scope == {"test", "test2"}
+        finally:
+            del registry.additional_setting["scoped_migration"]
+
     def test_auto_migration_is_between_pre_and_post_migration_1(
         self, registry_testblok
     ):
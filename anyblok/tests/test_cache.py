@@ -6,13 +6,25 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+import gc
 from random import random
+from threading import Thread
+from time import sleep
 
 import pytest
+from sqlalchemy import text
 
 from anyblok.bloks.anyblok_core.exceptions import CacheException
+from anyblok.cache_invalidation import (
+    CacheInvalidationTransport,
+    CacheInvalidationTransportException,
+    PostgreSQLNotifyInvalidationTransport,
+    TableInvalidationTransport,
+    get_cache_invalidation_transport,
+)
 from anyblok.column import Integer
 from anyblok.declarations import Declarations, cache, classmethod_cache
+from anyblok.testing import sgdb_in
 
 from .conftest import init_registry, reset_db
 
@@ -98,6 +110,113 @@ class TestCache:
         assert not len(Cache.get_invalidation())
 
 
+class TestCacheInvalidationTransport:
+    @pytest.fixture(autouse=True)
+    def transact(self, request, registry_method_cached):
+        transaction = registry_method_cached.begin_nested()
+        request.addfinalizer(transaction.rollback)
+
+    def test_default_transport_for_unittest(self, registry_method_cached):
+        registry = registry_method_cached
+        assert isinstance(
+            registry.cache_invalidation_transport, TableInvalidationTransport
+        )
+        assert not PostgreSQLNotifyInvalidationTransport.is_available(registry)
+
+    def test_get_transport_by_name(self, registry_method_cached):
+        transport = get_cache_invalidation_transport(
+            registry_method_cached, "table"
+        )
+        assert isinstance(transport, TableInvalidationTransport)
+
+    def test_unknown_transport(self, registry_method_cached):
+        with pytest.raises(CacheInvalidationTransportException):
+            get_cache_invalidation_transport(registry_method_cached, "unknown")
+
+    def test_transport_without_get_invalidation(self, registry_method_cached):
+        with pytest.raises(TypeError):
+            CacheInvalidationTransport(registry_method_cached)
+
+
+@pytest.mark.skipif(
+    not sgdb_in(["PostgreSQL"]), reason="LISTEN / NOTIFY is PostgreSQL only"
+)
+class TestPostgreSQLNotifyInvalidationTransport:
+    @pytest.fixture(autouse=True)
+    def transact(self, request, registry_method_cached):
+        transaction = registry_method_cached.begin_nested()
+        request.addfinalizer(transaction.rollback)
+
+    @pytest.fixture
+    def transport(self, request, registry_method_cached):
+        transport = PostgreSQLNotifyInvalidationTransport(
+            registry_method_cached
+        )
+        request.addfinalizer(transport.close)
+        return transport
+
+    def notify(self, registry, transport, id_, registry_name, method):
+        with registry.engine.connect() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)").bindparams(
+                    channel=transport.channel,
+                    payload=transport.format_payload(
+                        id_, registry_name, method
+                    ),
+                )
+            )
+            conn.commit()
+
+    def receive(self, transport):
+        for _ in range(20):
+            res = transport.get_invalidation()
+            if res:
+                return res
+
+            sleep(0.1)
+
+        return []  # pragma: no cover
+
+    def test_get_invalidation(self, registry_method_cached, transport):
+        registry = registry_method_cached
+        Cache = registry.System.Cache
+        transport.get_invalidation()
+        id_ = Cache.last_cache_id + 1
+        self.notify(registry, transport, id_, "Model.Test", "method_cached")
+        assert self.receive(transport) == [("Model.Test", "method_cached")]
+        assert Cache.last_cache_id == id_
+
+    def test_read_table_only_when_listen(
+        self, registry_method_cached, transport
+    ):
+        registry = registry_method_cached
+        Cache = registry.System.Cache
+        Cache.last_cache_id = Cache.get_last_id()
+        Cache.insert(registry_name="Model.Test", method="method_cached")
+        assert transport.get_invalidation() == [("Model.Test", "method_cached")]
+        Cache.insert(registry_name="Model.Test", method="method_cached")
+        assert transport.get_invalidation() == []
+
+    def test_listen_again_when_connection_is_lost(
+        self, registry_method_cached, transport
+    ):
+        registry = registry_method_cached
+        Cache = registry.System.Cache
+        Cache.last_cache_id = Cache.get_last_id()
+        transport.get_invalidation()
+        transport.connection.close()
+        Cache.insert(registry_name="Model.Test", method="method_cached")
+        assert transport.get_invalidation() == [("Model.Test", "method_cached")]
+        assert transport.connection is None
+        transport.get_invalidation()
+        assert transport.connection is not None
+
+    def test_close(self, registry_method_cached, transport):
+        transport.get_invalidation()
+        transport.close()
+        assert transport.connection is None
+
+
 class TestSimpleCache:
     @pytest.fixture(autouse=True)
     def close_registry(self, request, bloks_loaded):
@@ -1033,3 +1152,128 @@ class TestSQLModelCache:
         Cache = registry.System.Cache
         Cache.invalidate("Model.Test", "get_id2")
         assert t.get_id2() == 2
+
+
+class TestCacheEngine:
+    @pytest.fixture(autouse=True)
+    def close_registry(self, request, bloks_loaded):
+        def close():
+            self.registry.close()
+
+        request.addfinalizer(close)
+
+    def init_registry(self, *args, **kwargs):
+        self.registry = init_registry(*args, **kwargs)
+        return self.registry
+
+    def add_model_with_method_cached(self, size=128, ttl=None):
+        @register(Model)
+        class Test:
+            @classmethod_cache(size=size, ttl=ttl)
+            def classmethod_cached(cls, value):
+                return [value, random()]
+
+            @cache(size=size, ttl=ttl)
+            def method_cached(self):
+                return random()
+
+    def get_cache(self, registry, method):
+        caches = registry.caches["Model.Test"][method]
+        assert len(caches) == 1
+        return caches[0]
+
+    def test_stats(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        registry.Test.classmethod_cached(1)
+        registry.Test.classmethod_cached(1)
+        registry.Test.classmethod_cached(2)
+        info = registry.caches.stats()["Model.Test"]["classmethod_cached"]
+        assert info.hits == 1
+        assert info.misses == 2
+        assert info.currsize == 2
+        assert info.maxsize == 128
+        assert info.memory > 0
+        assert registry.caches.memory >= info.memory
+
+    def test_reload(self):
+        registry = self.init_registry(None)
+        caches = registry.caches["Model.System.Parameter"]
+        assert len(caches["get_cached_value"]) == 1
+        old_cache = caches["get_cached_value"][0]
+        registry.System.Parameter.get_cached_value("test")
+        registry.reload()
+        caches = registry.caches["Model.System.Parameter"]
+        assert len(caches["get_cached_value"]) == 1
+        assert caches["get_cached_value"][0] is not old_cache
+        assert old_cache.cache_info().currsize == 0
+        stats = registry.caches.stats()["Model.System.Parameter"]
+        assert stats["get_cached_value"].maxsize == 128
+
+    def test_maxsize(self):
+        registry = self.init_registry(self.add_model_with_method_cached, size=2)
+        value = registry.Test.classmethod_cached(1)
+        registry.Test.classmethod_cached(2)
+        registry.Test.classmethod_cached(3)
+        info = self.get_cache(registry, "classmethod_cached").cache_info()
+        assert info.currsize == 2
+        assert info.evictions == 1
+        assert registry.Test.classmethod_cached(1) != value
+
+    def test_ttl(self):
+        registry = self.init_registry(
+            self.add_model_with_method_cached, ttl=0.01
+        )
+        value = registry.Test.classmethod_cached(1)
+        sleep(0.02)
+        assert registry.Test.classmethod_cached(1) != value
+        info = self.get_cache(registry, "classmethod_cached").cache_info()
+        assert info.expirations == 1
+
+    def test_instance_is_weakly_referenced(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        method_cache = self.get_cache(registry, "method_cached")
+        t = registry.Test()
+        assert t.method_cached() == t.method_cached()
+        assert method_cache.cache_info().currsize == 1
+        del t
+        gc.collect()
+        assert method_cache.cache_info().currsize == 0
+        assert method_cache.memory == 0
+
+    def test_cache_clear(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        value = registry.Test.classmethod_cached(1)
+        registry.System.Cache.invalidate("Model.Test", "classmethod_cached")
+        assert self.get_cache(registry, "classmethod_cached").memory == 0
+        assert registry.Test.classmethod_cached(1) != value
+
+    def test_memory_budget(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        method_cache = self.get_cache(registry, "classmethod_cached")
+        registry.Test.classmethod_cached(1)
+        registry.caches.memory_budget = registry.caches.memory
+        registry.Test.classmethod_cached(2)
+        assert registry.caches.memory <= registry.caches.memory_budget
+        assert method_cache.cache_info().evictions >= 1
+
+    def test_memory_with_threads(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        method_cache = self.get_cache(registry, "method_cached")
+        memory = registry.caches.memory
+        instances = [registry.Test() for x in range(50)]
+
+        def call():
+            for instance in instances:
+                instance.method_cached()
+
+        threads = [Thread(target=call) for x in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert method_cache.cache_info().currsize == 50
+        assert registry.caches.memory == memory + method_cache.memory
+        method_cache.cache_clear()
+        assert registry.caches.memory == memory
@@ -14,13 +14,15 @@ import enum
 import time
 from decimal import Decimal as D
 from os import urandom
+from unittest.mock import patch
 from uuid import uuid1
 
 import pytest
 import pytz
 from sqlalchemy import Integer as SA_Integer
-from sqlalchemy import text
-from sqlalchemy.exc import StatementError
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError, StatementError
+from sqlalchemy.orm.attributes import InstrumentedAttribute
 
 from anyblok import Declarations
 from anyblok.column import (
@@ -49,6 +51,7 @@ from anyblok.column import (
     PhoneNumber,
     Selection,
     Sequence,
+    SmallIntSelectionType,
     String,
     Text,
     Time,
@@ -75,7 +78,9 @@ from anyblok.column import (
     model_validator_is_sql,
     model_validator_is_view,
 )
+from anyblok.common import anyblok_column_prefix
 from anyblok.config import Configuration
+from anyblok.declarations import classmethod_cache
 from anyblok.field import FieldException
 from anyblok.mapper import ModelAttribute
 from anyblok.relationship import Many2One
@@ -366,6 +371,19 @@ def column_with_foreign_key_with_diff_schema2():
         test = String(foreign_key=Model.Test.use("name"))
 
 
+def column_with_direct_mapping():
+    @register(Model)
+    class Test:
+        id = Integer(primary_key=True)
+        code = String(unique=True)
+        state = Selection(selections={"draft": "Draft", "done": "Done"})
+        parent = Many2One(
+            model="Model.Test",
+            remote_columns="code",
+            column_names="parent_code",
+        )
+
+
 @pytest.mark.column
 class TestColumns:
     @pytest.fixture(autouse=True)
@@ -403,6 +421,40 @@ class TestColumns:
         ma = ModelAttribute("Model.Test", "col")
         assert ma.get_column_name(registry) == "another_name"
 
+    def test_direct_column_mapping(self):
+        with tmp_configuration(direct_column_mapping=True):
+            registry = self.init_registry(column_with_direct_mapping)
+
+        Test = registry.Test
+        assert isinstance(Test.code, InstrumentedAttribute)
+        assert Test.direct_mapped_columns == ["code"]
+        assert "code" not in Test.get_hybrid_property_columns()
+        assert "state" in Test.get_hybrid_property_columns()
+        assert "parent_code" in Test.get_hybrid_property_columns()
+        assert "id" in Test.get_hybrid_property_columns()
+        parent = Test.insert(code="parent", state="draft")
+        child = Test.insert(code="child", state="done", parent=parent)
+        assert child.parent_code == "parent"
+        assert Test.query().filter(Test.code == "child").one() is child
+        assert Test.query().filter_by(code="child").one() is child
+        assert getattr(child, anyblok_column_prefix + "code") == "child"
+        assert child.to_dict("code", "state") == {
+            "code": "child",
+            "state": "done",
+        }
+        child.code = "other"
+        registry.flush()
+        registry.expire(child, ["code"])
+        assert child.code == "other"
+        assert Test.fields_description("code")["code"]["type"] == "String"
+
+    def test_direct_column_mapping_disabled(self):
+        with tmp_configuration(direct_column_mapping=False):
+            registry = self.init_registry(column_with_direct_mapping)
+
+        assert registry.Test.direct_mapped_columns == []
+        assert "code" in registry.Test.get_hybrid_property_columns()
+
     def test_column_with_foreign_key(self):
         registry = self.init_registry(column_with_foreign_key)
         registry.Test.insert(name="test")
@@ -818,6 +870,158 @@ class TestColumns:
             registry.Test.col.in_(["admin", "regular-user"])
         ).first()
 
+    def test_selection_compiled_once(self):
+        SELECTIONS = [("admin", "Admin"), ("regular-user", "Regular user")]
+
+        registry = self.init_registry(
+            simple_column, ColumnType=Selection, selections=SELECTIONS
+        )
+        test = registry.Test.insert(col=SELECTIONS[0][0])
+        selections = test.col.get_selections()
+        assert dict(selections) == dict(SELECTIONS)
+        with pytest.raises(TypeError):
+            selections["other"] = "Other"
+
+        with patch("anyblok.column.loads") as loads:
+            test.col = SELECTIONS[1][0]
+            assert test.col.label == SELECTIONS[1][1]
+            assert test.col.get_selections() is selections
+
+        loads.assert_not_called()
+
+    def test_selection_use_method_cached(self):
+        SELECTIONS = [("admin", "Admin"), ("regular-user", "Regular user")]
+        calls = []
+
+        def add_selection():
+            @register(Model)
+            class Test:
+                id = Integer(primary_key=True)
+                col = Selection(selections="get_selection")
+
+                @classmethod_cache()
+                def get_selection(cls):
+                    calls.append(1)
+                    return list(SELECTIONS)
+
+        registry = self.init_registry(add_selection)
+        test = registry.Test.insert(col=SELECTIONS[0][0])
+        selections = test.col.get_selections()
+        nb_calls = len(calls)
+        test.col = SELECTIONS[1][0]
+        assert test.col.label == SELECTIONS[1][1]
+        assert test.col.get_selections() is selections
+        assert len(calls) == nb_calls
+        SELECTIONS.append(("other", "Other"))
+        registry.System.Cache.invalidate("Model.Test", "get_selection")
+        test.col = "other"
+        assert test.col.get_selections() is not selections
+        assert test.col.label == "Other"
+
+    def test_selection_smallint(self):
+        SELECTIONS = [("admin", "Admin"), ("regular-user", "Regular user")]
+
+        registry = self.init_registry(
+            simple_column,
+            ColumnType=Selection,
+            selections=SELECTIONS,
+            storage="smallint",
+            codes={"admin": 0, "regular-user": 1},
+        )
+        Test = registry.Test
+        test = Test.insert(col=SELECTIONS[1][0])
+        assert test.col == SELECTIONS[1][0]
+        assert test.col.label == SELECTIONS[1][1]
+        registry.expire_all()
+        assert test.col == SELECTIONS[1][0]
+        assert test.col.label == SELECTIONS[1][1]
+        assert Test.query().filter(Test.col.in_(["regular-user"])).one() is test
+        assert Test.query().filter(Test.col == "admin").count() == 0
+        assert registry.execute(text("select col from test")).scalar() == 1
+        with pytest.raises(FieldException):
+            test.col = "bad value"
+
+    def test_selection_smallint_with_codes(self):
+        SELECTIONS = [("admin", "Admin"), ("regular-user", "Regular user")]
+
+        registry = self.init_registry(
+            simple_column,
+            ColumnType=Selection,
+            selections=SELECTIONS,
+            storage="smallint",
+            codes={"admin": 10, "regular-user": 20},
+        )
+        registry.Test.insert(col=SELECTIONS[0][0])
+        assert registry.execute(text("select col from test")).scalar() == 10
+        assert registry.Test.query().one().col == SELECTIONS[0][0]
+
+    @pytest.mark.skipif(
+        sgdb_in(["MySQL", "MariaDB", "MsSQL"]),
+        reason="No check constraint in MySQL",
+    )
+    def test_selection_smallint_check_constraint(self):
+        SELECTIONS = [("admin", "Admin"), ("regular-user", "Regular user")]
+
+        registry = self.init_registry(
+            simple_column,
+            ColumnType=Selection,
+            selections=SELECTIONS,
+            storage="smallint",
+            codes={"admin": 0, "regular-user": 1},
+        )
+        with pytest.raises(IntegrityError):
+            registry.execute(text("insert into test (col) values (5)"))
+
+    def test_selection_smallint_with_missing_code(self):
+        SELECTIONS = [("admin", "Admin"), ("regular-user", "Regular user")]
+
+        with pytest.raises(FieldException):
+            self.init_registry(
+                simple_column,
+                ColumnType=Selection,
+                selections=SELECTIONS,
+                storage="smallint",
+                codes={"admin": 10},
+            )
+
+    def test_selection_smallint_without_codes(self):
+        with pytest.raises(FieldException):
+            Selection(selections={"admin": "Admin"}, storage="smallint")
+
+        with pytest.raises(FieldException):
+            SmallIntSelectionType({"admin": "Admin"}, 64)
+
+    def test_selection_smallint_use_method(self):
+        SELECTIONS = [("admin", "Admin"), ("regular-user", "Regular user")]
+
+        def add_selection():
+            @register(Model)
+            class Test:
+                id = Integer(primary_key=True)
+                col = Selection(
+                    selections="get_selection",
+                    storage="smallint",
+                    codes={"admin": 1, "regular-user": 2},
+                )
+
+                @classmethod
+                def get_selection(cls):
+                    return SELECTIONS
+
+        registry = self.init_registry(add_selection)
+        test = registry.Test.insert(col=SELECTIONS[1][0])
+        registry.expire_all()
+        assert test.col.label == SELECTIONS[1][1]
+        assert registry.execute(text("select col from test")).scalar() == 2
+
+    def test_selection_unknown_storage(self):
+        with pytest.raises(FieldException):
+            Selection(selections=[("admin", "Admin")], storage="unknown")
+
+    def test_selection_codes_without_storage(self):
+        with pytest.raises(FieldException):
+            Selection(selections=[("admin", "Admin")], codes={"admin": 1})
+
     def test_json_update(self):
         registry = self.init_registry(simple_column, ColumnType=Json)
         test = registry.Test.insert(col={"a": "test"})
@@ -996,6 +1200,57 @@ class TestColumns:
         seq = Seq.query().filter(Seq.code == "SO-NO-GAP").one()
         assert seq.number == 1
 
+    @pytest.mark.skipif(
+        sgdb_in(["MySQL", "MariaDB", "MsSQL"]), reason="ISSUE #89"
+    )
+    def test_sequence_multi_insert(self):
+        registry = self.init_registry(simple_column, ColumnType=Sequence)
+        registry.Test.insert()
+        with patch.object(
+            registry.System.Sequence,
+            "nextvalsBy",
+            wraps=registry.System.Sequence.nextvalsBy,
+        ) as nextvalsBy:
+            tests = registry.Test.multi_insert({}, {"col": "given"}, {})
+            nextvalsBy.assert_called_once_with(2, code="Model.Test=>col")
+
+        assert [x.col for x in tests] == ["2", "given", "3"]
+        assert registry.Test.insert().col == "4"
+
+    @pytest.mark.skipif(
+        sgdb_in(["MySQL", "MariaDB", "MsSQL"]), reason="ISSUE #89"
+    )
+    def test_sequence_bulk_insert(self):
+        registry = self.init_registry(simple_column, ColumnType=Sequence)
+        with patch.object(
+            registry.System.Sequence,
+            "nextvalsBy",
+            wraps=registry.System.Sequence.nextvalsBy,
+        ) as nextvalsBy:
+            registry.Test.multi_insert({}, {}, {}, bulk=True)
+            nextvalsBy.assert_called_once_with(3, code="Model.Test=>col")
+
+        Test = registry.Test
+        tests = Test.query().order_by(Test.col).all()
+        assert [x.col for x in tests] == ["1", "2", "3"]
+
+    def test_sequence_multi_insert_with_nogap(self):
+        registry = self.init_registry(
+            simple_column,
+            ColumnType=Sequence,
+            code="SO-NO-GAP",
+            formater="{code}-{seq:06d}",
+            no_gap=True,
+        )
+        tests = registry.Test.multi_insert({}, {})
+        assert [x.col for x in tests] == [
+            "SO-NO-GAP-000001",
+            "SO-NO-GAP-000002",
+        ]
+        Seq = registry.System.Sequence
+        seq = Seq.query().filter(Seq.code == "SO-NO-GAP").one()
+        assert seq.number == 2
+
     @pytest.mark.skipif(not has_colour, reason="colour is not installed")
     def test_color(self):
         color = "#F5F5F5"
@@ -2193,6 +2448,186 @@ class TestColumnModelReference:
         )
         assert test is test2
 
+    def count_blok_queries(self, registry, func, *args, **kwargs):
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            if "FROM system_blok" in statement:
+                statements.append(statement)
+
+        event.listen(registry.engine, "before_cursor_execute", count_statements)
+        try:
+            res = func(*args, **kwargs)
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", count_statements
+            )
+
+        return res, len(statements)
+
+    def get_values(self, registry):
+        core = {
+            "model": "Model.System.Blok",
+            "primary_keys": {"name": "anyblok-core"},
+        }
+        test = {
+            "model": "Model.System.Blok",
+            "primary_keys": {"name": "anyblok-test"},
+        }
+        return [
+            dict(col=core, col2=core, col3=test),
+            dict(col=core, col2=test, col3=core),
+            dict(col=core, col2=test, col3=test),
+        ]
+
+    def test_from_identity_map(self, registry_modelreference):
+        Blok = registry_modelreference.System.Blok
+        registry_modelreference.expunge_all()
+        assert Blok.from_identity_map(name="anyblok-core") is None
+        blok = Blok.query().filter_by(name="anyblok-core").one()
+        assert Blok.from_identity_map(name="anyblok-core") is blok
+        assert Blok.from_identity_map(name="unexisting") is None
+        assert Blok.from_identity_map(other="anyblok-core") is None
+
+    def test_multi_insert_load_references_by_model(
+        self, registry_modelreference
+    ):
+        registry = registry_modelreference
+        registry.expunge_all()
+        tests, count = self.count_blok_queries(
+            registry, registry.Test.multi_insert, *self.get_values(registry)
+        )
+        assert len(tests) == 3
+        assert count == 1
+        assert tests[1].col2.name == "anyblok-test"
+
+    def test_bulk_insert_load_references_by_model(
+        self, registry_modelreference
+    ):
+        registry = registry_modelreference
+        registry.expunge_all()
+        res, count = self.count_blok_queries(
+            registry, registry.Test.bulk_insert, *self.get_values(registry)
+        )
+        assert res == 3
+        assert count == 1
+
+    def test_bulk_insert_with_unexisting_reference(
+        self, registry_modelreference
+    ):
+        with pytest.raises(FieldException):
+            registry_modelreference.Test.bulk_insert(
+                {
+                    "col2": {
+                        "model": "Model.System.Blok",
+                        "primary_keys": {"name": "unexisting"},
+                    },
+                },
+            )
+
+    def test_load_model_references(self, registry_modelreference):
+        registry = registry_modelreference
+        Test = registry.Test
+        Test.multi_insert(*self.get_values(registry))
+        registry.expunge_all()
+        tests = Test.query().all()
+        references, count = self.count_blok_queries(
+            registry, tests.load_model_references, "col2", "col3"
+        )
+        assert count == 1
+        assert sorted(x.name for x in references) == [
+            "anyblok-core",
+            "anyblok-test",
+        ]
+
+        def get_references():
+            return [(test.col2.name, test.col3.name) for test in tests]
+
+        res, count = self.count_blok_queries(registry, get_references)
+        assert count == 0
+        assert sorted(res) == [
+            ("anyblok-core", "anyblok-test"),
+            ("anyblok-test", "anyblok-core"),
+            ("anyblok-test", "anyblok-test"),
+        ]
+
+    def test_load_model_references_all_columns(self, registry_modelreference):
+        registry = registry_modelreference
+        Test = registry.Test
+        Test.multi_insert(*self.get_values(registry))
+        registry.expunge_all()
+        tests = Test.query().all()
+        references, count = self.count_blok_queries(
+            registry, tests.load_model_references
+        )
+        assert count == 1
+        assert len(references) == 2
+
+    def test_load_model_references_without_entry(self, registry_modelreference):
+        tests = registry_modelreference.Test.query().all()
+        assert tests.load_model_references() == []
+
+
+def add_modelreference_with_index_in_registry():
+    @register(Model)
+    class Test:
+        id = Integer(primary_key=True)
+        col = ModelReference(index=True, index_primary_keys=["name"])
+
+
+@pytest.fixture(scope="class")
+def registry_modelreference_with_index(request, bloks_loaded):
+    reset_db()
+    registry = init_registry(add_modelreference_with_index_in_registry)
+    request.addfinalizer(registry.close)
+    return registry
+
+
+@pytest.mark.skipif(
+    sgdb_in(["MySQL", "MariaDB", "MsSQL"]),
+    reason="No index on the JSON expressions",
+)
+class TestColumnModelReferenceWithIndex:
+    @pytest.fixture(autouse=True)
+    def transact(self, request, registry_modelreference_with_index):
+        transaction = registry_modelreference_with_index.begin_nested()
+        request.addfinalizer(transaction.rollback)
+        return
+
+    def test_index(self, registry_modelreference_with_index):
+        Test = registry_modelreference_with_index.Test
+        indexes = {index.name: index for index in Test.__table__.indexes}
+        assert "anyblok_ix_test__col_references" in indexes
+        index = indexes["anyblok_ix_test__col_references"]
+        assert len(index.expressions) == 2
+
+    def test_filter_use_index(self, registry_modelreference_with_index):
+        registry = registry_modelreference_with_index
+        Test = registry.Test
+        blok = registry.System.Blok.query().filter_by(name="anyblok-core").one()
+        test = Test.insert(col=blok)
+        assert Test.query().filter(Test.col.is_(blok)).one() is test
+        assert (
+            Test.query()
+            .filter(Test.col.with_models(registry.System.Blok))
+            .one()
+            is test
+        )
+        if not sgdb_in(["PostgreSQL"]):
+            return
+
+        registry.execute(text("SET LOCAL enable_seqscan = off"))
+        query = Test.query("id").filter(Test.col.is_(blok)).sql_statement
+        plan = registry.execute(
+            text(
+                "EXPLAIN %s"
+                % query.compile(
+                    registry.engine, compile_kwargs={"literal_binds": True}
+                )
+            )
+        ).scalars()
+        assert "anyblok_ix_test__col_references" in "\n".join(plan)
+
 
 class TestColumnsAutoDoc:
     def call_autodoc(self, column, **kwargs):
@@ -7,11 +7,12 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 import pytest
+from sqlalchemy import event, text
 from sqlalchemy.orm.exc import NoResultFound
 
 from anyblok.bloks.anyblok_core.exceptions import SqlBaseException
-from anyblok.column import Integer, Selection, String
-from anyblok.declarations import Declarations
+from anyblok.column import Integer, Password, Selection, String
+from anyblok.declarations import Declarations, classmethod_cache
 from anyblok.relationship import Many2Many, Many2One, One2Many, One2One
 
 from .conftest import init_registry
@@ -94,6 +95,39 @@ class TestCoreSQLBase:
                 == 1
             )
 
+    def test_dictall_read_the_rows(self, registry_declare_model):
+        registry = registry_declare_model
+        Test = registry.Test
+        rows = Test.bulk_insert(
+            {"id2": 1}, {"id2": 2, "select": "key2"}, returning=["id", "id2"]
+        )
+        ids = {row.id2: row.id for row in rows}
+        nb_instances = len(registry.session.identity_map)
+        assert Test.query().order_by(Test.id2).dictall() == [
+            {"id": ids[1], "id2": 1, "select": "key"},
+            {"id": ids[2], "id2": 2, "select": "key2"},
+        ]
+        assert len(registry.session.identity_map) == nb_instances
+        assert Test.query().order_by(Test.id2).dictall() == [
+            t.to_dict() for t in Test.query().order_by(Test.id2)
+        ]
+
+    def test_to_dict_plan(self, registry_declare_model):
+        Test = registry_declare_model.Test
+        plan = Test.get_to_dict_plan()
+        assert sorted(field.name for field in plan) == ["id", "id2", "select"]
+        assert all(field.relationship is None for field in plan)
+        assert Test.get_to_dict_plan("id2") == (
+            (
+                "id2",
+                Test.ANYBLOK_FIELD_id2,
+                plan[[f.name for f in plan].index("id2")].getter_format_value,
+                None,
+                None,
+            ),
+        )
+        assert Test.get_to_dict_plan("id2") is Test.get_to_dict_plan("id2")
+
     def test_classmethod_delete(self, registry_declare_model):
         registry = registry_declare_model
         nb_value = 3
@@ -235,6 +269,216 @@ class TestCoreSQLBase:
         assert subquery.c.keys() == ["id2"]
 
 
+def declare_model_with_to_dict():
+    from anyblok import Declarations
+
+    Model = Declarations.Model
+
+    @Declarations.register(Model)
+    class Test:
+        id = Integer(primary_key=True)
+        name = String()
+
+        def to_dict(self, *fields):
+            res = super(Test, self).to_dict(*fields)
+            res["label"] = "Label of %s" % self.name
+            return res
+
+
+@pytest.fixture(scope="class")
+def registry_declare_model_with_to_dict(request, bloks_loaded):
+    registry = init_registry(declare_model_with_to_dict)
+    request.addfinalizer(registry.close)
+    return registry
+
+
+class TestCoreSQLBaseOverriddenToDict:
+    @pytest.fixture(autouse=True)
+    def transact(self, request, registry_declare_model_with_to_dict):
+        transaction = registry_declare_model_with_to_dict.begin_nested()
+        request.addfinalizer(transaction.rollback)
+        return
+
+    def test_dictall_call_to_dict(self, registry_declare_model_with_to_dict):
+        Test = registry_declare_model_with_to_dict.Test
+        t1 = Test.insert(name="t1")
+        expected = {"id": t1.id, "name": "t1", "label": "Label of t1"}
+        assert t1.to_dict() == expected
+        assert Test.query().dictall() == [expected]
+        assert Test.query().dictone() == expected
+
+
+def declare_model_for_bulk_insert():
+    from anyblok import Declarations
+
+    Model = Declarations.Model
+
+    @Declarations.register(Model)
+    class Test:
+        id = Integer(primary_key=True)
+        id2 = Integer(default=3)
+        select = Selection(
+            selections=[("key", "value"), ("key2", "value2")], default="key"
+        )
+        secret = String(encrypt_key="secretkey")
+        password = Password(crypt_context={"schemes": ["md5_crypt"]})
+
+        @classmethod_cache()
+        def count_entries(cls):
+            return cls.query().count()
+
+
+@pytest.fixture(scope="class")
+def registry_declare_model_for_bulk_insert(request, bloks_loaded):
+    registry = init_registry(declare_model_for_bulk_insert)
+    request.addfinalizer(registry.close)
+    return registry
+
+
+class TestCoreSQLBaseBulkInsert:
+    @pytest.fixture(autouse=True)
+    def transact(self, request, registry_declare_model_for_bulk_insert):
+        transaction = registry_declare_model_for_bulk_insert.begin_nested()
+        request.addfinalizer(transaction.rollback)
+        return
+
+    def test_bulk_insert(self, registry_declare_model_for_bulk_insert):
+        Test = registry_declare_model_for_bulk_insert.Test
+        assert Test.bulk_insert(*[{"id2": x} for x in range(3)]) == 3
+        assert Test.query().count() == 3
+        assert sorted(Test.query("id2").all()) == [(0,), (1,), (2,)]
+
+    def test_bulk_insert_without_entry(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        Test = registry_declare_model_for_bulk_insert.Test
+        assert Test.bulk_insert() == 0
+        assert Test.bulk_insert(returning=True) == []
+
+    def test_bulk_insert_with_one_statement(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        registry = registry_declare_model_for_bulk_insert
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            if statement.startswith("INSERT INTO test "):
+                statements.append(statement)
+
+        event.listen(registry.engine, "before_cursor_execute", count_statements)
+        try:
+            registry.Test.bulk_insert(*[{"id2": x} for x in range(10)])
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", count_statements
+            )
+
+        assert len(statements) == 1
+
+    def test_bulk_insert_default_value(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        Test = registry_declare_model_for_bulk_insert.Test
+        Test.bulk_insert({})
+        test = Test.query().one()
+        assert test.id2 == 3
+        assert test.select == "key"
+
+    def test_bulk_insert_returning_primary_keys(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        Test = registry_declare_model_for_bulk_insert.Test
+        rows = Test.bulk_insert({"id2": 1}, {"id2": 2}, returning=True)
+        assert len(rows) == 2
+        assert sorted(row.id for row in rows) == sorted(
+            Test.query("id").all().id
+        )
+
+    def test_bulk_insert_returning_fields(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        Test = registry_declare_model_for_bulk_insert.Test
+        rows = Test.bulk_insert(
+            {"id2": 1}, {"select": "key2"}, returning=["id2", "select"]
+        )
+        assert sorted((row.id2, row.select) for row in rows) == [
+            (1, "key"),
+            (3, "key2"),
+        ]
+
+    def test_multi_insert_with_bulk(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        Test = registry_declare_model_for_bulk_insert.Test
+        rows = Test.multi_insert({"id2": 1}, bulk=True, returning=True)
+        assert Test.from_primary_keys(id=rows[0].id).id2 == 1
+
+    def test_bulk_insert_setter_format_value(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        registry = registry_declare_model_for_bulk_insert
+        Test = registry.Test
+        Test.bulk_insert({"password": "pwd"})
+        test = Test.query().one()
+        assert test.password == "pwd"
+        assert test.password != "other"
+        assert registry.execute(
+            text("select password from test")
+        ).scalar() not in ("pwd", None)
+
+    def test_bulk_insert_encrypt_key(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        registry = registry_declare_model_for_bulk_insert
+        Test = registry.Test
+        Test.bulk_insert({"secret": "value"})
+        assert Test.query().one().secret == "value"
+        assert (
+            registry.execute(text("select secret from test")).scalar()
+            != "value"
+        )
+
+    def test_bulk_insert_wrong_entry(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        Test = registry_declare_model_for_bulk_insert.Test
+        with pytest.raises(SqlBaseException):
+            Test.bulk_insert(["id2", 1])
+
+    def test_bulk_insert_use_default_filter_on_sql_statement(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        Test = registry_declare_model_for_bulk_insert.Test
+        statements = []
+        default_filter_on_sql_statement = Test.default_filter_on_sql_statement
+
+        def filter_on_sql_statement(statement):
+            statements.append(statement)
+            return default_filter_on_sql_statement(statement)
+
+        Test.default_filter_on_sql_statement = filter_on_sql_statement
+        try:
+            Test.bulk_insert({"id2": 1})
+        finally:
+            del Test.default_filter_on_sql_statement
+
+        assert len(statements) == 1
+        assert statements[0].is_insert
+
+    def test_bulk_insert_invalidate_the_cached_methods(
+        self, registry_declare_model_for_bulk_insert
+    ):
+        registry = registry_declare_model_for_bulk_insert
+        Test = registry.Test
+        Cache = registry.System.Cache
+        last_id = Cache.get_last_id()
+        assert Test.count_entries() == 0
+        Test.bulk_insert({"id2": 1})
+        assert Test.count_entries() == 1
+        query = Cache.query().filter(Cache.id > last_id)
+        assert [x.method for x in query.all()] == ["count_entries"]
+
+
 def declare_model_with_m2o():
     @register(Model)
     class Test:
@@ -272,6 +516,13 @@ class TestCoreSQLBaseM2O:
         t2.delete()
         assert len(t1.test2) == 0
 
+    def test_bulk_insert_many2one_column(self, registry_declare_model_with_m2o):
+        registry = registry_declare_model_with_m2o
+        t1 = registry.Test.insert(name="t1")
+        registry.Test2.bulk_insert({"name": "t2", "test_id": t1.id})
+        t2 = registry.Test2.query().filter_by(name="t2").one()
+        assert t2.test is t1
+
     def test_with_subquery_1(self, registry_declare_model_with_m2o):
         registry = registry_declare_model_with_m2o
         Test2 = registry.Test2
@@ -381,6 +632,43 @@ class TestCoreSQLBaseM2O:
             ],
         }
 
+    def test_to_dict_with_list(self, registry_declare_model_with_m2o):
+        registry = registry_declare_model_with_m2o
+        t1 = registry.Test.insert(name="t1")
+        t2 = registry.Test2.insert(name="t2", test=t1)
+        assert t1.to_dict("name", ["test2", ["name", ["test", ["name"]]]]) == {
+            "name": "t1",
+            "test2": [{"name": "t2", "test": {"name": "t1"}}],
+        }
+        assert t2.to_dict(*["name", "test"]) == {
+            "name": "t2",
+            "test": {"id": t1.id},
+        }
+
+    def test_to_dict_plan_with_relationship(
+        self, registry_declare_model_with_m2o
+    ):
+        registry = registry_declare_model_with_m2o
+        plan = registry.Test2.get_to_dict_plan("name", ("test", ("name",)))
+        assert plan[0].name == "name"
+        assert plan[0].column is not None
+        assert plan[0].relationship is None
+        assert plan[1].name == "test"
+        assert plan[1].column is None
+        assert plan[1].relationship.uselist is False
+        assert plan[1].related_fields == ("name",)
+        plan = registry.Test.get_to_dict_plan("test2")
+        assert plan[0].relationship.uselist is True
+        assert plan[0].related_fields == ("id",)
+
+    def test_dictall_with_relationship(self, registry_declare_model_with_m2o):
+        registry = registry_declare_model_with_m2o
+        t1 = registry.Test.insert(name="t1")
+        t2 = registry.Test2.insert(name="t2", test=t1)
+        assert registry.Test2.query().filter_by(id=t2.id).dictall() == [
+            {"id": t2.id, "name": "t2", "test_id": t1.id, "test": {"id": t1.id}}
+        ]
+
     def test_bad_definition_of_relation(self, registry_declare_model_with_m2o):
         registry = registry_declare_model_with_m2o
         t1 = registry.Test.insert(name="t1")
@@ -437,6 +725,49 @@ class TestCoreSQLBaseM2O:
         assert t2.test_id == t3.id
         assert t3.test2 == [t2]
 
+    def test_refresh_update_m2o_without_query(
+        self, registry_declare_model_with_m2o
+    ):
+        registry = registry_declare_model_with_m2o
+        t1 = registry.Test.insert(name="t1")
+        t2 = registry.Test2.insert(name="t2", test=t1)
+        t3 = registry.Test.insert(name="t3")
+        registry.flush()
+        assert t1.test2 == [t2]
+        registry.expire(t2, ["test"])
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(registry.engine, "before_cursor_execute", count_statements)
+        try:
+            t2.test_id = t3.id
+        finally:
+            event.remove(
+                registry.engine, "before_cursor_execute", count_statements
+            )
+
+        assert statements == []
+        assert t1.test2 == []
+        assert t2.test is t3
+        assert t3.test2 == [t2]
+
+    def test_refresh_update_m2o_with_expired_foreign_key(
+        self, registry_declare_model_with_m2o
+    ):
+        registry = registry_declare_model_with_m2o
+        t1 = registry.Test.insert(name="t1")
+        t2 = registry.Test2.insert(name="t2", test=t1)
+        t3 = registry.Test.insert(name="t3")
+        registry.flush()
+        assert t1.test2 == [t2]
+        registry.expire(t2)
+        t2.test_id = t3.id
+        assert t1.test2 == []
+        assert t2.test is t3
+        assert t3.test2 == [t2]
+
     def test_refresh_update_m2o_3(self, registry_declare_model_with_m2o):
         registry = registry_declare_model_with_m2o
         t1 = registry.Test.insert(name="t1")
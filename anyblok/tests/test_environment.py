@@ -5,9 +5,15 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from asyncio import create_task, current_task, run
+from gc import collect
+from threading import Thread, current_thread
+from weakref import ref
+
 import pytest
 
 from anyblok.environment import (
+    ContextVarEnvironment,
     EnvironmentException,
     EnvironmentManager,
     ThreadEnvironment,
@@ -152,3 +158,178 @@ class TestThreadEnvironment:
 
     def test_scoped_function_session(self):
         assert EnvironmentManager.scoped_function_for_session() is None
+
+    def test_scoped_registry_session(self):
+        assert EnvironmentManager.scoped_registry_for_session(object) is None
+
+    def test_isolated_by_thread(self):
+        EnvironmentManager.set("db_name", "main")
+        values = []
+
+        def in_thread():
+            values.append(EnvironmentManager.get("db_name"))
+            EnvironmentManager.set("db_name", "thread")
+
+        thread = Thread(target=in_thread)
+        thread.start()
+        thread.join()
+        assert values == [None]
+        assert EnvironmentManager.get("db_name") == "main"
+
+    def test_values_released_with_the_thread(self):
+        class Value:
+            pass
+
+        references = []
+
+        def in_thread():
+            value = Value()
+            references.append(ref(value))
+            EnvironmentManager.set("value", value)
+
+        thread = Thread(target=in_thread)
+        thread.start()
+        thread.join()
+        del thread
+        collect()
+        assert references[0]() is None
+
+    def test_values_as_dict(self):
+        EnvironmentManager.set("db_name", "main")
+        values = ThreadEnvironment.values
+        assert values["db_name"] == "main"
+        assert "db_name" in values
+        assert values.get("unknown", "default") == "default"
+        keys = []
+
+        def in_thread():
+            keys.extend(values)
+
+        thread = Thread(target=in_thread)
+        thread.start()
+        thread.join()
+        assert keys == []
+
+
+class TestContextVarEnvironment:
+    @pytest.fixture(autouse=True)
+    def define_environment(self, request):
+        EnvironmentManager.define_environment_cls(ContextVarEnvironment)
+        request.addfinalizer(
+            lambda: EnvironmentManager.define_environment_cls(ThreadEnvironment)
+        )
+
+    def test_set_and_get_variable(self):
+        EnvironmentManager.set("db_name", "test db name")
+        assert EnvironmentManager.get("db_name") == "test db name"
+        assert EnvironmentManager.get("other", "default") == "default"
+
+    def test_isolated_by_thread(self):
+        EnvironmentManager.set("db_name", "main")
+        values = []
+
+        def in_thread():
+            values.append(EnvironmentManager.get("db_name"))
+            EnvironmentManager.set("db_name", "thread")
+
+        thread = Thread(target=in_thread)
+        thread.start()
+        thread.join()
+        assert values == [None]
+        assert EnvironmentManager.get("db_name") == "main"
+
+    def test_isolated_by_task(self):
+        async def in_task():
+            value = EnvironmentManager.get("db_name")
+            EnvironmentManager.set("db_name", "task")
+            return value
+
+        async def main():
+            EnvironmentManager.set("db_name", "main")
+            value = await create_task(in_task())
+            return value, EnvironmentManager.get("db_name")
+
+        assert run(main()) == ("main", "main")
+
+    def test_scoped_function_session(self):
+        scoped_function = EnvironmentManager.scoped_function_for_session()
+        assert scoped_function() is current_thread()
+
+        async def main():
+            return scoped_function() is current_task()
+
+        assert run(main()) is True
+
+    def test_scoped_registry_session(self):
+        class Session:
+            pass
+
+        scoped_registry = EnvironmentManager.scoped_registry_for_session(
+            Session
+        )
+        assert not scoped_registry.has()
+        session = scoped_registry()
+        assert scoped_registry.has()
+        assert scoped_registry() is session
+        scoped_registry.clear()
+        assert not scoped_registry.has()
+        scoped_registry.set(session)
+        assert scoped_registry() is session
+
+    def test_scoped_registry_session_by_task(self):
+        class Session:
+            pass
+
+        scoped_registry = EnvironmentManager.scoped_registry_for_session(
+            Session
+        )
+
+        async def in_task():
+            return scoped_registry()
+
+        async def main():
+            session = scoped_registry()
+            child_session = await create_task(in_task())
+            return session, child_session, scoped_registry()
+
+        session, child_session, session_after = run(main())
+        assert session is not child_session
+        assert session is session_after
+
+    def test_scoped_registry_session_released_with_the_task(self):
+        class Session:
+            pass
+
+        scoped_registry = EnvironmentManager.scoped_registry_for_session(
+            Session
+        )
+        references = []
+
+        async def in_task():
+            references.append(ref(scoped_registry()))
+
+        async def main():
+            await create_task(in_task())
+
+        run(main())
+        collect()
+        assert references[0]() is None
+
+    def test_scoped_registry_session_released_with_the_thread(self):
+        class Session:
+            pass
+
+        scoped_registry = EnvironmentManager.scoped_registry_for_session(
+            Session
+        )
+        references = []
+
+        def in_thread():
+            references.append(ref(scoped_registry()))
+
+        thread = Thread(target=in_thread)
+        thread.start()
+        thread.join()
+        del thread
+        collect()
+        assert references[0]() is None
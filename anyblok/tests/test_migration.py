@@ -9,6 +9,8 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 from contextlib import contextmanager
+from hashlib import md5
+from types import SimpleNamespace
 
 import pytest
 from mock import patch
@@ -20,24 +22,31 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     MetaData,
+    SmallInteger,
     String,
     Table,
+    inspect,
     text,
 )
 from sqlalchemy.dialects.mssql.base import BIT
 from sqlalchemy.dialects.mysql.types import DATETIME, TINYINT
+from sqlalchemy.engine.reflection import Inspector
 from sqlalchemy.exc import IntegrityError
 
 from anyblok import Declarations
 from anyblok.column import Integer as Int
+from anyblok.column import ModelReference, SmallIntSelectionType
 from anyblok.column import String as Str
 from anyblok.common import naming_convention
 from anyblok.config import Configuration, get_url
 from anyblok.migration import (
+    MigrationColumn,
     MigrationColumnTypePlugin,
     MigrationException,
     MigrationReport,
 )
+from anyblok.plugins import StringToSmallIntSelection
+from anyblok.registry import RegistryManager
 from anyblok.relationship import Many2Many
 from anyblok.testing import sgdb_in
 
@@ -122,6 +131,11 @@ def add_in_registry():
                     ),
                 )
 
+        @register(Model)
+        class TestModelRef:
+            integer = Int(primary_key=True)
+            ref = ModelReference(index=True, index_primary_keys=["integer"])
+
     @register(Model)
     class TestFKTarget:
         integer = Int(primary_key=True)
@@ -180,6 +194,7 @@ def registry(request, clean_db, bloks_loaded):
             "testcheck",
             "testchecklongconstraintname",
             "testindex",
+            "testmodelref",
         ):
             try:
                 registry.migration.table(table).drop()
@@ -306,6 +321,27 @@ class TestMigration:
         ][0][0]
         assert res == 0
 
+    @pytest.mark.skipif(sgdb_in(["MsSQL"]), reason="Not rollback to savepoint")
+    def test_add_column_in_filled_table_with_default_callable_by_batch(
+        self, registry
+    ):
+        self.fill_test_table(registry, namespace="Model.Test2PKs")
+        t = registry.migration.table("test2pks")
+        values = iter(range(100))
+
+        def default_method():
+            return next(values)
+
+        with patch.object(MigrationColumn, "default_value_batch_size", 3):
+            t.column().add(
+                Column("new_column", Integer, default=default_method)
+            )
+
+        res = registry.execute(
+            text("select new_column from test2pks order by new_column")
+        ).fetchall()
+        assert [x[0] for x in res] == list(range(10))
+
     @pytest.mark.skipif(
         sgdb_in(["MsSQL"]), reason="Can't change server default"
     )
@@ -458,6 +494,98 @@ class TestMigration:
         report = registry.migration.detect_changed()
         assert not report.log_has("Add test.other")
 
+    def test_detect_constraints_with_multi_reflection(self, registry):
+        migration = registry.migration
+        inspector = inspect(migration.conn)
+        with patch.object(Inspector, "get_pk_constraint") as get_pk:
+            with patch.object(Inspector, "get_check_constraints") as get_ck:
+                diff = migration.detect_undetected_constraint_from_alembic(
+                    inspector
+                )
+
+        assert diff == []
+        get_pk.assert_not_called()
+        get_ck.assert_not_called()
+
+    def test_get_reflected_tables(self, registry):
+        migration = registry.migration
+        inspector = inspect(migration.conn)
+        reflected_tables = migration.get_reflected_tables(
+            inspector, "pk_constraint"
+        )
+        tables = {x[1]: (x[2], x[3]) for x in reflected_tables}
+        assert tables["test"][0] is registry.Test.__table__
+        assert tables["test"][1]["constrained_columns"] == ["integer"]
+
+    def test_get_reflected_tables_filter_the_names(self, registry):
+        migration = registry.migration
+        inspector = inspect(migration.conn)
+        with patch.object(
+            inspector,
+            "get_multi_pk_constraint",
+            wraps=inspector.get_multi_pk_constraint,
+        ) as get_multi_pk_constraint:
+            migration.get_reflected_tables(inspector, "pk_constraint")
+
+        assert get_multi_pk_constraint.call_args_list
+        for call in get_multi_pk_constraint.call_args_list:
+            schema = call.kwargs["schema"]
+            assert sorted(call.kwargs["filter_names"]) == sorted(
+                table.name
+                for table in migration.metadata.tables.values()
+                if table.schema == schema
+            )
+
+    def test_detect_changed_with_tables_scope(self, registry):
+        with cnx(registry) as conn:
+            registry.Test.__table__.drop(bind=conn)
+            registry.Test.__table__ = Table(
+                "test", MetaData(), Column("integer", Integer, primary_key=True)
+            )
+            registry.Test.__table__.create(bind=conn)
+            Table(
+                "test2",
+                MetaData(),
+                Column("integer", Integer, primary_key=True),
+            ).create(bind=conn)
+
+        registry.migration.tables_scope = {"testunique"}
+        report = registry.migration.detect_changed()
+        assert not report.log_has("Add test.other")
+        assert not report.log_has("Drop Table test2")
+        registry.migration.tables_scope = {"test"}
+        report = registry.migration.detect_changed()
+        assert report.log_has("Add test.other")
+        assert not report.log_has("Drop Table test2")
+        registry.migration.tables_scope = set()
+        report = registry.migration.detect_changed()
+        assert report.diffs == []
+
+    def get_migration_scope(self, registry, *namespaces):
+        declarations = {"registry_names": list(namespaces)}
+        for namespace in namespaces:
+            declarations[namespace] = {
+                "bases": registry.loaded_registries[namespace]["bases"],
+                "properties": {},
+            }
+
+        loaded_blok = RegistryManager.loaded_bloks["anyblok-test"]
+        with patch.dict(loaded_blok["Model"], declarations):
+            return registry.get_migration_scope(["anyblok-test"])
+
+    def test_get_migration_scope(self, registry):
+        scope = self.get_migration_scope(registry, "Model.Test")
+        assert scope == {"test"}
+
+    def test_get_migration_scope_with_foreign_keys(self, registry):
+        scope = self.get_migration_scope(registry, "Model.TestFKTarget")
+        assert scope == {"testfktarget", "testfk", "testfk2"}
+        scope = self.get_migration_scope(registry, "Model.TestM2M1")
+        assert scope == {"testm2m1", "reltable"}
+
+    def test_get_migration_scope_with_core(self, registry):
+        assert registry.get_migration_scope(["anyblok-core"]) is None
+
     def test_detect_table_removed(self, registry):
         with cnx(registry) as conn:
             Table(
@@ -715,6 +843,37 @@ class TestMigration:
         report = registry.migration.detect_changed()
         assert not (report.log_has("Drop index other_idx on test"))
 
+    @pytest.mark.skipif(
+        sgdb_in(["MySQL", "MariaDB", "MsSQL"]),
+        reason="No index on the JSON expressions",
+    )
+    def test_detect_add_model_reference_index(self, registry):
+        def get_logs(report):
+            return [
+                log
+                for log in report.logs
+                if log.startswith("Add index constraint on testmodelref")
+            ]
+
+        with cnx(registry) as conn:
+            conn.execute(
+                text("DROP INDEX anyblok_ix_testmodelref__ref_references")
+            )
+
+        report = registry.migration.detect_changed()
+        assert len(get_logs(report)) == 1
+        report.apply_change()
+        report = registry.migration.detect_changed()
+        assert not get_logs(report)
+
+    @pytest.mark.skipif(
+        sgdb_in(["MySQL", "MariaDB", "MsSQL"]),
+        reason="No index on the JSON expressions",
+    )
+    def test_detect_model_reference_index_without_change(self, registry):
+        report = registry.migration.detect_changed()
+        assert not [log for log in report.logs if "testmodelref" in log]
+
     def test_detect_type(self, registry):
         with cnx(registry) as conn:
             registry.Test.__table__.drop(bind=conn)
@@ -1331,3 +1490,137 @@ class TestMigrationPlugin:
                 [None, None, "test", "other", {}, Integer(), String()]
             )
             mockapply.assert_called()
+
+    def test_get_plugin_for_selection_smallint(self, registry_plugin):
+        report = MigrationReport(registry_plugin.migration, [])
+        newvalue = SmallIntSelectionType(
+            {"draft": "Draft"}, 64, codes={"draft": 1}
+        )
+        plugin = report.get_plugin_for(String(), newvalue)
+        assert isinstance(plugin, StringToSmallIntSelection)
+        assert plugin.to_value is newvalue
+
+    def test_alter_column_string_to_selection_smallint(self, registry_plugin):
+        with cnx(registry_plugin) as conn:
+            conn.execute(
+                text("insert into test (integer, other) values (1, 'done')")
+            )
+            conn.execute(
+                text("insert into test (integer, other) values (2, 'draft')")
+            )
+
+        ck_name = (
+            "anyblok_ck_test__other_"
+            + md5(str(sorted(["done", "draft"])).encode("utf-8")).hexdigest()
+            + "_types"
+        )
+        if not sgdb_in(["MySQL", "MariaDB", "MsSQL"]):
+            table = registry_plugin.migration.table("test")
+            table.check(ck_name).add("other in ('draft', 'done')")
+            table.check("ck_integer").add("integer > 0")
+
+        report = MigrationReport(registry_plugin.migration, [])
+        newvalue = SmallIntSelectionType(
+            {"draft": "Draft", "done": "Done"},
+            64,
+            codes={"draft": 1, "done": 2},
+        )
+        report.apply_change_modify_type(
+            [None, None, "test", "other", {}, String(), newvalue]
+        )
+        with cnx(registry_plugin) as conn:
+            res = conn.execute(
+                text("select integer, other from test order by integer")
+            ).fetchall()
+
+        assert [tuple(x) for x in res] == [(1, 2), (2, 1)]
+        inspector = inspect(registry_plugin.migration.conn)
+        column = [
+            x for x in inspector.get_columns("test") if x["name"] == "other"
+        ]
+        assert isinstance(column[0]["type"], SmallInteger)
+        if not sgdb_in(["MySQL", "MariaDB", "MsSQL"]):
+            assert [
+                x["name"] for x in inspector.get_check_constraints("test")
+            ] == ["ck_integer"]
+
+    def test_is_selection_check_constraint(self, registry_plugin):
+        plugin = StringToSmallIntSelection()
+        column = registry_plugin.migration.table("test").column("other")
+        name = (
+            "anyblok_ck_test__other_"
+            + md5(b"['done', 'draft']").hexdigest()
+            + "_types"
+        )
+        assert plugin.is_selection_check_constraint(name, column)
+        assert not plugin.is_selection_check_constraint("ck_other", column)
+        assert not plugin.is_selection_check_constraint(
+            name.replace("__other_", "__integer_"), column
+        )
+
+    def test_is_selection_check_constraint_truncated(self, registry_plugin):
+        plugin = StringToSmallIntSelection()
+        table = registry_plugin.migration.table("test")
+        column = SimpleNamespace(name="other" * 10, table=table)
+        dialect = registry_plugin.migration.conn.dialect
+        max_length = (
+            dialect.max_constraint_name_length or dialect.max_identifier_length
+        )
+
+        def truncate(column_name):
+            name = (
+                "anyblok_ck_test__%s_" % column_name
+                + md5(b"['done', 'draft']").hexdigest()
+                + "_types"
+            )
+            assert len(name) > max_length
+            return (
+                name[: max_length - 8]
+                + "_"
+                + md5(name.encode("utf-8")).hexdigest()[-4:]
+            )
+
+        assert plugin.is_selection_check_constraint(
+            truncate(column.name), column
+        )
+        assert not plugin.is_selection_check_constraint(
+            truncate("integer" * 10), column
+        )
+
+    def test_apply_change_remove_ck_first(self, registry_plugin):
+        calls = []
+        report = MigrationReport(registry_plugin.migration, [])
+        report.actions = [
+            ("modify_type", None, "test", "other", {}, String(), Integer()),
+            ("remove_ck", "test", {"name": "ck_other", "schema": None}),
+        ]
+        with patch.object(
+            report, "apply_change_modify_type", lambda x: calls.append(x[0])
+        ), patch.object(
+            report, "apply_change_remove_ck", lambda x: calls.append(x[0])
+        ):
+            report.apply_change()
+
+        assert calls == ["remove_ck", "modify_type"]
+
+    def test_apply_change_remove_ck_of_other_table_keep_order(
+        self, registry_plugin
+    ):
+        calls = []
+        report = MigrationReport(registry_plugin.migration, [])
+        report.actions = [
+            ("modify_type", None, "test", "other", {}, String(), Integer()),
+            ("remove_ck", "test2", {"name": "ck_other", "schema": None}),
+        ]
+        with patch.object(
+            report,
+            "apply_change_modify_type",
+            lambda x: calls.append((x[0], x[2])),
+        ), patch.object(
+            report,
+            "apply_change_remove_ck",
+            lambda x: calls.append((x[0], x[1])),
+        ):
+            report.apply_change()
+
+        assert calls == [("modify_type", "test"), ("remove_ck", "test2")]
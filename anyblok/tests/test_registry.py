@@ -12,17 +12,23 @@ from logging import ERROR
 from threading import Thread
 
 import pytest
+from sqlalchemy import Sequence, event, func, select
 
 from anyblok import start
 from anyblok.blok import Blok, BlokManager
 from anyblok.column import Integer
-from anyblok.config import Configuration
+from anyblok.config import Configuration, get_url
 from anyblok.environment import EnvironmentManager
 from anyblok.registry import (
+    MIGRATION_SNAPSHOT_PARAMETER,
+    HookBatch,
+    HookQueue,
     Registry,
     RegistryException,
     RegistryManager,
     RegistryManagerException,
+    clean_ro_session_info,
+    get_hook_queue,
 )
 from anyblok.testing import LogCapture, TestCase
 
@@ -767,6 +773,91 @@ class TestRegistry2:
             "_precommit_hook1",
         ]
 
+    def test_precommit_hook_batch(self):
+        calls = []
+
+        def add_in_registry():
+            from anyblok import Declarations
+
+            @Declarations.register(Declarations.Model)
+            class Test:
+                @classmethod
+                def _precommit_hook(cls, ids, names, flag=False):
+                    calls.append((ids, names, flag))
+
+        registry = self.init_registry(add_in_registry)
+        registry.Test.precommit_hook("_precommit_hook", 1, "a", batch=True)
+        registry.Test.precommit_hook("_precommit_hook", 2, "b", batch=True)
+        registry.Test.precommit_hook("_precommit_hook", 1, "a", batch=True)
+        registry.Test.precommit_hook(
+            "_precommit_hook", 3, "c", batch=True, flag=True
+        )
+        assert len(EnvironmentManager.get("_precommit_hook")) == 2
+        registry.commit()
+        assert calls == [([1, 2], ["a", "b"], False), ([3], ["c"], True)]
+        registry.commit()
+        assert len(calls) == 2
+
+    def test_precommit_hook_batch_with_wrong_arguments(self):
+        def add_in_registry():
+            from anyblok import Declarations
+
+            @Declarations.register(Declarations.Model)
+            class Test:
+                pass
+
+        registry = self.init_registry(add_in_registry)
+        registry.Test.precommit_hook("_precommit_hook", 1, batch=True)
+        with pytest.raises(RegistryException):
+            registry.Test.precommit_hook("_precommit_hook", 1, 2, batch=True)
+
+    def test_postcommit_hook_batch(self):
+        calls = []
+
+        def add_in_registry():
+            from anyblok import Declarations
+
+            @Declarations.register(Declarations.Model)
+            class Test:
+                @classmethod
+                def _postcommit_hook(cls, ids):
+                    calls.append(ids)
+
+        registry = self.init_registry(add_in_registry)
+        for id_ in (1, 2, 3, 2):
+            registry.Test.postcommit_hook("_postcommit_hook", id_, batch=True)
+
+        registry.Test.postcommit_hook(
+            "_postcommit_hook", 4, batch=True, call_only_if="raised"
+        )
+        registry.commit()
+        assert calls == [[1, 2, 3]]
+        assert len(EnvironmentManager.get("_postcommit_hook")) == 0
+
+    def test_hook_with_unhashable_arguments(self):
+        def add_in_registry():
+            from anyblok import Declarations
+
+            @Declarations.register(Declarations.Model)
+            class Test:
+                pass
+
+        registry = self.init_registry(add_in_registry)
+        registry.Test.precommit_hook("_precommit_hook1", [1, 2], key=[3])
+        registry.Test.precommit_hook("_precommit_hook2")
+        registry.Test.precommit_hook("_precommit_hook1", [1, 2], key=[3])
+        assert [x[1] for x in EnvironmentManager.get("_precommit_hook")] == [
+            "_precommit_hook1",
+            "_precommit_hook2",
+        ]
+        registry.Test.precommit_hook(
+            "_precommit_hook1", [1, 2], key=[3], put_at_the_end_if_exist=True
+        )
+        assert [x[1] for x in EnvironmentManager.get("_precommit_hook")] == [
+            "_precommit_hook2",
+            "_precommit_hook1",
+        ]
+
 
 class TestRegistry3:
     def test_refresh(self, registry_blok):
@@ -840,3 +931,258 @@ class TestRegistry3:
             registry.apply_state("anyblok-core", "installed", ["installed"])
             is None
         )
+
+
+class TestHookQueue:
+    def test_add(self):
+        queue = HookQueue()
+        queue.add(("Model.Test", "method", (1,), {"a": 1, "b": 2}))
+        queue.add(("Model.Test", "method", (2,), {}))
+        queue.add(("Model.Test", "method", (1,), {"b": 2, "a": 1}))
+        assert len(queue) == 2
+        assert ("Model.Test", "method", (2,), {}) in queue
+        assert ("Model.Test", "method", (3,), {}) not in queue
+
+    def test_put_at_the_end_if_exist(self):
+        queue = HookQueue([("Model.Test", "m1", (), {})])
+        queue.add(("Model.Test", "m2", ([1],), {}))
+        queue.add(("Model.Test", "m1", (), {}), put_at_the_end_if_exist=True)
+        assert [x[1] for x in queue] == ["m2", "m1"]
+        queue.add(
+            ("Model.Test", "m2", ([1],), {}), put_at_the_end_if_exist=True
+        )
+        assert [x[1] for x in queue] == ["m1", "m2"]
+
+    def test_remove(self):
+        queue = HookQueue()
+        queue.add(("Model.Test", "m1", ([1],), {}))
+        queue.add(("Model.Test", "m2", (), {}))
+        queue.remove(("Model.Test", "m1", ([1],), {}))
+        queue.remove(("Model.Test", "m2", (), {}))
+        assert len(queue) == 0
+        with pytest.raises(ValueError):
+            queue.remove(("Model.Test", "m2", (), {}))
+
+    def test_remove_while_iterating(self):
+        queue = HookQueue([("Model.Test", "m%d" % x, (), {}) for x in range(3)])
+        for entry in queue:
+            queue.remove(entry)
+
+        assert len(queue) == 0
+
+    def test_get_hook_queue_from_list(self):
+        EnvironmentManager.set("_precommit_hook", [("Model.Test", "m", (), {})])
+        queue = get_hook_queue("_precommit_hook")
+        assert isinstance(queue, HookQueue)
+        assert EnvironmentManager.get("_precommit_hook") is queue
+        assert ("Model.Test", "m", (), {}) in queue
+        EnvironmentManager.set("_precommit_hook", HookQueue())
+
+    def test_hook_batch(self):
+        batch = HookBatch()
+        batch.add((1, "a"))
+        batch.add((2, "b"))
+        batch.add((1, "a"))
+        assert batch == HookBatch()
+        assert batch.get_args() == [[1, 2], ["a", "b"]]
+        with pytest.raises(RegistryException):
+            batch.add((3,))
+
+
+class TestRegistrySkipUnchangedMigration:
+    @pytest.fixture(autouse=True)
+    def skip_unchanged_migration(self, request, registry_blok):
+        registry_blok.additional_setting["skip_unchanged_migration"] = True
+
+        def reset():
+            del registry_blok.additional_setting["skip_unchanged_migration"]
+
+        request.addfinalizer(reset)
+
+    def get_snapshot(self, registry):
+        return registry.System.Parameter.get(MIGRATION_SNAPSHOT_PARAMETER, None)
+
+    def test_save_snapshot_on_migration(self, registry_blok):
+        registry = registry_blok
+        registry.reload()
+        assert registry.migration_skipped is False
+        snapshot = self.get_snapshot(registry)
+        assert snapshot["fingerprint"] == registry.get_migration_fingerprint()
+        assert "Model.System.Blok" in snapshot["namespaces"]
+        assert "system_blok" in snapshot["tables"]
+
+    def test_skip_unchanged_migration_without_migration(self, registry_blok):
+        registry = registry_blok
+        registry.save_migration_snapshot()
+        with patch(
+            "anyblok.migration.Migration.auto_upgrade_database"
+        ) as auto_upgrade_database:
+            registry.reload()
+
+        assert registry.migration_skipped is True
+        auto_upgrade_database.assert_not_called()
+        assert registry.System.Blok.query().count()
+
+    def test_fingerprint_without_state_to_apply(self, registry_blok):
+        registry = registry_blok
+        fingerprint = registry.get_migration_fingerprint()
+        assert fingerprint == registry.get_migration_fingerprint()
+        blok = registry.System.Blok.query().get("anyblok-core")
+        blok.state = "toupdate"
+        registry.flush()
+        assert registry.get_migration_fingerprint() is None
+        blok.state = "installed"
+        registry.flush()
+        assert registry.get_migration_fingerprint() == fingerprint
+
+    def test_fingerprint_change_with_the_version(self, registry_blok):
+        registry = registry_blok
+        fingerprint = registry.get_migration_fingerprint()
+        blok = registry.System.Blok.query().get("anyblok-core")
+        blok.installed_version = "0.0.0"
+        registry.flush()
+        assert registry.get_migration_fingerprint() != fingerprint
+        assert registry.get_migration_snapshot([]) is None
+
+    def test_fingerprint_change_with_the_anyblok_source(
+        self, registry_blok, tmp_path
+    ):
+        registry = registry_blok
+        source = tmp_path / "module.py"
+        source.write_text("version = 1")
+        with patch("anyblok.registry.dirname", return_value=str(tmp_path)):
+            fingerprint = registry.get_migration_fingerprint()
+            source.write_text("version = 2")
+            assert registry.get_migration_fingerprint() != fingerprint
+
+    def test_snapshot_is_saved_in_the_migration_transaction(
+        self, registry_blok
+    ):
+        registry = registry_blok
+        registry.System.Parameter.pop(MIGRATION_SNAPSHOT_PARAMETER, None)
+        with patch.object(registry, "commit") as commit:
+            registry.save_migration_snapshot()
+
+        commit.assert_not_called()
+        assert registry.read_migration_snapshot() == self.get_snapshot(registry)
+
+    def test_migration_if_the_assembly_differs(self, registry_blok):
+        registry = registry_blok
+        registry.save_migration_snapshot()
+        snapshot = self.get_snapshot(registry)
+        snapshot["namespaces"].append("Model.Unexisting")
+        registry.System.Parameter.set(MIGRATION_SNAPSHOT_PARAMETER, snapshot)
+        registry.reload()
+        assert registry.migration_skipped is False
+        snapshot = self.get_snapshot(registry)
+        assert "Model.Unexisting" not in snapshot["namespaces"]
+
+    def test_no_snapshot_to_install_bloks(self, registry_blok):
+        registry = registry_blok
+        registry.save_migration_snapshot()
+        assert registry.get_migration_snapshot([]) is not None
+        assert registry.get_migration_snapshot(["anyblok-test"]) is None
+
+
+class TestRegistryReadOnlyReplica:
+    @pytest.fixture(autouse=True)
+    def ro_engines(self, request, registry_blok):
+        registry_blok.additional_setting["db_ro_urls"] = [get_url()]
+        registry_blok.init_ro_engines()
+        registry_blok.ro_routing = True
+
+        def reset():
+            for engine in registry_blok.ro_engines:
+                engine.dispose()
+
+            del registry_blok.additional_setting["db_ro_urls"]
+            registry_blok.init_ro_engines()
+            registry_blok.session.info.pop("anyblok_written", None)
+            registry_blok.session.info.pop("anyblok_ro_engine", None)
+
+        request.addfinalizer(reset)
+
+    def get_bind(self, registry, clause):
+        return registry.session.get_bind(clause=clause)
+
+    def test_init_ro_engines(self, registry_blok):
+        registry = registry_blok
+        assert len(registry.ro_engines) == 1
+        assert registry.ro_engines[0] is not registry.rw_engine
+
+    def test_without_ro_engine(self, registry_blok):
+        registry = registry_blok
+        registry.ro_engines[0].dispose()
+        registry.additional_setting["db_ro_urls"] = []
+        registry.init_ro_engines()
+        assert registry.ro_engines == []
+        Blok = registry.System.Blok
+        assert self.get_bind(registry, select(Blok)) not in registry.ro_engines
+
+    def test_select_on_replica(self, registry_blok):
+        registry = registry_blok
+        Blok = registry.System.Blok
+        engine = registry.ro_engines[0]
+        statements = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        try:
+            assert self.get_bind(registry, select(Blok)) is engine
+            assert Blok.query().filter_by(name="anyblok-core").count() == 1
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert len(statements) == 1
+
+    def test_no_routing_during_the_load(self, registry_blok):
+        registry = registry_blok
+        registry.ro_routing = False
+        Blok = registry.System.Blok
+        assert self.get_bind(registry, select(Blok)) not in registry.ro_engines
+
+    def test_select_for_update_on_primary(self, registry_blok):
+        registry = registry_blok
+        Blok = registry.System.Blok
+        query = select(Blok).with_for_update()
+        assert self.get_bind(registry, query) not in registry.ro_engines
+        assert self.get_bind(registry, select(Blok)) not in registry.ro_engines
+
+    def test_select_with_sequence_on_primary(self, registry_blok):
+        registry = registry_blok
+        seq = Sequence("system_sequence_seq_name")
+        query = select(seq.next_value()).select_from(func.generate_series(1, 2))
+        assert self.get_bind(registry, query) not in registry.ro_engines
+        query = select(func.nextval("system_sequence_seq_name"))
+        assert self.get_bind(registry, query) not in registry.ro_engines
+        assert "anyblok_written" not in registry.session.info
+        Blok = registry.System.Blok
+        assert self.get_bind(registry, select(Blok)) in registry.ro_engines
+
+    def test_select_after_flush_on_primary(self, registry_blok):
+        registry = registry_blok
+        Blok = registry.System.Blok
+        blok = Blok.query().get("anyblok-core")
+        blok.author = "Other author"
+        registry.flush()
+        assert registry.session.info["anyblok_written"] is True
+        assert self.get_bind(registry, select(Blok)) not in registry.ro_engines
+        assert Blok.query().get("anyblok-core").author == "Other author"
+
+    def test_clean_ro_session_info(self, registry_blok):
+        registry = registry_blok
+        Blok = registry.System.Blok
+        session = registry.session
+        self.get_bind(registry, select(Blok))
+        self.get_bind(registry, Blok.update_sql_statement())
+        assert session.info["anyblok_written"] is True
+        assert session.info["anyblok_ro_engine"] is registry.ro_engines[0]
+        nested = type("Transaction", (), {"parent": session})()
+        clean_ro_session_info(session, nested)
+        assert session.info["anyblok_written"] is True
+        root = type("Transaction", (), {"parent": None})()
+        clean_ro_session_info(session, root)
+        assert "anyblok_written" not in session.info
+        assert "anyblok_ro_engine" not in session.info
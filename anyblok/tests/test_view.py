@@ -7,10 +7,12 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 import pytest
+from sqlalchemy import text
 from sqlalchemy.sql import expression, select, union
 
 from anyblok import Declarations
 from anyblok.column import Integer, String
+from anyblok.environment import EnvironmentManager
 from anyblok.model.exceptions import ViewException
 from anyblok.model.factory import ViewFactory
 from anyblok.relationship import Many2One
@@ -99,6 +101,189 @@ class TestSimpleView:
                 registry.TestView.delete_sql_statement()
             )
 
+    @pytest.mark.skipif(
+        not sgdb_in(["PostgreSQL"]), reason="Materialized view for PostgreSQL"
+    )
+    def test_materialized_view_replaced_by_view(self, registry_simple_view):
+        registry = registry_simple_view
+        registry.execute(text("DROP VIEW testview"))
+        registry.execute(
+            text("CREATE MATERIALIZED VIEW testview AS SELECT 1 AS val1")
+        )
+        registry.declarativebase.metadata.create_all(registry.connection())
+        assert get_relkind(registry, "testview") == "v"
+        assert registry.TestView.query().count() == 2
+
+
+def get_relkind(registry, name):
+    return registry.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        params=dict(name=name),
+    ).scalar()
+
+
+def get_oid(registry, name):
+    return registry.execute(
+        text("SELECT to_regclass(:name)::oid"), params=dict(name=name)
+    ).scalar()
+
+
+def materialized_view():
+    @register(Model)
+    class T1:
+        id = Integer(primary_key=True)
+        code = String()
+        val = Integer()
+
+    @register(Model)
+    class T2:
+        id = Integer(primary_key=True)
+        code = String()
+        val = Integer()
+
+    @register(Model, factory=ViewFactory)
+    class TestView:
+        __view_materialized__ = True
+        __view_refresh_on__ = ["Model.T1", Model.T2]
+
+        code = String(primary_key=True)
+        val1 = Integer()
+        val2 = Integer()
+
+        @classmethod
+        def sqlalchemy_view_declaration(cls):
+            T1 = cls.anyblok.T1
+            T2 = cls.anyblok.T2
+            query = select(
+                T1.code.label("code"),
+                T1.val.label("val1"),
+                T2.val.label("val2"),
+            )
+            return query.where(T1.code == T2.code)
+
+
+@pytest.fixture(scope="class")
+def registry_materialized_view(request, bloks_loaded):
+    reset_db()
+    registry = init_registry_with_bloks([], materialized_view)
+    request.addfinalizer(registry.close)
+    return registry
+
+
+@pytest.mark.skipif(
+    not sgdb_in(["PostgreSQL"]), reason="Materialized view for PostgreSQL"
+)
+class TestMaterializedView:
+    @pytest.fixture(autouse=True)
+    def transact(self, request, registry_materialized_view):
+        transaction = registry_materialized_view.begin_nested()
+        request.addfinalizer(transaction.rollback)
+        request.addfinalizer(
+            lambda: EnvironmentManager.set("_postcommit_hook", [])
+        )
+
+    def insert(self, registry):
+        registry.T1.insert(code="test1", val=1)
+        registry.T2.insert(code="test1", val=2)
+
+    def test_is_materialized_view(self, registry_materialized_view):
+        registry = registry_materialized_view
+        assert registry.TestView.is_materialized_view() is True
+        assert registry.execute(
+            text(
+                "SELECT count(*) FROM pg_matviews "
+                "WHERE matviewname = 'testview'"
+            )
+        ).scalar()
+        assert registry.execute(
+            text(
+                "SELECT count(*) FROM pg_indexes "
+                "WHERE indexname = 'anyblok_uq_testview__pks'"
+            )
+        ).scalar()
+
+    def test_refresh_view(self, registry_materialized_view):
+        registry = registry_materialized_view
+        TestView = registry.TestView
+        self.insert(registry)
+        assert TestView.query().count() == 0
+        TestView.refresh_view()
+        view = TestView.query().one()
+        assert (view.code, view.val1, view.val2) == ("test1", 1, 2)
+
+    def test_refresh_view_concurrently(self, registry_materialized_view):
+        registry = registry_materialized_view
+        TestView = registry.TestView
+        self.insert(registry)
+        TestView.refresh_view(concurrently=True)
+        view = TestView.query().one()
+        registry.T1.query().one().val = 3
+        TestView.refresh_view(concurrently=True)
+        assert view.val1 == 3
+
+    def test_view_kept_if_unchanged(self, registry_materialized_view):
+        registry = registry_materialized_view
+        oid = get_oid(registry, "testview")
+        self.insert(registry)
+        registry.TestView.refresh_view()
+        registry.declarativebase.metadata.create_all(registry.connection())
+        assert get_oid(registry, "testview") == oid
+        assert registry.TestView.query().count() == 1
+
+    def test_view_created_again_if_changed(self, registry_materialized_view):
+        registry = registry_materialized_view
+        oid = get_oid(registry, "testview")
+        comment = registry.execute(
+            text("SELECT obj_description(:oid, 'pg_class')"),
+            params=dict(oid=oid),
+        ).scalar()
+        registry.execute(text("COMMENT ON MATERIALIZED VIEW testview IS 'x'"))
+        registry.declarativebase.metadata.create_all(registry.connection())
+        new_oid = get_oid(registry, "testview")
+        assert new_oid != oid
+        assert (
+            registry.execute(
+                text("SELECT obj_description(:oid, 'pg_class')"),
+                params=dict(oid=new_oid),
+            ).scalar()
+            == comment
+        )
+
+    def test_view_replaced_by_materialized_view(
+        self, registry_materialized_view
+    ):
+        registry = registry_materialized_view
+        registry.execute(text("DROP MATERIALIZED VIEW testview"))
+        registry.execute(text("CREATE VIEW testview AS SELECT 1 AS val1"))
+        registry.declarativebase.metadata.create_all(registry.connection())
+        assert get_relkind(registry, "testview") == "m"
+        self.insert(registry)
+        registry.TestView.refresh_view(concurrently=True)
+        assert registry.TestView.query().count() == 1
+
+    def test_schedule_refresh_view_on_write(self, registry_materialized_view):
+        registry = registry_materialized_view
+        hook = (
+            "Model.TestView",
+            "refresh_view_after_commit",
+            "commited",
+            (),
+            {},
+        )
+        assert hook not in EnvironmentManager.get("_postcommit_hook", [])
+        self.insert(registry)
+        hooks = EnvironmentManager.get("_postcommit_hook", [])
+        assert [x for x in hooks if x == hook] == [hook]
+
+
+class TestSimpleViewNotMaterialized:
+    def test_refresh_view(self, registry_simple_view):
+        TestView = registry_simple_view.TestView
+        assert TestView.is_materialized_view() is False
+        TestView.refresh_view()
+        TestView.schedule_refresh_view()
+        assert TestView.query().count() == 2
+
 
 def view_with_relationship():
     @register(Model)